@@ -1,8 +1,14 @@
 ﻿import os
-from flask import Flask
+import time
+import datetime
+from flask import Flask, Response, request
 from flask_cors import CORS
 from flask_socketio import SocketIO
-from models import db
+from sqlalchemy import func
+from models import db, User, UserStats
+from instrumentation import TRACING_ENABLED, get_perf_registry, init_query_counter, init_tracing, perf_snapshot
+from monitoring import METRICS_HISTORY_SIZE, get_metrics_sampler, init_metrics_sampler, prometheus_text
+from core.manifest_rollups import daily_series, get_manifest_maintenance, init_manifest_maintenance, manifest_activity
 
 # InicializaciÃ³n de la app PRIMERO (antes de cualquier registro)
 app = Flask(__name__)
@@ -11,15 +17,21 @@ app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["SECRET_KEY"] = os.environ.get("JWT_SECRET", "dev_secret")
 
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+# Con REDIS_URL los emits a rooms se publican en Redis y los entrega cada worker
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet", message_queue=os.environ.get("REDIS_URL"))
 db.init_app(app)
+init_query_counter(app, db)
+init_tracing(app)
+init_metrics_sampler(app, db, socketio)
+init_manifest_maintenance(app, db)
 
 # Registrar blueprints estÃ¡ndar
 from routes.tarot import tarot_bp
 from routes.manifest import manifest_bp
 from routes.dashboard import dashboard_bp
 from routes.resonance import resonance_bp
-from auth import auth_bp
+from auth import auth_bp, reload_key_ring, require_admin
+from core.card_deck import get_card_deck
 
 app.register_blueprint(auth_bp, url_prefix="/api")
 app.register_blueprint(tarot_bp, url_prefix="/api")
@@ -29,7 +41,7 @@ app.register_blueprint(resonance_bp, url_prefix="/api")
 
 # Registrar sistema administrativo (si existe)
 try:
-    from auth_admin import register_admin_auth_routes
+    from auth import register_admin_auth_routes
     register_admin_auth_routes(app)
     print("âœ… Sistema administrativo JWT cargado")
 except ImportError as e:
@@ -54,103 +66,117 @@ except ImportError as e:
 # ==================== RUTAS ADMINISTRATIVAS PROTEGIDAS ====================
 
 @app.route("/api/admin/system/status", methods=["GET"])
+@require_admin("system:monitor")
 def admin_system_status():
     """Endpoint de estado del sistema - requiere autenticaciÃ³n administrativa"""
-    try:
-        from auth_admin import require_admin_jwt, require_admin_permission
-        
-        @require_admin_jwt
-        @require_admin_permission("system:monitor")
-        def protected_status():
-            return {
-                "status": "AETHOS_ACTIVE", 
-                "version": "2.0.0",
-                "environment": "production",
-                "admin_access": "granted",
-                "timestamp": os.environ.get("DEPLOY_TIMESTAMP", "unknown"),
-                "system_health": "optimal"
-            }
-        
-        return protected_status()
-    
-    except ImportError:
-        return {"error": "Sistema administrativo no configurado"}, 503
+    return {
+        "status": "AETHOS_ACTIVE", 
+        "version": "2.0.0",
+        "environment": "production",
+        "admin_access": "granted",
+        "timestamp": os.environ.get("DEPLOY_TIMESTAMP", "unknown"),
+        "system_health": "optimal"
+    }
 
 @app.route("/api/admin/dashboard", methods=["GET"])
+@require_admin("system:admin")
 def admin_dashboard():
     """Dashboard administrativo completo"""
-    try:
-        from auth_admin import require_admin_jwt, require_admin_permission
-        
-        @require_admin_jwt
-        @require_admin_permission("system:admin")
-        def protected_dashboard():
-            # MÃ©tricas del sistema en tiempo real
-            import psutil
-            import datetime
-            
-            return {
-                "system_metrics": {
-                    "cpu_percent": psutil.cpu_percent(),
-                    "memory_usage": psutil.virtual_memory().percent,
-                    "disk_usage": psutil.disk_usage('/').percent,
-                    "active_connections": len(socketio.server.manager.rooms) if hasattr(socketio.server, 'manager') else 0
-                },
-                "operational_data": {
-                    "database_status": "connected",
-                    "external_apis": "operational", 
-                    "socket_io": "active",
-                    "last_health_check": datetime.datetime.utcnow().isoformat() + "Z"
-                },
-                "security": {
-                    "jwt_algorithm": "RS256",
-                    "key_strength": "RSA-4096",
-                    "admin_access": "verified"
-                }
-            }
-        
-        return protected_dashboard()
+    # MÃ©tricas del sistema en tiempo real
+    # Última muestra del sampler: la petición no llama a psutil ni a la BD
+    sampler = get_metrics_sampler()
+    sample = sampler.latest()
+    history = request.args.get("history", 30, type=int)
     
-    except ImportError:
-        return {"error": "Sistema administrativo no configurado"}, 503
+    return {
+        "system_metrics": {
+            "cpu_percent": sample["host"].get("cpu_percent"),
+            "memory_usage": sample["host"].get("memory_percent"),
+            "disk_usage": sample["host"].get("disk_percent"),
+            "active_connections": sample["sockets"].get("clients", 0)
+        },
+        "operational_data": {
+            "database_status": sample["database"].get("status", "unknown"),
+            "database_latency_ms": sample["database"].get("latency_ms"),
+            "external_apis": sample["outbound"],
+            "socket_io": sample["sockets"],
+            "caches": sample["caches"],
+            "process": sample["process"],
+            "last_health_check": datetime.datetime.utcfromtimestamp(sample["timestamp"]).isoformat() + "Z",
+            "sample_age_s": round(time.time() - sample["timestamp"], 1)
+        },
+        "history": sampler.series(max(1, min(history, METRICS_HISTORY_SIZE))),
+        "security": {
+            "jwt_algorithm": "RS256",
+            "key_strength": "RSA-4096",
+            "admin_access": "verified"
+        }
+    }
+
+@app.route("/api/admin/metrics", methods=["GET"])
+@require_admin("system:monitor")
+def admin_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(prometheus_text(get_metrics_sampler().latest()),
+                    mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/admin/perf", methods=["GET", "DELETE"])
+@require_admin("system:monitor")
+def admin_perf():
+    """Percentiles de latencia por ruta, etapa del pipeline y host saliente"""
+    if request.method == "DELETE":
+        get_perf_registry().reset()
+    return {
+        "tracing_enabled": TRACING_ENABLED,
+        "percentiles": perf_snapshot()
+    }
+
+@app.route("/api/admin/cards/reload", methods=["POST"])
+@require_admin("system:admin")
+def admin_reload_cards():
+    """Relee el mazo y sustituye el snapshot en memoria de este proceso"""
+    get_card_deck().reload()
+    return get_card_deck().stats()
+
+@app.route("/api/admin/auth/keys/reload", methods=["POST"])
+@require_admin("system:admin")
+def admin_reload_jwt_keys():
+    """Relee las llaves JWT (entorno + JWT_KEYS_FILE) en este proceso; los demás
+    workers recogen los cambios del archivo al revisar su mtime"""
+    ring = reload_key_ring()
+    return {"kids": sorted(ring.keys), "default_key": ring.default is not None}
 
 @app.route("/api/admin/users/activity", methods=["GET"])
+@require_admin("users:read:all")
 def admin_user_activity():
     """Actividad de usuarios - solo administradores"""
-    try:
-        from auth_admin import require_admin_jwt, require_admin_permission
-        
-        @require_admin_jwt
-        @require_admin_permission("users:read:all")
-        def protected_activity():
-            # En producciÃ³n, esto vendrÃ­a de la base de datos
-            from models import User, Manifest
-            from datetime import datetime, timedelta
-            
-            recent_activity = {
-                "last_24_hours": {
-                    "active_users": User.query.filter(
-                        User.last_seen >= datetime.utcnow() - timedelta(days=1)
-                    ).count(),
-                    "manifestations_created": Manifest.query.filter(
-                        Manifest.created_at >= datetime.utcnow() - timedelta(days=1)
-                    ).count(),
-                    "avg_coherence": 0.67  # Esto serÃ­a un cÃ¡lculo real
-                },
-                "cluster_distribution": {
-                    "AETHOS": 35,
-                    "VÃNCULO": 25, 
-                    "TRANSFORMACIÃ“N": 20,
-                    "OTROS": 20
-                }
-            }
-            
-            return recent_activity
-        
-        return protected_activity()
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    # Usuarios activos y coherencia desde el agregado user_stats
+    active_users, avg_coherence = db.session.query(
+        func.count(UserStats.user_id), func.avg(User.coherence)
+    ).join(User, User.id == UserStats.user_id)\
+        .filter(UserStats.last_manifest_at >= since)\
+        .one()
+    
+    # Manifestaciones, reparto por clúster y medias desde los rollups (no filas de manifests)
+    activity = manifest_activity(db.session, since)
+    total = activity["manifestations"]
+    days = max(1, min(request.args.get("days", 7, type=int), 90))
     
-    except ImportError:
-        return {"error": "Sistema administrativo no configurado"}, 503
+    return {
+        "last_24_hours": {
+            "active_users": active_users,
+            "manifestations_created": total,
+            "avg_coherence": round(avg_coherence, 3) if avg_coherence is not None else None,
+            "mean_entropy": activity["mean_entropy"],
+            "mean_alignment": activity["mean_alignment"]
+        },
+        "cluster_distribution": {
+            (cluster or "SIN_CLUSTER"): round(100 * count / total, 1)
+            for cluster, count in sorted(activity["clusters"].items(), key=lambda item: -item[1])
+        },
+        "daily": daily_series(db.session, since - datetime.timedelta(days=days - 1))
+    }
 
 # ==================== RUTAS PÃšBLICAS ====================
 
@@ -212,10 +238,11 @@ def forbidden(error):
 # ==================== INICIALIZACIÃ“N ====================
 
 def initialize_database():
-    """Inicializa la base de datos y crea tablas si no existen"""
+    """Inicializa la base de datos: aplica las migraciones pendientes (crea las tablas que falten)"""
     with app.app_context():
         try:
-            db.create_all()
+            from migrations.runner import run_migrations
+            run_migrations(db.engine)
             print("âœ… Base de datos inicializada")
             
             # Verificar conexiÃ³n a la base de datos
@@ -229,6 +256,14 @@ def initialize_database():
 if __name__ == "__main__":
     # Inicializar base de datos antes de correr
     initialize_database()
+
+    # Snapshot de resonancia externa: refresco periódico en segundo plano
+    from core.resonance_cache import get_resonance_cache
+    get_resonance_cache().start()
+    # Muestreo de métricas del sistema para el dashboard admin
+    get_metrics_sampler().start()
+    # Particiones de manifests, rollups de los paneles y retención
+    get_manifest_maintenance().start()
     
     # ConfiguraciÃ³n del servidor
     host = os.environ.get("HOST", "0.0.0.0")
@@ -1,12 +1,17 @@
-# api/auth_admin.py
+# api/auth.py
 """
 Sistema de Autenticación Administrativa - Hell Theater
 """
 
 import jwt
 import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from functools import wraps
-from flask import request, jsonify
+from flask import g, request, jsonify
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
 import datetime
@@ -26,6 +31,7 @@ class AdminAuthSystem:
         self.required_audience = os.getenv('JWT_AUDIENCE', 'HellTheater.API.Admin')
         self.required_issuer = os.getenv('JWT_ISSUER', 'HellTheater.Auth.System')
         self.admin_role = os.getenv('ADMIN_ROLE', 'SystemAdministrator')
+        self.token_cache = VerifiedTokenCache()
     
     def _load_public_key(self):
         """Carga la llave pública RSA desde variables de entorno"""
@@ -47,6 +53,9 @@ class AdminAuthSystem:
     
     def verify_admin_token(self, token):
         """Verifica un token JWT administrativo"""
+        payload = self.token_cache.get(token)
+        if payload is not None:
+            return payload, None
         try:
             payload = jwt.decode(
                 token,
@@ -60,6 +69,7 @@ class AdminAuthSystem:
             if not self._validate_admin_claims(payload):
                 return None, "Invalid admin claims"
             
+            self.token_cache.put(token, payload)
             return payload, None
             
         except jwt.ExpiredSignatureError:
@@ -116,74 +126,254 @@ def get_admin_auth():
 
 
 # Decoradores
-def require_admin_jwt(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        admin = get_admin_auth()
-        if not admin:
-            return jsonify({"error": "Sistema administrativo no configurado"}), 503
-
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
-            return jsonify({
-                "error": "Authorization required",
-                "code": "MISSING_AUTH_HEADER"
-            }), 401
+def authenticate_admin():
+    """Verifica el token admin una sola vez por petición.
 
-        token = auth_header[7:]
-        payload, error = admin.verify_admin_token(token)
+    El resultado (payload + contexto, o la respuesta de error) queda en
+    flask.g, así que varios decoradores o helpers sobre la misma petición no
+    vuelven a verificar. Además, los tokens ya verificados se reutilizan
+    entre peticiones hasta su 'exp' (VerifiedTokenCache).
+    Devuelve (contexto, None) o (None, respuesta de error).
+    """
+    cached = g.get('_admin_auth')
+    if cached is not None:
+        return cached
 
+    admin = get_admin_auth()
+    auth_header = request.headers.get('Authorization', '')
+    if not admin:
+        result = None, (jsonify({"error": "Sistema administrativo no configurado"}), 503)
+    elif not auth_header.startswith('Bearer '):
+        result = None, (jsonify({
+            "error": "Authorization required",
+            "code": "MISSING_AUTH_HEADER"
+        }), 401)
+    else:
+        payload, error = admin.verify_admin_token(auth_header[7:])
         if error:
-            return jsonify({
+            result = None, (jsonify({
                 "error": "Invalid administrative token",
                 "detail": error,
                 "code": "INVALID_ADMIN_TOKEN"
-            }), 401
+            }), 401)
+        else:
+            request.admin_payload = payload
+            request.admin_context = admin.get_admin_context(payload)
+            result = request.admin_context, None
 
-        request.admin_payload = payload
-        request.admin_context = admin.get_admin_context(payload)
+    g._admin_auth = result
+    return result
 
-        return f(*args, **kwargs)
-    return decorated
 
-def require_admin_permission(permission):
+def require_admin(*permissions):
+    """Protege una ruta admin; 'permissions' se fija al decorar, no por petición"""
+    required = tuple(permissions)
+
     def decorator(f):
         @wraps(f)
-        @require_admin_jwt
         def decorated(*args, **kwargs):
-            admin = get_admin_auth()
-            if not admin:
-                return jsonify({"error": "Sistema administrativo no configurado"}), 503
-
-            if not admin.has_permission(request.admin_payload, permission):
-                return jsonify({
-                    "error": "Insufficient permissions",
-                    "required_permission": permission,
-                    "code": "INSUFFICIENT_PERMISSIONS"
-                }), 403
+            context, error = authenticate_admin()
+            if error:
+                return error
+            granted = context['permissions']
+            for permission in required:
+                if permission not in granted:
+                    return jsonify({
+                        "error": "Insufficient permissions",
+                        "required_permission": permission,
+                        "code": "INSUFFICIENT_PERMISSIONS"
+                    }), 403
             return f(*args, **kwargs)
         return decorated
     return decorator
 
 
+def require_admin_jwt(f):
+    return require_admin()(f)
+
+
+def require_admin_permission(permission):
+    # Ya no apila require_admin_jwt: el token se verifica una vez por petición
+    return require_admin(permission)
+
+
 # -------------------- User JWT (simple) --------------------
+ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', '4096'))
+# Vida máxima de una verificación cacheada (además del 'exp' del token)
+JWT_CACHE_TTL = float(os.getenv('JWT_CACHE_TTL', '300'))
+# Cada cuánto se revisa el mtime de JWT_KEYS_FILE
+JWT_KEYS_CHECK_INTERVAL = float(os.getenv('JWT_KEYS_CHECK_INTERVAL', '30'))
+
+
+def _load_pem(pem):
+    if '\\n' in pem:
+        pem = pem.replace('\\n', '\n')
+    return serialization.load_pem_public_key(pem.encode('utf-8'), backend=default_backend())
+
+
+class JWTKeyRing:
+    """Material de llaves parseado una sola vez, con rotación por 'kid'.
+
+    - JWT_SECRET (HS256) y/o JWT_PUBLIC_KEY (RS256, PEM) son las llaves por
+      defecto; igual que antes, el secreto tiene prioridad si ambos existen.
+    - JWT_SECRETS / JWT_PUBLIC_KEYS: JSON {kid: secreto|PEM} para rotación.
+      Un token con 'kid' en su cabecera se verifica con esa llave.
+    - JWT_KEYS_FILE: archivo JSON {"secrets": {...}, "public_keys": {...}}
+      con más llaves por 'kid'; get_key_ring() lo relee cuando cambia su
+      mtime, así que rotar no requiere reiniciar el proceso.
+    """
+
+    def __init__(self, environ=None):
+        environ = os.environ if environ is None else environ
+        secrets = json.loads(environ.get('JWT_SECRETS') or '{}')
+        public_keys = json.loads(environ.get('JWT_PUBLIC_KEYS') or '{}')
+        self.keys_file = environ.get('JWT_KEYS_FILE')
+        self.keys_mtime = None
+        if self.keys_file:
+            self.keys_mtime = os.path.getmtime(self.keys_file)
+            with open(self.keys_file, encoding='utf-8') as f:
+                data = json.load(f)
+            secrets.update(data.get('secrets') or {})
+            public_keys.update(data.get('public_keys') or {})
+
+        self.keys = {}
+        for kid, secret in secrets.items():
+            self.keys[kid] = (secret.encode('utf-8'), 'HS256')
+        for kid, pem in public_keys.items():
+            self.keys[kid] = (_load_pem(pem), 'RS256')
+
+        self.default = None
+        secret = environ.get('JWT_SECRET')
+        public_pem = environ.get('JWT_PUBLIC_KEY')
+        if secret:
+            self.default = (secret.encode('utf-8'), 'HS256')
+        elif public_pem:
+            self.default = (_load_pem(public_pem), 'RS256')
+
+    @property
+    def configured(self):
+        return self.default is not None or bool(self.keys)
+
+    def resolve(self, token):
+        """(llave, algoritmo) para el token según su 'kid'"""
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is not None and kid in self.keys:
+            return self.keys[kid]
+        if self.default is None:
+            raise jwt.InvalidTokenError(f"Unknown key id: {kid}")
+        return self.default
+
+
+class VerifiedTokenCache:
+    """LRU de tokens ya verificados: sha256(token) -> (payload, caduca)"""
+
+    def __init__(self, maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, token, payload):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        exp = payload.get('exp') if isinstance(payload, dict) else None
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_key_ring = None
+_token_cache = VerifiedTokenCache()
+_next_keys_check = 0.0
+
+
+def get_key_ring():
+    """Llaves vigentes; revisa el mtime de JWT_KEYS_FILE como mucho cada JWT_KEYS_CHECK_INTERVAL"""
+    global _key_ring, _next_keys_check
+    if _key_ring is None:
+        _key_ring = JWTKeyRing()
+        _next_keys_check = time.monotonic() + JWT_KEYS_CHECK_INTERVAL
+        return _key_ring
+
+    ring = _key_ring
+    now = time.monotonic()
+    if ring.keys_file and now >= _next_keys_check:
+        _next_keys_check = now + JWT_KEYS_CHECK_INTERVAL
+        try:
+            if os.path.getmtime(ring.keys_file) != ring.keys_mtime:
+                ring = reload_key_ring()
+        except (OSError, ValueError) as e:
+            # Un archivo roto o a medio escribir no invalida las llaves que ya había
+            print(f"JWT key ring reload failed: {e}")
+    return ring
+
+
+def reload_key_ring():
+    """Relee las llaves (entorno + JWT_KEYS_FILE) e invalida las verificaciones cacheadas"""
+    global _key_ring, _next_keys_check
+    _key_ring = JWTKeyRing()
+    _next_keys_check = time.monotonic() + JWT_KEYS_CHECK_INTERVAL
+    _token_cache.clear()
+    return _key_ring
+
+
+def verify_user_token(token):
+    """Payload verificado del token (cacheado hasta su 'exp'); lanza jwt.InvalidTokenError"""
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
+    key, algorithm = get_key_ring().resolve(token)
+    payload = jwt.decode(token, key, algorithms=[algorithm], options={"verify_exp": True})
+    _token_cache.put(token, payload)
+    return payload
+
+
 def require_jwt(f):
     """Decorator for regular user JWT-protected routes.
     Behavior:
-      - If Authorization header present, attempt to verify token.
-        * If JWT_SECRET is set, try HS256.
-        * Else if JWT_PUBLIC_KEY is set, try RS256 with the PEM.
+      - If Authorization header present, verify the token against the key ring
+        (JWT_SECRET -> HS256, else JWT_PUBLIC_KEY -> RS256, or the key named
+        by the token's 'kid'). Verified tokens are cached until 'exp'.
       - If no header and ENVIRONMENT=development, inject a dev user (id=1).
       - Otherwise return 401.
     """
     @wraps(f)
     def decorated(*args, **kwargs):
         auth_header = request.headers.get('Authorization', '')
-        env = os.getenv('ENVIRONMENT', 'development')
 
         if not auth_header:
             # Development-friendly default user
-            if env == 'development':
+            if ENVIRONMENT == 'development':
                 request.user = {'id': 1, 'username': 'dev'}
                 return f(*args, **kwargs)
             return jsonify({"error": "Authorization required", "code": "MISSING_AUTH_HEADER"}), 401
@@ -193,25 +383,16 @@ def require_jwt(f):
 
         token = auth_header[7:]
 
-        # Try HS256 with JWT_SECRET
-        secret = os.getenv('JWT_SECRET')
-        public_pem = os.getenv('JWT_PUBLIC_KEY')
-
         try:
-            if secret:
-                payload = jwt.decode(token, secret, algorithms=['HS256'], options={"verify_exp": True})
-            elif public_pem:
-                # PyJWT accepts PEM text directly for RS256
-                if '\\n' in public_pem:
-                    public_pem = public_pem.replace('\\n', '\n')
-                payload = jwt.decode(token, public_pem, algorithms=['RS256'], options={"verify_exp": True})
-            else:
+            if not get_key_ring().configured:
                 # No verification configured; in production this should be disallowed
-                if env == 'development':
+                if ENVIRONMENT == 'development':
                     request.user = {'id': 1, 'username': 'dev'}
                     return f(*args, **kwargs)
                 return jsonify({"error": "Token verification not configured"}), 500
 
+            payload = verify_user_token(token)
+
             # Attach simple user context expected by routes
             # Accept payload['user'] or payload itself as user dict
             user = payload.get('user') if isinstance(payload, dict) and 'user' in payload else payload
@@ -1,9 +1,23 @@
 # api/advanced_metrics.py
+from core.card_graph import get_card_graph
+
+
+def _sequence_ids(card_sequence):
+    """Acepta ids o cartas de una tirada ({'id': ...})"""
+    ids = []
+    for card in card_sequence or []:
+        if isinstance(card, dict):
+            card = card.get('id')
+        try:
+            ids.append(int(card))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
 def compute_resonance_coherence(user_intention, card_sequence, context_data):
     """Calcula cómo resuena una secuencia de cartas con la intención del usuario"""
-    # Implementar: análisis semántico + reglas de composición + histórico del usuario
-    return {
-        "narrative_flow": 0.0,  # 0-1, fluidez de la narrativa
-        "symbolic_density": 0.0, # riqueza simbólica
-        "transformative_potential": 0.0  # capacidad de generar cambio
-    }
\ No newline at end of file
+    # Reglas de composición sobre el grafo de dependencias/evolución del mazo
+    # (core.card_graph); pendiente: análisis semántico + histórico del usuario
+    graph = (context_data or {}).get('card_graph') or get_card_graph()
+    return graph.score_sequence(_sequence_ids(card_sequence))
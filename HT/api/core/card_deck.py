@@ -0,0 +1,156 @@
+# api/core/card_deck.py
+"""Mazo de cartas en memoria, versionado e inmutable por snapshot.
+
+El mazo casi nunca cambia, así que cada proceso guarda un DeckSnapshot:
+  - registros compactos (CardRecord con __slots__) en orden de id e índice
+    por id
+  - las dos vistas de tirada de cada carta (derecha / invertida) ya armadas
+  - el JSON de GET /cards serializado una sola vez, con su ETag (hash del
+    contenido: igual en todos los procesos con los mismos datos)
+
+Las lecturas toman la referencia actual sin lock; reload() construye un
+snapshot nuevo y lo sustituye de una vez. Las escrituras de Card marcan la
+sesión y, al hacer commit, invalidan el snapshot (el siguiente acceso
+recarga). Los UPDATE masivos (query.update) no pasan por los eventos del
+mapper: para esos, y para escrituras hechas en otros procesos, está el
+endpoint admin de recarga y el TTL CARD_DECK_TTL.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Card
+
+CARD_DECK_TTL = float(os.getenv('CARD_DECK_TTL', '300'))
+
+CARD_FIELDS = (
+    'id', 'title', 'path', 'frequency', 'principle', 'protocol', 'inverted_protocol',
+    'image_url', 'resonance_type', 'activation_cost', 'dependencies', 'evolution_path'
+)
+# Campos públicos del listado GET /cards
+LISTING_FIELDS = ('id', 'title', 'path', 'frequency', 'principle', 'image_url')
+
+
+class CardRecord:
+    __slots__ = CARD_FIELDS + ('upright_view', 'inverted_view')
+
+    def __init__(self, **values):
+        for field in CARD_FIELDS:
+            setattr(self, field, values.get(field))
+        base = {'id': self.id, 'title': self.title, 'principle': self.principle, 'image_url': self.image_url}
+        self.upright_view = {**base, 'inverted': False, 'protocol': self.protocol}
+        self.inverted_view = {**base, 'inverted': True, 'protocol': self.inverted_protocol}
+
+    def view(self, inverted):
+        """Carta tal como sale en una tirada (dict compartido: no mutar)"""
+        return self.inverted_view if inverted else self.upright_view
+
+
+class DeckSnapshot:
+    __slots__ = ('version', 'cards', 'by_id', 'listing_json', 'etag', 'loaded_at')
+
+    def __init__(self, version, cards):
+        self.version = version
+        self.cards = tuple(cards)
+        self.by_id = {card.id: card for card in self.cards}
+        listing = [{field: getattr(card, field) for field in LISTING_FIELDS} for card in self.cards]
+        self.listing_json = json.dumps(listing, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.listing_json).hexdigest()[:20]
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def lookup(self, ids):
+        """Cartas por id en el orden pedido (se omiten los ids inexistentes)"""
+        found = []
+        for cid in ids:
+            try:
+                card = self.by_id.get(int(cid))
+            except (TypeError, ValueError):
+                continue
+            if card is not None:
+                found.append(card)
+        return found
+
+
+class CardDeckCache:
+    def __init__(self, ttl=CARD_DECK_TTL):
+        self.ttl = ttl
+        self._snapshot = None
+        self._stale = True
+        self._version = 0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def snapshot(self):
+        """Snapshot vigente (recarga si se invalidó o venció el TTL); requiere app context"""
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or (self.ttl and time.monotonic() - snapshot.loaded_at > self.ttl):
+            return self.reload(only_if_stale=True)
+        return snapshot
+
+    def reload(self, only_if_stale=False):
+        """Lee el mazo y sustituye el snapshot de una vez"""
+        with self._lock:
+            current = self._snapshot
+            if only_if_stale and current is not None and not self._stale \
+                    and not (self.ttl and time.monotonic() - current.loaded_at > self.ttl):
+                # Otro hilo recargó mientras esperábamos el lock
+                return current
+            # El flag se baja antes de leer: una invalidación durante la carga vuelve a marcarlo
+            self._stale = False
+            rows = Card.query.with_entities(*[getattr(Card, f) for f in CARD_FIELDS]).order_by(Card.id).all()
+            self._version += 1
+            snapshot = DeckSnapshot(self._version, [CardRecord(**row._asdict()) for row in rows])
+            self._snapshot = snapshot
+            self.reloads += 1
+            return snapshot
+
+    def invalidate(self):
+        self._stale = True
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'cards': len(snapshot) if snapshot else 0,
+            'etag': snapshot.etag if snapshot else None,
+            'stale': self._stale,
+            'reloads': self.reloads
+        }
+
+
+_deck_cache = CardDeckCache()
+
+
+def get_card_deck():
+    """Cache compartido del proceso"""
+    return _deck_cache
+
+
+# --------------------------------------------------------------- invalidación
+def _mark_cards_dirty(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info['cards_dirty'] = True
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop('cards_dirty', False):
+        _deck_cache.invalidate()
+
+
+def _forget_after_rollback(session, previous_transaction):
+    session.info.pop('cards_dirty', None)
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Card, _event, _mark_cards_dirty)
+event.listen(Session, 'after_commit', _invalidate_after_commit)
+event.listen(Session, 'after_soft_rollback', _forget_after_rollback)
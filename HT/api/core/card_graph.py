@@ -0,0 +1,272 @@
+# api/core/card_graph.py
+"""Grafo de dependencias / evolución del mazo con alcanzabilidad precalculada.
+
+Se construye una vez por versión del snapshot de core.card_deck (los JSON
+'dependencies' y 'evolution_path' se leen solo al construir):
+  - aristas en formato CSR (offsets + índices int32) para ambas relaciones
+  - cierre transitivo de dependencias y alcanzabilidad de evolución como
+    matrices booleanas n x n (el mazo es pequeño: 22-78 cartas)
+  - el cierre de dependencias también como máscara de bits por carta, para
+    validar una tirada en O(k) (una AND por carta)
+  - matriz de conexión entre pares de cartas (1.0 arista directa, 0.5
+    alcanzable) para puntuar la fluidez narrativa
+
+score_sequences() puntúa muchas secuencias candidatas a la vez sobre una
+matriz de índices con padding, por bloques de SCORE_CHUNK secuencias y
+recorriendo las posiciones con una máscara (m, n) de cartas ya vistas, así
+la memoria no crece con m × longitud × n; compute_resonance_coherence usa
+el mismo camino para una sola secuencia.
+"""
+import threading
+
+import numpy as np
+
+from core.card_deck import get_card_deck
+
+SCORE_CHUNK = 4096
+DIRECT_WEIGHT = 1.0
+REACHABLE_WEIGHT = 0.5
+
+
+def _card_ids(value):
+    """JSON de dependencias/evolución -> lista de ids enteros (se ignora lo que no lo sea)"""
+    if value is None:
+        return []
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    ids = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get('id')
+        try:
+            ids.append(int(item))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def _csr(adjacency):
+    """Lista de adyacencia (índices) -> (offsets, indices) int32"""
+    offsets = np.zeros(len(adjacency) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(targets) for targets in adjacency])
+    indices = np.fromiter((t for targets in adjacency for t in targets), dtype=np.int32, count=int(offsets[-1]))
+    return offsets, indices
+
+
+def _dense(offsets, indices):
+    n = len(offsets) - 1
+    matrix = np.zeros((n, n), dtype=bool)
+    rows = np.repeat(np.arange(n), np.diff(offsets))
+    matrix[rows, indices] = True
+    return matrix
+
+
+def _transitive_closure(matrix):
+    """Cierre transitivo (sin reflexividad) por cuadrados sucesivos: log2(n) productos"""
+    closure = matrix.copy()
+    counts = closure.astype(np.int32)
+    while True:
+        expanded = closure | ((counts @ counts) > 0)
+        if np.array_equal(expanded, closure):
+            return closure
+        closure = expanded
+        counts = closure.astype(np.int32)
+
+
+def _bitmask(row):
+    return int.from_bytes(np.packbits(row, bitorder='little').tobytes(), 'little')
+
+
+class CardGraph:
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.ids = np.array([card.id for card in snapshot.cards], dtype=np.int64)
+        self.index = {card.id: i for i, card in enumerate(snapshot.cards)}
+        n = len(self.ids)
+        self.size = n
+
+        dependencies, evolutions = [], []
+        self.dangling = 0           # referencias a cartas que no existen
+        for card in snapshot.cards:
+            for field, adjacency in (('dependencies', dependencies), ('evolution_path', evolutions)):
+                targets = []
+                for cid in _card_ids(getattr(card, field)):
+                    target = self.index.get(cid)
+                    if target is None:
+                        self.dangling += 1
+                    elif target not in targets:
+                        targets.append(target)
+                adjacency.append(targets)
+
+        # CSR: fila i = cartas que requiere la carta i / a las que evoluciona
+        self.dep_offsets, self.dep_indices = _csr(dependencies)
+        self.evo_offsets, self.evo_indices = _csr(evolutions)
+
+        direct_deps = _dense(self.dep_offsets, self.dep_indices)
+        direct_evo = _dense(self.evo_offsets, self.evo_indices)
+        self.dep_closure = _transitive_closure(direct_deps)
+        self.evo_reach = _transitive_closure(direct_evo)
+        # Una carta que se requiere a sí misma (directa o transitivamente) nunca es válida
+        self.cyclic = self.dep_closure[np.arange(n), np.arange(n)].copy()
+        self._dep_masks = [_bitmask(row) for row in self.dep_closure]
+
+        # Conexión a -> b: b evoluciona de a o b depende de a
+        connection = np.zeros((n, n), dtype=np.float32)
+        connection[self.evo_reach | self.dep_closure.T] = REACHABLE_WEIGHT
+        connection[direct_evo | direct_deps.T] = DIRECT_WEIGHT
+        self.connection = connection
+
+        # Peso simbólico: grado total en ambas relaciones, normalizado al máximo del mazo
+        degree = (direct_deps.sum(0) + direct_deps.sum(1) + direct_evo.sum(0) + direct_evo.sum(1)).astype(np.float32)
+        self.symbolic_weight = degree / degree.max() if n and degree.max() > 0 else np.zeros(n, dtype=np.float32)
+
+        types = sorted({card.resonance_type for card in snapshot.cards if card.resonance_type})
+        type_index = {t: i for i, t in enumerate(types)}
+        self.type_onehot = np.zeros((n, len(types)), dtype=bool)
+        for i, card in enumerate(snapshot.cards):
+            if card.resonance_type in type_index:
+                self.type_onehot[i, type_index[card.resonance_type]] = True
+
+    # ---------------------------------------------------------------- consultas
+    def dependencies_of(self, card_id, transitive=True):
+        """Ids que requiere la carta (todo el cierre o solo las directas)"""
+        i = self.index[card_id]
+        if transitive:
+            return self.ids[self.dep_closure[i]].tolist()
+        return self.ids[self.dep_indices[self.dep_offsets[i]:self.dep_offsets[i + 1]]].tolist()
+
+    def evolutions_of(self, card_id, transitive=True):
+        """Ids a los que puede evolucionar la carta"""
+        i = self.index[card_id]
+        if transitive:
+            return self.ids[self.evo_reach[i]].tolist()
+        return self.ids[self.evo_indices[self.evo_offsets[i]:self.evo_offsets[i + 1]]].tolist()
+
+    def can_evolve(self, from_id, to_id):
+        a, b = self.index.get(from_id), self.index.get(to_id)
+        return a is not None and b is not None and bool(self.evo_reach[a, b])
+
+    def validate(self, card_ids):
+        """Valida una secuencia en O(k): ids conocidos, sin repetidas y con las
+        dependencias (cierre transitivo) ya presentes antes de cada carta"""
+        seen = 0
+        unknown, duplicates, missing = [], [], {}
+        for cid in card_ids:
+            i = self.index.get(cid)
+            if i is None:
+                unknown.append(cid)
+                continue
+            bit = 1 << i
+            if seen & bit:
+                duplicates.append(cid)
+                continue
+            lacking = self._dep_masks[i] & ~seen
+            if lacking:
+                missing[cid] = [int(self.ids[j]) for j in range(lacking.bit_length()) if lacking >> j & 1]
+            seen |= bit
+        return {
+            'valid': not (unknown or duplicates or missing),
+            'unknown': unknown,
+            'duplicates': duplicates,
+            'missing_dependencies': missing
+        }
+
+    # -------------------------------------------------------------- puntuación
+    def _index_matrix(self, sequences):
+        """Secuencias de ids -> (índices m x L, máscara); los ids desconocidos se descartan"""
+        rows = [[self.index[cid] for cid in seq if cid in self.index] for seq in sequences]
+        width = max((len(r) for r in rows), default=0)
+        idx = np.zeros((len(rows), width), dtype=np.int32)
+        mask = np.zeros((len(rows), width), dtype=bool)
+        for r, row in enumerate(rows):
+            idx[r, :len(row)] = row
+            mask[r, :len(row)] = True
+        return idx, mask
+
+    def score_sequences(self, sequences, chunk=SCORE_CHUNK):
+        """Métricas de muchas secuencias a la vez; devuelve arrays float (una fila por secuencia)"""
+        sequences = list(sequences)
+        parts = [self._score_chunk(sequences[start:start + chunk]) for start in range(0, len(sequences), chunk)]
+        if len(parts) == 1:
+            return parts[0]
+        names = ('narrative_flow', 'symbolic_density', 'transformative_potential')
+        if not parts:
+            return {name: np.zeros(0, dtype=np.float64) for name in names}
+        return {name: np.concatenate([part[name] for part in parts]) for name in names}
+
+    def _score_chunk(self, sequences):
+        idx, mask = self._index_matrix(sequences)
+        m, width = idx.shape
+        if m == 0 or width == 0 or self.size == 0:
+            zeros = np.zeros(m, dtype=np.float64)
+            return {'narrative_flow': zeros, 'symbolic_density': zeros.copy(),
+                    'transformative_potential': zeros.copy()}
+        lengths = mask.sum(1)
+
+        # Fluidez: conexión media entre cartas consecutivas (sin transiciones -> 0)
+        steps = mask[:, :-1] & mask[:, 1:]
+        links = self.connection[idx[:, :-1], idx[:, 1:]] * steps
+        narrative_flow = links.sum(1) / np.maximum(steps.sum(1), 1)
+
+        # Densidad: variedad de tipos de resonancia + peso simbólico medio de las cartas
+        weights = (self.symbolic_weight[idx] * mask).sum(1) / np.maximum(lengths, 1)
+        n_types = self.type_onehot.shape[1]
+        if n_types:
+            diversity = (self.type_onehot[idx] & mask[..., None]).any(1).sum(1) / n_types
+        else:
+            diversity = np.zeros(m)
+        symbolic_density = 0.5 * diversity + 0.5 * weights
+
+        # Potencial: fracción de cartas con dependencias satisfechas, escalada por
+        # la parte del mazo alcanzable por evolución desde la secuencia.
+        # Posición a posición sobre (m, n): cartas vistas antes y alcanzables
+        rows = np.arange(m)
+        seen = np.zeros((m, self.size), dtype=bool)
+        reachable = np.zeros((m, self.size), dtype=bool)
+        satisfied_count = np.zeros(m, dtype=np.int64)
+        for j in range(width):
+            cards, valid = idx[:, j], mask[:, j]
+            lacking = (self.dep_closure[cards] & ~seen).any(1)
+            satisfied_count += valid & ~lacking
+            reachable |= self.evo_reach[cards] & valid[:, None]
+            seen[rows[valid], cards[valid]] = True
+        satisfied = satisfied_count / np.maximum(lengths, 1)
+        reach = (reachable & ~seen).sum(1) / self.size
+        transformative_potential = satisfied * (0.5 + 0.5 * reach)
+
+        return {
+            'narrative_flow': narrative_flow.astype(np.float64),
+            'symbolic_density': symbolic_density.astype(np.float64),
+            'transformative_potential': transformative_potential.astype(np.float64)
+        }
+
+    def score_sequence(self, card_ids):
+        scores = self.score_sequences([card_ids])
+        return {name: round(float(values[0]), 4) for name, values in scores.items()}
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'cards': self.size,
+            'dependency_edges': int(len(self.dep_indices)),
+            'evolution_edges': int(len(self.evo_indices)),
+            'cyclic_cards': int(self.cyclic.sum()),
+            'dangling_references': self.dangling
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_card_graph():
+    """Grafo de la versión vigente del mazo (se reconstruye al cambiar el snapshot); requiere app context"""
+    global _graph
+    snapshot = get_card_deck().snapshot()
+    graph = _graph
+    if graph is None or graph.version != snapshot.version:
+        with _graph_lock:
+            if _graph is None or _graph.version != snapshot.version:
+                _graph = CardGraph(snapshot)
+            graph = _graph
+    return graph
@@ -0,0 +1,162 @@
+# api/core/cluster_lexicon.py
+"""Léxico de clústeres semánticos compilado como autómata Aho–Corasick.
+
+El léxico vive en data/cluster_lexicon.json (o CLUSTER_LEXICON_PATH) y se
+recarga en caliente cuando cambia el mtime del archivo.
+
+Cada término cuenta como str.count: sus ocurrencias no se solapan entre sí
+(de izquierda a derecha), pero términos distintos sí pueden solaparse.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+LEXICON_PATH = os.getenv(
+    'CLUSTER_LEXICON_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cluster_lexicon.json')
+)
+LEXICON_CHECK_INTERVAL = float(os.getenv('CLUSTER_LEXICON_CHECK_INTERVAL', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterMatcher:
+    """Cuenta ocurrencias de todos los términos de todos los clústeres en una sola pasada"""
+
+    def __init__(self, clusters, trends=None):
+        trends = trends or {}
+        self.names = list(clusters)
+        self.trend_weights = [1 + trends.get(name, 0) for name in self.names]
+
+        # término -> índices de clúster (un término puede pertenecer a varios)
+        self.term_clusters = {}
+        for idx, terms in enumerate(clusters.values()):
+            for term in terms:
+                term = term.lower()
+                owners = self.term_clusters.setdefault(term, [])
+                if term and idx not in owners:
+                    owners.append(idx)
+        self.term_clusters = {t: tuple(idx) for t, idx in self.term_clusters.items() if t}
+
+        self._delta, self._output = self._compile(self.term_clusters)
+
+    @staticmethod
+    def _compile(term_clusters):
+        """Trie + enlaces de fallo, aplanados en un DFA completo.
+
+        Cada estado hereda las transiciones de su estado de fallo, así el
+        escaneo es un solo dict.get por carácter sin retrocesos. El coste en
+        memoria es estados × alfabeto del léxico (~16 MB con 3.500 términos).
+        """
+        goto = [{}]
+        output = [[]]
+        # Salida de cada estado: (id de término, longitud, clústeres)
+        for term_id, (term, owners) in enumerate(term_clusters.items()):
+            state = 0
+            for ch in term:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    output.append([])
+                state = nxt
+            output[state].append((term_id, len(term), owners))
+
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = goto[0]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            # BFS: el estado de fallo es menos profundo y ya está completo
+            f = fail[state]
+            delta[state] = {**delta[f], **goto[state]}
+            output[state].extend(output[f])
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[f].get(ch, 0)
+                queue.append(nxt)
+
+        return delta, [tuple(o) for o in output]
+
+    def count(self, text_lower):
+        """Ocurrencias por clúster (mismo orden que self.names) en una pasada"""
+        delta, output = self._delta, self._output
+        counts = [0] * len(self.names)
+        last_end = {}                    # término -> fin de su última ocurrencia contada
+        state = 0
+        for end, ch in enumerate(text_lower, 1):
+            state = delta[state].get(ch, 0)
+            hits = output[state]
+            if hits:
+                for term_id, length, owners in hits:
+                    if end - length >= last_end.get(term_id, 0):
+                        last_end[term_id] = end
+                        for idx in owners:
+                            counts[idx] += 1
+        return counts
+
+    def cluster_counts(self, text, keywords):
+        """Ocurrencias en el texto + bonus de 2 por keyword que coincide con un término"""
+        counts = self.count(text.lower())
+        for word, _ in keywords:
+            for idx in self.term_clusters.get(word, ()):
+                counts[idx] += 2
+        return counts
+
+    def classify(self, text, keywords):
+        """Clúster dominante aplicando las tendencias temporales"""
+        counts = self.cluster_counts(text, keywords)
+        scores = [c * w for c, w in zip(counts, self.trend_weights)]
+        return self.names[max(range(len(scores)), key=scores.__getitem__)]
+
+
+_lock = threading.Lock()
+_matcher = None
+_loaded_path = LEXICON_PATH
+_loaded_mtime = None
+_next_check = 0.0
+
+
+def load_lexicon(path=None):
+    """Lee el léxico {'clusters': {...}, 'trends': {...}} desde disco"""
+    with open(path or LEXICON_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    if not data.get('clusters'):
+        raise ValueError("Léxico sin clústeres")
+    return data
+
+
+def reload_lexicon(path=None):
+    """Recompila el autómata desde el archivo y lo intercambia de forma atómica"""
+    global _matcher, _loaded_path, _loaded_mtime, _next_check
+    path = path or _loaded_path
+    with _lock:
+        mtime = os.path.getmtime(path)
+        data = load_lexicon(path)
+        _matcher = ClusterMatcher(data['clusters'], data.get('trends'))
+        _loaded_path = path
+        _loaded_mtime = mtime
+        _next_check = time.monotonic() + LEXICON_CHECK_INTERVAL
+        return _matcher
+
+
+def get_matcher():
+    """Matcher vigente; revisa el mtime del léxico como mucho cada LEXICON_CHECK_INTERVAL"""
+    global _next_check
+    if _matcher is None:
+        return reload_lexicon()
+
+    now = time.monotonic()
+    if now >= _next_check:
+        _next_check = now + LEXICON_CHECK_INTERVAL
+        try:
+            if os.path.getmtime(_loaded_path) != _loaded_mtime:
+                reload_lexicon()
+        except (OSError, ValueError) as e:
+            # Un léxico roto no debe tumbar el análisis: seguimos con el anterior
+            logger.warning("Cluster lexicon reload failed: %s", e)
+    return _matcher
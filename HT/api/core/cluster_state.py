@@ -0,0 +1,272 @@
+# api/core/cluster_state.py
+"""Estado vivo de los clústeres servido en O(1).
+
+Por clúster se mantiene:
+  - miembros conectados (join/leave/disconnect de los sockets)
+  - buffer circular con las últimas CLUSTER_RECENT_SIZE manifestaciones
+  - estadísticas de coherencia acumuladas con Welford (n, media, M2)
+
+Se actualiza de forma incremental desde el write path de manifestaciones y
+los eventos de socket. Con REDIS_URL el estado vive en Redis (sorted sets de
+sids, listas acotadas y un hash por clúster actualizado con un script Lua) y
+todos los workers ven los mismos números; sin Redis es estado del proceso.
+
+En Redis cada sid se guarda con su último latido como score: un hilo de
+cada worker renueva sus sids cada CLUSTER_MEMBER_HEARTBEAT_S y al contar
+se podan los de más de CLUSTER_MEMBER_TTL_S, así los sockets de un worker
+caído (sin disconnect) dejan de contar solos.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import redis
+except ImportError:  # Redis es opcional: estado en proceso
+    redis = None
+
+REDIS_URL = os.getenv('REDIS_URL')
+CLUSTER_RECENT_SIZE = int(os.getenv('CLUSTER_RECENT_SIZE', '20'))
+CLUSTER_STATE_PREFIX = os.getenv('CLUSTER_STATE_PREFIX', 'aethos:cluster:')
+CLUSTER_MEMBER_HEARTBEAT_S = float(os.getenv('CLUSTER_MEMBER_HEARTBEAT_S', '30'))
+CLUSTER_MEMBER_TTL_S = float(os.getenv('CLUSTER_MEMBER_TTL_S', str(CLUSTER_MEMBER_HEARTBEAT_S * 3)))
+
+
+def manifestation_coherence(alignment, entropy):
+    """Coherencia como balance entre alineamiento y baja entropía (igual que la del usuario)"""
+    return (float(alignment) + (1 - float(entropy))) / 2
+
+
+class LocalClusterBackend:
+    """Estado en memoria del proceso"""
+
+    def __init__(self, recent_size=CLUSTER_RECENT_SIZE):
+        self.recent_size = recent_size
+        self._members = {}     # cluster -> set(sid)
+        self._recent = {}      # cluster -> deque
+        self._stats = {}       # cluster -> [n, mean, m2]
+        self._lock = threading.Lock()
+
+    def join(self, cluster, sid):
+        with self._lock:
+            self._members.setdefault(cluster, set()).add(sid)
+
+    def leave(self, cluster, sid):
+        with self._lock:
+            self._members.get(cluster, set()).discard(sid)
+
+    def member_count(self, cluster):
+        return len(self._members.get(cluster, ()))
+
+    def heartbeat(self, memberships):
+        pass
+
+    def record(self, cluster, item, coherence):
+        with self._lock:
+            recent = self._recent.get(cluster)
+            if recent is None:
+                recent = self._recent[cluster] = deque(maxlen=self.recent_size)
+            recent.appendleft(item)
+            if coherence is not None:
+                stats = self._stats.setdefault(cluster, [0, 0.0, 0.0])
+                stats[0] += 1
+                delta = coherence - stats[1]
+                stats[1] += delta / stats[0]
+                stats[2] += delta * (coherence - stats[1])
+
+    def recent(self, cluster, limit):
+        recent = self._recent.get(cluster)
+        if not recent:
+            return []
+        return list(recent)[:limit]
+
+    def coherence(self, cluster):
+        n, mean, m2 = self._stats.get(cluster, (0, 0.0, 0.0))
+        return n, mean, m2
+
+
+class RedisClusterBackend:
+    """Estado compartido entre workers"""
+
+    # Welford atómico sobre un hash {n, mean, m2}
+    WELFORD = """
+    local n = redis.call('HINCRBY', KEYS[1], 'n', 1)
+    local mean = tonumber(redis.call('HGET', KEYS[1], 'mean') or '0')
+    local m2 = tonumber(redis.call('HGET', KEYS[1], 'm2') or '0')
+    local x = tonumber(ARGV[1])
+    local d = x - mean
+    mean = mean + d / n
+    m2 = m2 + d * (x - mean)
+    redis.call('HSET', KEYS[1], 'mean', tostring(mean), 'm2', tostring(m2))
+    return n
+    """
+
+    def __init__(self, url=None, recent_size=CLUSTER_RECENT_SIZE, prefix=CLUSTER_STATE_PREFIX,
+                 member_ttl=CLUSTER_MEMBER_TTL_S, client=None):
+        self.client = client or redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.recent_size = recent_size
+        self.prefix = prefix
+        self.member_ttl = member_ttl
+        self._welford = self.client.register_script(self.WELFORD)
+
+    def _key(self, cluster, kind):
+        return f"{self.prefix}{cluster}:{kind}"
+
+    def join(self, cluster, sid):
+        self.client.zadd(self._key(cluster, 'online'), {sid: time.time()})
+
+    def leave(self, cluster, sid):
+        self.client.zrem(self._key(cluster, 'online'), sid)
+
+    def member_count(self, cluster):
+        key = self._key(cluster, 'online')
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, '-inf', time.time() - self.member_ttl)
+        pipe.zcard(key)
+        return pipe.execute()[-1]
+
+    def heartbeat(self, memberships):
+        """Renueva el último latido de los sids de este worker ({clúster: sids})"""
+        now = time.time()
+        pipe = self.client.pipeline()
+        for cluster, sids in memberships.items():
+            # XX: no resucita un sid que otro camino ya quitó
+            pipe.zadd(self._key(cluster, 'online'), {sid: now for sid in sids}, xx=True)
+        pipe.execute()
+
+    def record(self, cluster, item, coherence):
+        pipe = self.client.pipeline()
+        pipe.lpush(self._key(cluster, 'recent'), json.dumps(item, default=str))
+        pipe.ltrim(self._key(cluster, 'recent'), 0, self.recent_size - 1)
+        pipe.execute()
+        if coherence is not None:
+            self._welford(keys=[self._key(cluster, 'coherence')], args=[coherence])
+
+    def recent(self, cluster, limit):
+        return [json.loads(raw) for raw in self.client.lrange(self._key(cluster, 'recent'), 0, limit - 1)]
+
+    def coherence(self, cluster):
+        raw = self.client.hgetall(self._key(cluster, 'coherence'))
+        if not raw:
+            return 0, 0.0, 0.0
+        return int(raw[b'n']), float(raw[b'mean']), float(raw[b'm2'])
+
+
+class ClusterStateService:
+    def __init__(self, backend=None):
+        self.backend = backend or LocalClusterBackend()
+        # sid -> clústeres unidos en este worker (para limpiar en disconnect)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # --------------------------------------------------------------- miembros
+    def join(self, cluster, sid):
+        with self._lock:
+            self._sessions.setdefault(sid, set()).add(cluster)
+        self._safe(self.backend.join, cluster, sid)
+        if isinstance(self.backend, RedisClusterBackend):
+            self.start()
+
+    def leave(self, cluster, sid):
+        with self._lock:
+            self._sessions.get(sid, set()).discard(cluster)
+        self._safe(self.backend.leave, cluster, sid)
+
+    def disconnect(self, sid):
+        with self._lock:
+            clusters = self._sessions.pop(sid, set())
+        for cluster in clusters:
+            self._safe(self.backend.leave, cluster, sid)
+
+    def member_count(self, cluster):
+        return self._safe(self.backend.member_count, cluster, default=0)
+
+    def heartbeat(self):
+        """Renueva en el backend los sids conectados a este worker"""
+        memberships = {}
+        with self._lock:
+            for sid, clusters in self._sessions.items():
+                for cluster in clusters:
+                    memberships.setdefault(cluster, []).append(sid)
+        if memberships:
+            self._safe(self.backend.heartbeat, memberships)
+
+    def start(self):
+        """Arranca el hilo de latidos (idempotente)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='cluster-heartbeat', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(CLUSTER_MEMBER_HEARTBEAT_S):
+            self.heartbeat()
+
+    # --------------------------------------------------------- manifestaciones
+    def record_manifestation(self, cluster, item):
+        """Añade la manifestación al buffer del clúster y actualiza la coherencia"""
+        coherence = None
+        if item.get('alignment') is not None and item.get('entropy') is not None:
+            coherence = manifestation_coherence(item['alignment'], item['entropy'])
+        self._safe(self.backend.record, cluster, item, coherence)
+
+    def recent(self, cluster, limit=5):
+        return self._safe(self.backend.recent, cluster, limit, default=[])
+
+    def coherence_stats(self, cluster):
+        n, mean, m2 = self._safe(self.backend.coherence, cluster, default=(0, 0.0, 0.0))
+        return {
+            'count': n,
+            'mean': mean if n else 0.5,
+            'std': math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+        }
+
+    def resonance(self, cluster):
+        """Nivel de resonancia del clúster: coherencia media de sus manifestaciones"""
+        return round(self.coherence_stats(cluster)['mean'], 4)
+
+    def snapshot(self, cluster):
+        return {
+            'cluster': cluster,
+            'user_count': self.member_count(cluster),
+            'resonance_level': self.resonance(cluster),
+            'coherence': self.coherence_stats(cluster)
+        }
+
+    @staticmethod
+    def _safe(fn, *args, default=None):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"Cluster state {fn.__name__} failed: {e}")
+            return default
+
+
+_cluster_state = None
+
+
+def get_cluster_state():
+    """Servicio compartido del proceso (Redis si REDIS_URL y el cliente están disponibles)"""
+    global _cluster_state
+    if _cluster_state is None:
+        backend = None
+        if REDIS_URL and redis is not None:
+            try:
+                backend = RedisClusterBackend(REDIS_URL)
+            except Exception as e:
+                print(f"Cluster state: Redis no disponible ({e}), usando estado en proceso")
+        _cluster_state = ClusterStateService(backend)
+    return _cluster_state
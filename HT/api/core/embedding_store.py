@@ -0,0 +1,329 @@
+# api/core/embedding_store.py
+"""Almacén persistente de embeddings de manifestaciones + índice IVF en NumPy.
+
+Los vectores se guardan normalizados en float32 en archivos append-only
+(vectors.f32 / ids.i64) y se leen con memmap, así que todos los workers
+comparten el mismo almacén a través del page cache. El índice IVF
+(k-means esférico) se persiste en ivf.npz y cada worker asigna a su lista
+las filas que otros procesos hayan añadido desde la última lectura.
+
+Un id puede quedar repetido (dos backfills a la vez); search() devuelve
+cada id una sola vez y row_of() su última fila.
+
+row_of() usa searchsorted mientras los ids lleguen en orden creciente; tras
+un append fuera de orden (backfill de /similar) pasa a un diccionario
+id -> fila mantenido en _sync. Todos los entrenamientos del índice corren
+en un hilo de fondo; hasta el primero, search() hace fuerza bruta.
+
+retire() marca ids como retirados (manifestaciones de particiones que la
+retención ha archivado o borrado) en retired.i64, también append-only: sus
+filas siguen en los archivos pero row_of() y search() ya no las devuelven.
+"""
+import fcntl
+import os
+import threading
+
+import numpy as np
+
+EMBEDDING_STORE_PATH = os.getenv(
+    'EMBEDDING_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'embeddings')
+)
+EMBEDDING_DIM = 128
+IVF_NPROBE = int(os.getenv('EMBEDDING_IVF_NPROBE', '16'))
+IVF_MIN_TRAIN = int(os.getenv('EMBEDDING_IVF_MIN_TRAIN', '4096'))
+# Reentrenar cuando el almacén crece este factor respecto al entrenamiento
+IVF_RETRAIN_GROWTH = float(os.getenv('EMBEDDING_IVF_RETRAIN_GROWTH', '2.0'))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """Índices de los k scores más altos, ordenados de mayor a menor"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class IVFIndex:
+    """Índice de archivo invertido: centroides + listas de filas en formato CSR"""
+
+    def __init__(self, centroids, offsets, rows, trained_count):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.trained_count = trained_count
+        # Filas añadidas tras el entrenamiento, por lista
+        self.pending = [[] for _ in range(len(centroids))]
+
+    @classmethod
+    def train(cls, vectors, nlist=None, iterations=10, sample_per_list=32, chunk=65536, seed=0):
+        """k-means esférico sobre una muestra y asignación de todas las filas"""
+        count = len(vectors)
+        nlist = nlist or int(np.clip(4 * np.sqrt(count), 16, 4096))
+        nlist = min(nlist, count)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(count, nlist * sample_per_list)
+        sample = np.asarray(vectors[np.sort(rng.choice(count, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # Listas vacías: re-sembrar con puntos aleatorios de la muestra
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        assign = np.concatenate([
+            np.argmax(np.asarray(vectors[start:start + chunk]) @ centroids.T, axis=1)
+            for start in range(0, count, chunk)
+        ])
+        rows = np.argsort(assign, kind='stable').astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=offsets[1:])
+        return cls(centroids, offsets, rows, count)
+
+    def add(self, start_row, vectors):
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        for offset, list_id in enumerate(assign):
+            self.pending[list_id].append(start_row + offset)
+
+    def probe(self, query, nprobe):
+        """Filas candidatas de las nprobe listas más cercanas a la consulta"""
+        lists = _top_k(self.centroids @ query, nprobe)
+        parts = []
+        for list_id in lists:
+            parts.append(self.rows[self.offsets[list_id]:self.offsets[list_id + 1]])
+            if self.pending[list_id]:
+                parts.append(np.array(self.pending[list_id], dtype=np.int64))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def save(self, path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, centroids=self.centroids, offsets=self.offsets, rows=self.rows,
+                 trained_count=np.int64(self.trained_count))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['centroids'], data['offsets'], data['rows'], int(data['trained_count']))
+
+
+class EmbeddingStore:
+    """Vectores float32 append-only, memory-mapped, con búsqueda aproximada"""
+
+    def __init__(self, path=EMBEDDING_STORE_PATH, dim=EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, 'vectors.f32')
+        self._ids_path = os.path.join(path, 'ids.i64')
+        self._index_path = os.path.join(path, 'ivf.npz')
+        self._retired_path = os.path.join(path, 'retired.i64')
+        self._lock_path = os.path.join(path, '.lock')
+        self._row_bytes = dim * 4
+
+        self._lock = threading.RLock()
+        self._count = 0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._ids_sorted = True
+        self._rows = None                # id -> fila, solo con ids fuera de orden
+        self._retired = np.empty(0, dtype=np.int64)   # ids retirados, ordenados
+        self._retired_count = 0
+        self._dead = np.zeros(0, dtype=bool)          # fila -> id retirado
+        self._index = None
+        self._indexed = 0
+        self._training = False
+
+        if os.path.exists(self._index_path):
+            try:
+                self._index = IVFIndex.load(self._index_path)
+                self._indexed = self._index.trained_count
+            except Exception as e:
+                print(f"Embedding index load failed, rebuilding later: {e}")
+        self._sync()
+
+    def __len__(self):
+        self._sync()
+        return self._count
+
+    def _is_retired(self, ids):
+        retired = self._retired
+        if not len(retired) or not len(ids):
+            return np.zeros(len(ids), dtype=bool)
+        pos = np.minimum(np.searchsorted(retired, ids), len(retired) - 1)
+        return retired[pos] == ids
+
+    def _sync(self):
+        """Re-mapea los archivos si crecieron (también por appends y retiros de otros workers)"""
+        with self._lock:
+            sizes = [
+                os.path.getsize(p) if os.path.exists(p) else 0
+                for p in (self._vectors_path, self._ids_path, self._retired_path)
+            ]
+            count = min(sizes[0] // self._row_bytes, sizes[1] // 8)
+            retired_count = sizes[2] // 8
+            if retired_count != self._retired_count:
+                self._retired = np.unique(np.fromfile(self._retired_path, dtype=np.int64, count=retired_count))
+                self._retired_count = retired_count
+                self._dead = self._is_retired(np.asarray(self._ids))
+            if count == self._count:
+                return
+            previous = self._count
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(count, self.dim))
+            self._ids = np.memmap(self._ids_path, dtype=np.int64, mode='r', shape=(count,))
+            new_ids = np.asarray(self._ids[previous:])
+            self._dead = np.concatenate([self._dead, self._is_retired(new_ids)])
+            if len(new_ids):
+                self._ids_sorted = bool(
+                    self._ids_sorted
+                    and np.all(np.diff(new_ids) > 0)
+                    and (previous == 0 or new_ids[0] > self._ids[previous - 1])
+                )
+            if not self._ids_sorted:
+                if self._rows is None:
+                    previous, new_ids = 0, np.asarray(self._ids)
+                    self._rows = {}
+                # Un id repetido apunta a su última fila
+                self._rows.update(zip(new_ids.tolist(), range(previous, count)))
+            self._count = count
+
+            if self._index is not None and self._index.trained_count > count:
+                # El índice persistido no corresponde a estos archivos
+                self._index, self._indexed = None, 0
+            if self._index is not None and self._indexed < count:
+                self._index.add(self._indexed, np.asarray(self._vectors[self._indexed:count]))
+                self._indexed = count
+            self._maybe_train()
+
+    def _maybe_train(self):
+        if self._training or self._count < IVF_MIN_TRAIN:
+            return
+        if self._index is not None and self._count < self._index.trained_count * IVF_RETRAIN_GROWTH:
+            return
+        self._training = True
+        # También el primero: entrenar con el lock tomado bloquearía los appends
+        threading.Thread(target=self.rebuild_index, name='embedding-ivf-train', daemon=True).start()
+
+    def rebuild_index(self, nlist=None):
+        """Entrena un índice nuevo sobre todo el almacén y lo intercambia"""
+        try:
+            with self._lock:
+                vectors, count = self._vectors, self._count
+            index = IVFIndex.train(vectors[:count], nlist=nlist)
+            index.save(self._index_path)
+            with self._lock:
+                if self._count > count:
+                    index.add(count, np.asarray(self._vectors[count:self._count]))
+                self._index, self._indexed = index, self._count
+        finally:
+            self._training = False
+
+    def append(self, ids, vectors):
+        """Añade (ids, vectores) al final de los archivos bajo flock entre procesos"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = _normalize(np.asarray(vectors).reshape(-1, self.dim))
+        if len(ids) != len(vectors):
+            raise ValueError("ids y vectores con longitudes distintas")
+
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(vectors.tobytes())
+                with open(self._ids_path, 'ab') as f:
+                    f.write(ids.tobytes())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._sync()
+
+    def retire(self, ids):
+        """Añade ids a retired.i64 bajo flock; devuelve cuántos se han marcado"""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if not len(ids):
+            return 0
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self._retired_path, 'ab') as f:
+                    f.write(ids.tobytes())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._sync()
+        return len(ids)
+
+    def row_of(self, manifest_id):
+        self._sync()
+        with self._lock:
+            dead = self._dead
+            if not self._ids_sorted:
+                row = self._rows.get(int(manifest_id))
+                return None if row is None or dead[row] else row
+            ids, count = self._ids, self._count
+        row = int(np.searchsorted(ids, manifest_id))
+        return row if row < count and ids[row] == manifest_id and not dead[row] else None
+
+    def vector_of(self, manifest_id):
+        row = self.row_of(manifest_id)
+        return None if row is None else np.asarray(self._vectors[row])
+
+    def search(self, query, k=10, nprobe=IVF_NPROBE, exclude_id=None):
+        """Top-k por similitud coseno: [(manifest_id, score), ...]"""
+        self._sync()
+        query = _normalize(query).reshape(-1)
+        with self._lock:
+            vectors, ids, index = self._vectors, self._ids, self._index
+            dead = self._dead if len(self._retired) else None
+
+        wanted = k + (1 if exclude_id is not None else 0)
+        if index is None:
+            candidates = None
+            scores = np.asarray(vectors) @ query
+            if dead is not None:
+                scores[dead] = -np.inf
+        else:
+            candidates = index.probe(query, nprobe)
+            scores = vectors[candidates] @ query
+            if dead is not None:
+                scores[dead[candidates]] = -np.inf
+
+        # Un id puede tener varias filas (backfills concurrentes de /similar):
+        # se amplía el top hasta reunir k ids distintos
+        fetch = wanted
+        while True:
+            results, seen = [], {exclude_id}
+            for pos in _top_k(scores, fetch):
+                if scores[pos] == -np.inf:
+                    break
+                manifest_id = int(ids[pos if candidates is None else candidates[pos]])
+                if manifest_id not in seen:
+                    seen.add(manifest_id)
+                    results.append((manifest_id, float(scores[pos])))
+            if len(results) >= k or fetch >= len(scores):
+                return results[:k]
+            fetch *= 2
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store():
+    """Instancia única por proceso"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EmbeddingStore()
+    return _store
@@ -0,0 +1,152 @@
+# api/core/manifest_partitions.py
+"""Particiones mensuales de manifests (PostgreSQL) y política de retención.
+
+manifests es una tabla particionada por rango sobre created_at (migración
+0003): una partición manifests_pYYYYMM por mes más manifests_default para
+filas fuera de rango. ensure_partitions() crea por adelantado las de los
+próximos MANIFEST_PARTITIONS_AHEAD meses; si la default ya tiene filas de
+ese mes, se mueven a la partición nueva al crearla.
+
+La retención (MANIFEST_RETENTION_MONTHS, 0 = conservar todo) retira las
+particiones completas más antiguas: 'archive' las separa y las mueve al
+schema MANIFEST_ARCHIVE_SCHEMA, 'drop' las borra. Sus filas de
+manifest_narrations (sin FK desde 0003) se retiran en la misma transacción:
+se copian a <schema>.manifest_narrations con 'archive' y se borran en ambos
+modos. Antes de retirar un mes hay que reconstruir sus rollups, y después
+marcar sus ids como retirados en el almacén de embeddings (lo hace
+core.manifest_rollups).
+
+En sqlite (tests, desarrollo) no hay particiones: todo esto no hace nada.
+"""
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+MANIFEST_PARTITIONS_AHEAD = int(os.getenv('MANIFEST_PARTITIONS_AHEAD', '3'))
+MANIFEST_RETENTION_MONTHS = int(os.getenv('MANIFEST_RETENTION_MONTHS', '0'))
+MANIFEST_RETENTION_MODE = os.getenv('MANIFEST_RETENTION_MODE', 'archive')   # archive | drop
+MANIFEST_ARCHIVE_SCHEMA = os.getenv('MANIFEST_ARCHIVE_SCHEMA', 'archive')
+
+PARENT = 'manifests'
+DEFAULT_PARTITION = 'manifests_default'
+NARRATIONS = 'manifest_narrations'
+PARTITION_NAME = re.compile(r'^manifests_p(\d{4})(\d{2})$')
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name):
+    """manifests_pYYYYMM -> datetime del primer día (None si no es una partición mensual)"""
+    match = PARTITION_NAME.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def is_partitioned(conn):
+    if conn.dialect.name != 'postgresql':
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :parent AND c.relnamespace = 'public'::regnamespace"
+    ), {'parent': PARENT}).first() is not None
+
+
+def list_partitions(conn):
+    """[(nombre, primer día del mes)] de las particiones mensuales, en orden"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent AND p.relnamespace = 'public'::regnamespace"
+    ), {'parent': PARENT})
+    partitions = [(name, partition_month(name)) for name, in rows]
+    return sorted((p for p in partitions if p[1] is not None), key=lambda p: p[1])
+
+
+def create_partition(conn, month):
+    """Crea la partición del mes si no existe; devuelve True si la creó"""
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {'name': f'public.{name}'}).scalar() is not None:
+        return False
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    has_default = conn.execute(text("SELECT to_regclass(:name)"), {'name': f'public.{DEFAULT_PARTITION}'}).scalar()
+    stranded = has_default is not None and conn.execute(text(
+        f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+    ), bounds).first() is not None
+    if stranded:
+        # La default no puede tener filas del rango de la partición nueva: se sacan y se reinsertan
+        conn.execute(text(
+            f"CREATE TEMP TABLE _stranded_manifests AS "
+            f"SELECT * FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end"
+        ), bounds)
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end"), bounds)
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{bounds['start']:%Y-%m-%d}') TO ('{bounds['end']:%Y-%m-%d}')"
+    ))
+    if stranded:
+        conn.execute(text(f"INSERT INTO {PARENT} SELECT * FROM _stranded_manifests"))
+        conn.execute(text("DROP TABLE _stranded_manifests"))
+    return True
+
+
+def ensure_partitions(conn, first, last):
+    """Particiones de todos los meses entre first y last (inclusive) + la default"""
+    if not is_partitioned(conn):
+        return []
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+    created = []
+    month = month_start(first)
+    while month <= month_start(last):
+        if create_partition(conn, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def expired_partitions(partitions, now, months=MANIFEST_RETENTION_MONTHS):
+    """Particiones cuyo mes entero queda antes de la ventana de retención"""
+    if not months:
+        return []
+    cutoff = add_months(month_start(now), -months)
+    return [(name, month) for name, month in partitions if add_months(month, 1) <= cutoff]
+
+
+def retire_narrations(conn, name, mode=MANIFEST_RETENTION_MODE):
+    """Archiva (según el modo) y borra las narraciones de las manifestaciones de la partición"""
+    if mode != 'drop':
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {MANIFEST_ARCHIVE_SCHEMA}"))
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MANIFEST_ARCHIVE_SCHEMA}.{NARRATIONS} "
+            f"(LIKE public.{NARRATIONS} INCLUDING DEFAULTS)"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {MANIFEST_ARCHIVE_SCHEMA}.{NARRATIONS} "
+            f"SELECT n.* FROM {NARRATIONS} n JOIN {name} m ON m.id = n.manifest_id"
+        ))
+    return conn.execute(text(f"DELETE FROM {NARRATIONS} n USING {name} m WHERE n.manifest_id = m.id")).rowcount
+
+
+def retire_partition(conn, name, mode=MANIFEST_RETENTION_MODE):
+    """Separa la partición de manifests y la archiva o la borra junto con sus
+    narraciones; devuelve los ids de las manifestaciones retiradas"""
+    ids = [manifest_id for manifest_id, in conn.execute(text(f"SELECT id FROM {name}"))]
+    retire_narrations(conn, name, mode)
+    conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+    if mode == 'drop':
+        conn.execute(text(f"DROP TABLE {name}"))
+    else:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {MANIFEST_ARCHIVE_SCHEMA}"))
+        conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {MANIFEST_ARCHIVE_SCHEMA}"))
+    return ids
@@ -0,0 +1,357 @@
+# api/core/manifest_rollups.py
+"""Rollups horarios y diarios de manifests para los paneles.
+
+manifest_rollups_hourly / manifest_rollups_daily guardan, por bucket y
+clúster, el número de manifestaciones y las sumas de entropía y alineación
+(las medias se derivan: suma / count, y los buckets se pueden sumar entre
+sí). Los paneles leen de aquí en lugar de recorrer filas de manifests:
+manifest_activity() combina los buckets completos con dos consultas de rango
+pequeñas para los bordes (la hora parcial del inicio y lo que aún no está
+en los rollups). Las lecturas nunca escriben: lo que el mantenimiento no ha
+agregado todavía se lee de manifests.
+
+Un hilo de mantenimiento (ManifestMaintenance) cada MANIFEST_ROLLUP_INTERVAL
+segundos, en un solo worker a la vez (en PostgreSQL toma sin esperar el
+advisory lock de las migraciones; si otro worker lo tiene, se salta el ciclo):
+  - crea las particiones de los próximos meses (core.manifest_partitions)
+  - recalcula las horas completas desde el último ciclo (más
+    MANIFEST_ROLLUP_LOOKBACK_HOURS para escrituras tardías) y los días que
+    las contienen (recalcular es idempotente: DELETE + INSERT)
+  - borra los rollups horarios de más de MANIFEST_ROLLUP_HOURLY_DAYS días
+  - aplica la retención: reconstruye los rollups del mes y retira la partición
+    con sus narraciones; tras el commit, marca sus ids como retirados en el
+    almacén de embeddings (si ese paso falla, /similar puede devolver ids
+    retirados hasta que se repita a mano con get_embedding_store().retire)
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, text
+
+from core.embedding_store import get_embedding_store
+from core.manifest_partitions import (
+    MANIFEST_PARTITIONS_AHEAD, add_months, ensure_partitions, expired_partitions,
+    is_partitioned, list_partitions, month_start, retire_partition
+)
+from migrations.runner import MIGRATION_LOCK_KEY
+from models import Manifest, ManifestRollupDaily, ManifestRollupHourly
+
+MANIFEST_ROLLUP_INTERVAL = float(os.getenv('MANIFEST_ROLLUP_INTERVAL', '60'))
+# Horas completas que se recalculan en cada ciclo (cubre escrituras tardías)
+MANIFEST_ROLLUP_LOOKBACK_HOURS = int(os.getenv('MANIFEST_ROLLUP_LOOKBACK_HOURS', '3'))
+MANIFEST_ROLLUP_HOURLY_DAYS = int(os.getenv('MANIFEST_ROLLUP_HOURLY_DAYS', '90'))
+NO_CLUSTER = ''
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _truncate(conn, unit, column):
+    """date_trunc en PostgreSQL; en sqlite strftime (se convierte a datetime al leer)"""
+    if conn.dialect.name == 'postgresql':
+        return func.date_trunc(unit, column)
+    return func.strftime('%Y-%m-%d %H:00:00' if unit == 'hour' else '%Y-%m-%d 00:00:00', column)
+
+
+def as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _replace_buckets(conn, table, rows, since, until):
+    conn.execute(delete(table).where(table.bucket >= since, table.bucket < until))
+    if rows:
+        conn.execute(insert(table), [{
+            'bucket': as_datetime(bucket),
+            'cluster': cluster or NO_CLUSTER,
+            'manifest_count': count,
+            'entropy_sum': entropy or 0.0,
+            'alignment_sum': alignment or 0.0
+        } for bucket, cluster, count, entropy, alignment in rows])
+    return len(rows)
+
+
+def refresh_hourly(conn, since, until):
+    """Recalcula los buckets horarios de [since, until) desde manifests"""
+    since, until = floor_hour(since), floor_hour(until)
+    bucket = _truncate(conn, 'hour', Manifest.created_at)
+    cluster = func.coalesce(Manifest.cluster, NO_CLUSTER)
+    rows = conn.execute(
+        select(bucket, cluster, func.count(), func.sum(Manifest.entropy), func.sum(Manifest.alignment))
+        .where(Manifest.created_at >= since, Manifest.created_at < until)
+        .group_by(bucket, cluster)
+    ).all()
+    return _replace_buckets(conn, ManifestRollupHourly, rows, since, until)
+
+
+def refresh_daily(conn, since, until):
+    """Recalcula los días de [since, until) sumando sus buckets horarios"""
+    since, until = floor_day(since), floor_day(until - timedelta(microseconds=1)) + DAY
+    hourly = ManifestRollupHourly
+    bucket = _truncate(conn, 'day', hourly.bucket)
+    rows = conn.execute(
+        select(bucket, hourly.cluster, func.sum(hourly.manifest_count),
+               func.sum(hourly.entropy_sum), func.sum(hourly.alignment_sum))
+        .where(hourly.bucket >= since, hourly.bucket < until)
+        .group_by(bucket, hourly.cluster)
+    ).all()
+    return _replace_buckets(conn, ManifestRollupDaily, rows, since, until)
+
+
+def rebuild(conn, since, until):
+    """Reconstruye horarios y diarios de un rango completo (backfill / antes de retirar un mes)"""
+    refresh_hourly(conn, since, until)
+    refresh_daily(conn, since, until)
+
+
+# ------------------------------------------------------------------- lectura
+def _merge(totals, clusters, rows):
+    for cluster, count, entropy, alignment in rows:
+        if not count:
+            continue
+        cluster = cluster or NO_CLUSTER
+        totals['count'] += count
+        totals['entropy'] += entropy or 0.0
+        totals['alignment'] += alignment or 0.0
+        clusters[cluster] = clusters.get(cluster, 0) + count
+
+
+def rolled_until(session):
+    """Fin del último bucket horario agregado (None sin rollups).
+
+    Las horas vacías no tienen bucket, así que puede quedarse corto respecto a
+    lo que el mantenimiento ya recorrió; nunca se pasa.
+    """
+    last = session.execute(select(func.max(ManifestRollupHourly.bucket))).scalar()
+    return None if last is None else as_datetime(last) + HOUR
+
+
+def manifest_activity(session, since, now=None):
+    """Manifestaciones en [since, now): total, reparto por clúster y medias.
+
+    Las horas completas que ya están en los rollups horarios salen de ahí;
+    los bordes (hasta la primera hora entera y desde el último bucket
+    agregado) leen manifests. No escribe.
+    """
+    now = now or datetime.utcnow()
+    first_hour = floor_hour(since)
+    if first_hour < since:
+        first_hour += HOUR
+    last_hour = min(floor_hour(now), rolled_until(session) or first_hour)
+    totals = {'count': 0, 'entropy': 0.0, 'alignment': 0.0}
+    clusters = {}
+
+    if first_hour < last_hour:
+        hourly = ManifestRollupHourly
+        _merge(totals, clusters, session.execute(
+            select(hourly.cluster, func.sum(hourly.manifest_count), func.sum(hourly.entropy_sum),
+                   func.sum(hourly.alignment_sum))
+            .where(hourly.bucket >= first_hour, hourly.bucket < last_hour)
+            .group_by(hourly.cluster)
+        ).all())
+        edges = ((since, first_hour), (last_hour, now))
+    else:
+        edges = ((since, now),)
+    for start, end in edges:
+        if start >= end:
+            continue
+        _merge(totals, clusters, session.execute(
+            select(Manifest.cluster, func.count(), func.sum(Manifest.entropy), func.sum(Manifest.alignment))
+            .where(Manifest.created_at >= start, Manifest.created_at < end)
+            .group_by(Manifest.cluster)
+        ).all())
+
+    count = totals['count']
+    return {
+        'manifestations': count,
+        'clusters': clusters,
+        'mean_entropy': round(totals['entropy'] / count, 4) if count else None,
+        'mean_alignment': round(totals['alignment'] / count, 4) if count else None
+    }
+
+
+def daily_series(session, since, until=None):
+    """Serie diaria (bucket, total, medias) desde los rollups diarios, todos los clústeres sumados"""
+    daily = ManifestRollupDaily
+    query = select(daily.bucket, func.sum(daily.manifest_count), func.sum(daily.entropy_sum),
+                   func.sum(daily.alignment_sum)).where(daily.bucket >= floor_day(since))
+    if until is not None:
+        query = query.where(daily.bucket < until)
+    rows = session.execute(query.group_by(daily.bucket).order_by(daily.bucket)).all()
+    return [{
+        'day': as_datetime(bucket).date().isoformat(),
+        'manifestations': count,
+        'mean_entropy': round(entropy / count, 4) if count else None,
+        'mean_alignment': round(alignment / count, 4) if count else None
+    } for bucket, count, entropy, alignment in rows]
+
+
+# ------------------------------------------------------------- mantenimiento
+class ManifestMaintenance:
+    def __init__(self, app=None, db=None, interval=MANIFEST_ROLLUP_INTERVAL):
+        self.app = app
+        self.db = db
+        self.interval = interval
+        self.refreshed_until = None      # horas completas al día en este proceso
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.partitions_created = 0
+        self.partitions_retired = 0
+        self.embeddings_retired = 0
+
+    def _engine(self):
+        if self.db is not None:
+            return self.db.engine
+        from models import db
+        return db.engine
+
+    def ensure_fresh(self, now=None, force=False):
+        """Pone al día los rollups hasta la última hora completa (requiere app context).
+
+        Recalcula desde lo último refrescado en este proceso menos el lookback;
+        la primera vez (el ciclo anterior pudo correr en otro worker), desde el
+        último bucket agregado, o desde la manifestación más antigua si aún no
+        hay rollups, y por días enteros, para que los diarios sumen horas completas.
+        """
+        until = floor_hour(now or datetime.utcnow())
+        if not force and self.refreshed_until is not None and self.refreshed_until >= until:
+            return
+        with self._refresh_lock:
+            if not force and self.refreshed_until is not None and self.refreshed_until >= until:
+                return
+            start = until - MANIFEST_ROLLUP_LOOKBACK_HOURS * HOUR
+            with self._engine().begin() as conn:
+                if self.refreshed_until is not None:
+                    start = min(start, self.refreshed_until - MANIFEST_ROLLUP_LOOKBACK_HOURS * HOUR)
+                else:
+                    rolled = rolled_until(conn)
+                    if rolled is not None:
+                        start = min(start, rolled - MANIFEST_ROLLUP_LOOKBACK_HOURS * HOUR)
+                    else:
+                        oldest = conn.execute(select(func.min(Manifest.created_at))).scalar()
+                        start = min(start, as_datetime(oldest)) if oldest is not None else start
+                    start = floor_day(start)
+                rebuild(conn, start, until)
+            self.refreshed_until = until
+
+    @contextmanager
+    def _single_runner(self):
+        """True si este proceso puede mantener ahora (advisory lock de las migraciones en PostgreSQL)"""
+        engine = self._engine()
+        if engine.dialect.name != 'postgresql':
+            yield True
+            return
+        with engine.connect() as lock_conn:
+            acquired = lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"),
+                                         {'key': MIGRATION_LOCK_KEY}).scalar()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+
+    def run_once(self, now=None):
+        """Un ciclo completo de mantenimiento (requiere app context); False si otro worker lo tiene"""
+        with self._single_runner() as acquired:
+            if not acquired:
+                self.skipped += 1
+                return False
+            self._maintain(now or datetime.utcnow())
+        self.runs += 1
+        return True
+
+    def _maintain(self, now):
+        with self._engine().begin() as conn:
+            self.partitions_created += len(ensure_partitions(
+                conn, month_start(now), add_months(month_start(now), MANIFEST_PARTITIONS_AHEAD)))
+        self.ensure_fresh(now, force=True)
+        with self._engine().begin() as conn:
+            conn.execute(delete(ManifestRollupHourly)
+                         .where(ManifestRollupHourly.bucket < floor_day(now) - MANIFEST_ROLLUP_HOURLY_DAYS * DAY))
+        self.apply_retention(now)
+
+    def apply_retention(self, now):
+        """Reconstruye los rollups de cada mes vencido y retira su partición (un mes por transacción)"""
+        with self._engine().connect() as conn:
+            expired = expired_partitions(list_partitions(conn), now) if is_partitioned(conn) else []
+        for name, month in expired:
+            with self._engine().begin() as conn:
+                rebuild(conn, month, add_months(month, 1))
+                ids = retire_partition(conn, name)
+            self.partitions_retired += 1
+            print(f"Manifest retention: partición {name} retirada ({len(ids)} manifestaciones)")
+            try:
+                # Los archivos de embeddings no entran en la transacción: solo tras el commit
+                self.embeddings_retired += get_embedding_store().retire(ids)
+            except Exception as e:
+                print(f"Embedding retire for {name} failed: {e}")
+
+    # ------------------------------------------------------------------- hilo
+    def start(self):
+        """Arranca el hilo de mantenimiento (idempotente)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='manifest-maintenance', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Manifest maintenance failed: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stats(self):
+        return {
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'refreshed_until': self.refreshed_until.isoformat() if self.refreshed_until else None,
+            'partitions_created': self.partitions_created,
+            'partitions_retired': self.partitions_retired,
+            'embeddings_retired': self.embeddings_retired
+        }
+
+
+_maintenance = None
+
+
+def init_manifest_maintenance(app, db):
+    """Crea el mantenimiento del proceso ligado a la app (no arranca el hilo)"""
+    global _maintenance
+    _maintenance = ManifestMaintenance(app, db)
+    return _maintenance
+
+
+def get_manifest_maintenance():
+    """Mantenimiento compartido del proceso"""
+    global _maintenance
+    if _maintenance is None:
+        _maintenance = ManifestMaintenance()
+    return _maintenance
@@ -0,0 +1,401 @@
+# api/core/narration_queue.py
+"""Cola de narraciones para el modo async de POST /api/manifest.
+
+La petición persiste el manifiesto y sus métricas, encola un job con lo
+necesario para el prompt y responde 202. Un pool de NARRATION_WORKERS hilos
+por proceso consume la cola, llama a agent.respond (LLM remoto o local),
+guarda el resultado en manifest_narrations y lo empuja por socket al room
+'user:<id>' del autor ('manifest_narration').
+
+Con REDIS_URL la cola es una lista de Redis compartida (LPUSH/BLMOVE): los
+jobs encolados en cualquier worker los consume cualquier pool, y el emit
+llega al socket del usuario por la message queue de SocketIO. Sin Redis es
+una cola en proceso.
+
+Entrega fiable: con Redis el pop mueve el job a una lista de procesamiento
+(BLMOVE) y solo se borra de ella al terminar (ack); los que lleven más de
+NARRATION_VISIBILITY_TIMEOUT segundos ahí (worker caído) vuelven a la cola.
+Además la tabla manifest_narrations es la fuente de verdad: un barrido
+periódico reencola las filas 'pending' o 'running' de más de
+NARRATION_STALE_AFTER segundos (push fallido, cola en proceso perdida al
+reiniciar) reconstruyendo el job desde manifests, y marca 'failed' las que
+ya agotaron NARRATION_MAX_ATTEMPTS. Si el push falla en la petición, el
+manifiesto ya está guardado: la ruta responde 202 igualmente y el barrido
+lo reencola.
+
+Límites: NARRATION_QUEUE_SIZE jobs en espera (la ruta responde 503 con
+Retry-After si se alcanza) y NARRATION_WORKERS generaciones simultáneas por
+proceso. El tiempo en cola y de generación se registra en los histogramas
+de instrumentation ('narration.wait' / 'narration.run').
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from instrumentation import get_perf_registry
+
+try:
+    import redis
+except ImportError:  # Redis es opcional: cola en proceso
+    redis = None
+
+REDIS_URL = os.getenv('REDIS_URL')
+NARRATION_WORKERS = int(os.getenv('NARRATION_WORKERS', '4'))
+NARRATION_QUEUE_SIZE = int(os.getenv('NARRATION_QUEUE_SIZE', '200'))
+NARRATION_QUEUE_KEY = os.getenv('NARRATION_QUEUE_KEY', 'aethos:narration:queue')
+# Segundos sugeridos al cliente (Retry-After) para volver a consultar o reintentar
+NARRATION_RETRY_AFTER = int(os.getenv('NARRATION_RETRY_AFTER', '5'))
+NARRATION_VISIBILITY_TIMEOUT = float(os.getenv('NARRATION_VISIBILITY_TIMEOUT', '300'))
+NARRATION_STALE_AFTER = float(os.getenv('NARRATION_STALE_AFTER', '900'))
+NARRATION_MAX_ATTEMPTS = int(os.getenv('NARRATION_MAX_ATTEMPTS', '3'))
+NARRATION_SWEEP_INTERVAL = float(os.getenv('NARRATION_SWEEP_INTERVAL', '60'))
+
+
+class LocalNarrationBackend:
+    """Cola FIFO del proceso"""
+
+    def __init__(self):
+        self._jobs = deque()
+        self._ready = threading.Condition()
+
+    def push(self, job):
+        with self._ready:
+            self._jobs.append(job)
+            self._ready.notify()
+
+    def pop(self, timeout):
+        with self._ready:
+            if not self._jobs:
+                self._ready.wait(timeout)
+            return self._jobs.popleft() if self._jobs else None
+
+    def ack(self, job):
+        pass
+
+    def requeue_expired(self, timeout=NARRATION_VISIBILITY_TIMEOUT):
+        return 0
+
+    def depth(self):
+        return len(self._jobs)
+
+
+class RedisNarrationBackend:
+    """Cola compartida entre workers (lista de Redis) con lista de procesamiento"""
+
+    def __init__(self, url=None, key=NARRATION_QUEUE_KEY, client=None):
+        self.client = client or redis.Redis.from_url(url, socket_connect_timeout=1)
+        self.key = key
+        self.processing_key = f"{key}:processing"
+        self.claims_key = f"{key}:claims"        # job serializado -> epoch del pop
+        self._claimed = {}                       # id(job) -> job serializado, hasta el ack
+        self._lock = threading.Lock()
+
+    def push(self, job):
+        self.client.lpush(self.key, json.dumps(job))
+
+    def pop(self, timeout):
+        raw = self.client.blmove(self.key, self.processing_key, max(1, int(timeout)), 'RIGHT', 'LEFT')
+        if raw is None:
+            return None
+        self.client.hset(self.claims_key, raw, time.time())
+        job = json.loads(raw)
+        with self._lock:
+            self._claimed[id(job)] = raw
+        return job
+
+    def ack(self, job):
+        """Saca el job de la lista de procesamiento (terminado, bien o mal)"""
+        with self._lock:
+            raw = self._claimed.pop(id(job), None)
+        if raw is not None:
+            self.client.lrem(self.processing_key, 1, raw)
+            self.client.hdel(self.claims_key, raw)
+
+    def requeue_expired(self, timeout=NARRATION_VISIBILITY_TIMEOUT):
+        """Devuelve a la cola los jobs en procesamiento desde hace más de 'timeout' s"""
+        now = time.time()
+        requeued = 0
+        for raw in self.client.lrange(self.processing_key, 0, -1):
+            claimed_at = self.client.hget(self.claims_key, raw)
+            if claimed_at is None:
+                # Pop sin claim registrado (caída justo después): empieza a contar ahora
+                self.client.hsetnx(self.claims_key, raw, now)
+                continue
+            if now - float(claimed_at) < timeout:
+                continue
+            # LREM decide quién lo reencola si dos barridos coinciden
+            if self.client.lrem(self.processing_key, 1, raw):
+                self.client.rpush(self.key, raw)
+                self.client.hdel(self.claims_key, raw)
+                requeued += 1
+        return requeued
+
+    def depth(self):
+        return self.client.llen(self.key)
+
+
+def narration_job(manifest):
+    """Job de narración reconstruido desde la fila de manifests (barrido)"""
+    keywords = [k for k in (manifest.keywords or '').split(',') if k]
+    return {
+        'manifest_id': manifest.id,
+        'user_id': manifest.user_id,
+        'intention': manifest.intention,
+        'mask': manifest.mask,
+        'context': {'keywords': keywords, 'cluster': manifest.cluster},
+        'metrics': {'entropy': manifest.entropy, 'alignment': manifest.alignment}
+    }
+
+
+def run_narration_job(job):
+    """Genera la narración de un job y la persiste; devuelve el payload del socket.
+
+    None si la fila ya no está pendiente (job duplicado por un reencolado).
+    """
+    from models import db, ManifestNarration
+    from core.agents import create_agent_mask
+
+    manifest_id = job['manifest_id']
+    claimed = db.session.query(ManifestNarration)\
+        .filter(ManifestNarration.manifest_id == manifest_id,
+                ManifestNarration.status.in_(('pending', 'running')))\
+        .update({
+            'status': 'running',
+            'started_at': datetime.utcnow(),
+            'attempts': ManifestNarration.attempts + 1
+        }, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return None
+
+    try:
+        agent = create_agent_mask(job['mask'])
+        narration = agent.respond(job['intention'], job['context'], job['metrics'])
+        values = {'status': 'done', 'narration': narration, 'error': None}
+    except Exception as e:
+        print(f"Narration job {manifest_id} failed: {e}")
+        values = {'status': 'failed', 'narration': None, 'error': str(e)}
+    values['finished_at'] = datetime.utcnow()
+
+    db.session.query(ManifestNarration).filter_by(manifest_id=manifest_id)\
+        .update(values, synchronize_session=False)
+    db.session.commit()
+    return {
+        'manifest_id': manifest_id,
+        'status': values['status'],
+        'narration': values['narration'],
+        'error': values['error']
+    }
+
+
+class NarrationQueue:
+    def __init__(self, backend=None, workers=NARRATION_WORKERS, maxsize=NARRATION_QUEUE_SIZE,
+                 handler=run_narration_job):
+        self.backend = backend or LocalNarrationBackend()
+        self.workers = workers
+        self.maxsize = maxsize
+        self.handler = handler
+        self.app = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.in_flight = 0
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.submit_errors = 0
+        self.requeued = 0
+        self.abandoned = 0
+        self._sweeper = None
+
+    # ---------------------------------------------------------------- entrada
+    def has_capacity(self):
+        try:
+            return self.backend.depth() < self.maxsize
+        except Exception as e:
+            print(f"Narration queue depth failed: {e}")
+            return False
+
+    def submit(self, job, app=None):
+        """Encola el job y arranca el pool si hace falta (el control de capacidad lo hace has_capacity).
+
+        Devuelve False si el push falla: la fila sigue 'pending' y el barrido la reencola.
+        """
+        self.start(app)
+        job = dict(job, enqueued_at=time.time())
+        try:
+            self.backend.push(job)
+        except Exception as e:
+            print(f"Narration enqueue failed: {e}")
+            with self._lock:
+                self.submit_errors += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    # ------------------------------------------------------------------ pool
+    def start(self, app=None):
+        """Arranca los hilos del pool (idempotente); 'app' da el contexto de BD"""
+        if app is not None:
+            self.app = app
+        if len(self._threads) == self.workers:
+            return
+        with self._lock:
+            self._stop.clear()
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'narration-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            if self.workers and self.app is not None and (self._sweeper is None or not self._sweeper.is_alive()):
+                self._sweeper = threading.Thread(target=self._sweep_loop, name='narration-sweeper', daemon=True)
+                self._sweeper.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self.backend.pop(timeout=1)
+            except Exception as e:
+                print(f"Narration queue pop failed: {e}")
+                self._stop.wait(1)
+                continue
+            if job is None:
+                continue
+            try:
+                self.process(job)
+            finally:
+                try:
+                    self.backend.ack(job)
+                except Exception as e:
+                    print(f"Narration queue ack failed: {e}")
+
+    # --------------------------------------------------------------- barrido
+    def sweep(self, now=None):
+        """Reencola jobs perdidos (requiere app context); devuelve (reencolados, abandonados)"""
+        from models import db, Manifest, ManifestNarration
+
+        requeued = abandoned = 0
+        try:
+            requeued += self.backend.requeue_expired()
+        except Exception as e:
+            print(f"Narration queue requeue failed: {e}")
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(seconds=NARRATION_STALE_AFTER)
+        narration = ManifestNarration
+        stale = (
+            ((narration.status == 'pending') & (narration.enqueued_at < cutoff))
+            | ((narration.status == 'running') & (narration.started_at < cutoff))
+        )
+        rows = db.session.query(narration.manifest_id, narration.status, narration.attempts)\
+            .filter(stale).limit(NARRATION_QUEUE_SIZE).all()
+
+        for manifest_id, status, attempts in rows:
+            # UPDATE condicionado: si otro proceso barre a la vez, solo uno gana cada fila
+            claim = db.session.query(narration)\
+                .filter(narration.manifest_id == manifest_id, narration.status == status, stale)
+            if attempts >= NARRATION_MAX_ATTEMPTS:
+                if claim.update({'status': 'failed', 'finished_at': now,
+                                 'error': f'Abandonada tras {attempts} intentos'}, synchronize_session=False):
+                    abandoned += 1
+                db.session.commit()
+                continue
+            won = claim.update({'status': 'pending', 'enqueued_at': now}, synchronize_session=False)
+            manifest = db.session.query(Manifest).filter(Manifest.id == manifest_id).first() if won else None
+            db.session.commit()
+            if manifest is not None and self.submit(narration_job(manifest)):
+                requeued += 1
+
+        with self._lock:
+            self.requeued += requeued
+            self.abandoned += abandoned
+        return requeued, abandoned
+
+    def _sweep_loop(self):
+        while not self._stop.wait(NARRATION_SWEEP_INTERVAL):
+            try:
+                with self.app.app_context():
+                    self.sweep()
+            except Exception as e:
+                print(f"Narration sweep failed: {e}")
+
+    def process(self, job):
+        """Ejecuta un job (en el hilo actual) y empuja el resultado al socket del usuario"""
+        from sockets.fanout import publish
+
+        started = time.time()
+        get_perf_registry().observe('stage', 'narration.wait', (started - job['enqueued_at']) * 1000)
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    result = self.handler(job)
+            else:
+                result = self.handler(job)
+        except Exception as e:
+            print(f"Narration job {job.get('manifest_id')} failed: {e}")
+            result = {'manifest_id': job.get('manifest_id'), 'status': 'failed', 'narration': None, 'error': str(e)}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            get_perf_registry().observe('stage', 'narration.run', (time.time() - started) * 1000)
+
+        if result is None:
+            return None
+        with self._lock:
+            if result['status'] == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+        publish('manifest_narration', result, room=f"user:{job['user_id']}")
+        return result
+
+    def stats(self):
+        try:
+            depth = self.backend.depth()
+        except Exception:
+            depth = None
+        return {
+            'depth': depth,
+            'capacity': self.maxsize,
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'enqueued': self.enqueued,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'submit_errors': self.submit_errors,
+            'requeued': self.requeued,
+            'abandoned': self.abandoned,
+            'wait': get_perf_registry().summary('stage', 'narration.wait'),
+            'run': get_perf_registry().summary('stage', 'narration.run'),
+            'backend': type(self.backend).__name__
+        }
+
+
+_narration_queue = None
+
+
+def get_narration_queue():
+    """Cola compartida del proceso (Redis si REDIS_URL y el cliente están disponibles)"""
+    global _narration_queue
+    if _narration_queue is None:
+        backend = None
+        if REDIS_URL and redis is not None:
+            try:
+                backend = RedisNarrationBackend(REDIS_URL)
+            except Exception as e:
+                print(f"Narration queue: Redis no disponible ({e}), usando cola en proceso")
+        _narration_queue = NarrationQueue(backend)
+    return _narration_queue
@@ -1,9 +1,29 @@
-import requests
 import os
 import json
+import time
+import asyncio
 from datetime import datetime, timedelta
 import numpy as np
 from typing import Dict, List, Optional
+from integrations import newsapi, noaa
+
+# Plazo por fuente (s): la latencia de fetch_global_resonance queda acotada por
+# el mayor de ellos, no por la suma. Una fuente que no llega a tiempo se sirve
+# con valores neutrales y se marca como degradada.
+RESONANCE_NEWS_DEADLINE = float(os.getenv('RESONANCE_NEWS_DEADLINE', '2.5'))
+RESONANCE_SOCIAL_DEADLINE = float(os.getenv('RESONANCE_SOCIAL_DEADLINE', '1.5'))
+RESONANCE_COSMIC_DEADLINE = float(os.getenv('RESONANCE_COSMIC_DEADLINE', '1.5'))
+
+NEUTRAL_NEWS = {'trends': [], 'sentiment': 0.5, 'collective_mood': 'neutral'}
+NEUTRAL_SOCIAL = {'emotions': {}, 'dominant_emotion': None, 'social_coherence': 0.5}
+NEUTRAL_COSMIC = {'solar_activity': 0.5, 'moon_phase': 0.5, 'geomagnetic_storm': 0.5, 'frequency': 432.0}
+
+class SourceUnavailable(Exception):
+    """La fuente respondió pero sin datos utilizables (sin credenciales, vacía, etc.)"""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
 
 class ExternalResonanceEngine:
     def __init__(self):
@@ -11,32 +31,44 @@ class ExternalResonanceEngine:
         self.twitter_bearer_token = os.getenv('TWITTER_BEARER_TOKEN', '')
         self.reddit_client_id = os.getenv('REDDIT_CLIENT_ID', '')
         self.reddit_client_secret = os.getenv('REDDIT_CLIENT_SECRET', '')
+        self.deadlines = {
+            'news': RESONANCE_NEWS_DEADLINE,
+            'social': RESONANCE_SOCIAL_DEADLINE,
+            'cosmic': RESONANCE_COSMIC_DEADLINE
+        }
         
     async def fetch_global_resonance(self) -> Dict:
-        """Captura resonancia de múltiples fuentes externas"""
+        """Captura resonancia de múltiples fuentes externas.
+
+        Las fuentes se consultan en paralelo, cada una con su propio plazo.
+        'sources' informa por fuente el estado (ok/timeout/error/disabled/empty),
+        la latencia, la marca temporal y si se sirvió con valores neutrales.
+        """
         resonance_data = {
             'temporal_markers': [],
             'collective_emotions': {},
             'emerging_patterns': [],
-            'resonance_frequency': 0.0
+            'resonance_frequency': 0.0,
+            'sources': {},
+            'degraded': False
         }
         
+        (news_resonance, news_meta), (social_resonance, social_meta), (cosmic_resonance, cosmic_meta) = await asyncio.gather(
+            self._run_source('news', self._analyze_news_resonance(), NEUTRAL_NEWS),
+            self._run_source('social', self._analyze_social_resonance(), NEUTRAL_SOCIAL),
+            self._run_source('cosmic', self._fetch_cosmic_data(), NEUTRAL_COSMIC)
+        )
+        resonance_data['sources'] = {'news': news_meta, 'social': social_meta, 'cosmic': cosmic_meta}
+        resonance_data['degraded'] = any(meta['degraded'] for meta in resonance_data['sources'].values())
+
         try:
             # 1. Noticias globales (NewsAPI)
-            from integrations.newsapi import fetch_top_headlines
-            articles = fetch_top_headlines(country='us', page_size=20)
-            if articles:
-                news_resonance = self._process_news_articles(articles)
-            else:
-                news_resonance = await self._analyze_news_resonance()
             resonance_data['temporal_markers'].extend(news_resonance['trends'])
             
             # 2. Tendencias de redes sociales
-            social_resonance = await self._analyze_social_resonance()
             resonance_data['collective_emotions'] = social_resonance['emotions']
             
             # 3. Datos astronómicos y cósmicos
-            cosmic_resonance = await self._fetch_cosmic_data()
             resonance_data['resonance_frequency'] = cosmic_resonance['frequency']
             
             # 4. Análisis de patrones emergentes
@@ -51,26 +83,39 @@ class ExternalResonanceEngine:
             print(f"Error fetching external resonance: {e}")
             
         return resonance_data
-    
-    async def _analyze_news_resonance(self) -> Dict:
-        """Analiza resonancia en noticias globales"""
+
+    async def _run_source(self, name: str, coro, neutral: Dict):
+        """Ejecuta una fuente con su plazo; devuelve (datos, metadatos de frescura)"""
+        started = time.monotonic()
+        status = 'ok'
         try:
-            url = "https://newsapi.org/v2/top-headlines"
-            params = {
-                'apiKey': self.news_api_key,
-                'country': 'us',
-                'pageSize': 20
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                articles = response.json().get('articles', [])
-                return self._process_news_articles(articles)
-                
+            result = await asyncio.wait_for(coro, self.deadlines[name])
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        except SourceUnavailable as e:
+            status = e.status
         except Exception as e:
-            print(f"News API error: {e}")
-            
-        return {'trends': [], 'sentiment': 0.5}
+            print(f"Resonance source '{name}' error: {e}")
+            status = 'error'
+
+        if status != 'ok':
+            result = dict(neutral)
+        return result, {
+            'status': status,
+            'degraded': status != 'ok',
+            'latency_ms': round((time.monotonic() - started) * 1000, 1),
+            'fetched_at': datetime.utcnow().isoformat()
+        }
+    
+    async def _analyze_news_resonance(self) -> Dict:
+        """Analiza resonancia en noticias globales (una sola llamada a NewsAPI)"""
+        if not newsapi.NEWS_API_KEY:
+            raise SourceUnavailable('disabled')
+
+        articles = await newsapi.fetch_top_headlines_async(country='us', page_size=20)
+        if not articles:
+            raise SourceUnavailable('empty')
+        return self._process_news_articles(articles)
     
     def _process_news_articles(self, articles: List) -> Dict:
         """Procesa artículos para extraer resonancia"""
@@ -122,26 +167,21 @@ class ExternalResonanceEngine:
     
     async def _fetch_cosmic_data(self) -> Dict:
         """Obtiene datos cósmicos y astronómicos"""
-        try:
-            # Datos solares (NASA API)
-            solar_data = await self._fetch_solar_data()
-            
-            # Fases lunares
-            moon_phase = self._calculate_moon_phase()
-            
-            # Campos geomagnéticos
-            geomagnetic = self._simulate_geomagnetic_data()  # TODO: Integrar con NOAA API en producción
-            
-            return {
-                'solar_activity': solar_data.get('activity', 0.5),
-                'moon_phase': moon_phase,
-                'geomagnetic_storm': geomagnetic['storm_level'],
-                'frequency': self._calculate_cosmic_frequency(solar_data, moon_phase, geomagnetic)
-            }
-            
-        except Exception as e:
-            print(f"Cosmic data error: {e}")
-            return {'frequency': 0.5}
+        # Datos solares (NASA API) y campos geomagnéticos (NOAA) en paralelo
+        solar_data, geomagnetic = await asyncio.gather(
+            self._fetch_solar_data(),
+            noaa.fetch_geomagnetic_data_async()
+        )
+        
+        # Fases lunares
+        moon_phase = self._calculate_moon_phase()
+        
+        return {
+            'solar_activity': solar_data.get('activity', 0.5),
+            'moon_phase': moon_phase,
+            'geomagnetic_storm': geomagnetic['storm_level'],
+            'frequency': self._calculate_cosmic_frequency(solar_data, moon_phase, geomagnetic)
+        }
     
     def _calculate_cosmic_frequency(self, solar_data: Dict, moon_phase: float, geomagnetic: Dict) -> float:
         """Calcula frecuencia cósmica basada en datos astronómicos"""
@@ -203,20 +243,6 @@ class ExternalResonanceEngine:
         phase = (days_since_new % days_in_cycle) / days_in_cycle
         return phase
     
-    def _simulate_geomagnetic_data(self) -> Dict:
-        """Stub determinista para datos geomagnéticos.
-
-        EN PRODUCCIÓN: reemplazar por adaptador a NOAA/servicio real. Hasta entonces
-        devolveremos valores neutrales reproducibles para evitar fluctuaciones aleatorias
-        en staging.
-        """
-        # Valores deterministas (neutrales) para staging
-        return {
-            'storm_level': 0.5,
-            'kp_index': 3.0,
-            'activity': 'quiet'
-        }
-    
     async def _fetch_solar_data(self) -> Dict:
         """Obtiene datos solares (stub determinista).
 
@@ -0,0 +1,220 @@
+# api/core/resonance_cache.py
+"""Snapshot compartido de la resonancia global.
+
+La resonancia externa es la misma para todos los usuarios y solo cambia con
+el ciclo de noticias y el cambio de día, así que /api/external sirve un
+snapshot en memoria que un hilo de fondo refresca cada
+RESONANCE_REFRESH_INTERVAL segundos (stale-while-revalidate: nunca se bloquea
+una petición esperando a las APIs externas, salvo el arranque en frío).
+
+Con REDIS_URL el snapshot se comparte entre procesos: en cada ciclo un solo
+worker obtiene el lock (SET NX EX), consulta las fuentes y publica el
+resultado; el resto lo lee de Redis. Sin Redis (o si no responde) cada
+proceso refresca su propia copia.
+
+Los refrescos corren siempre sobre el mismo event loop del cache (creado la
+primera vez, usado bajo el lock de refresco), así que la sesión aiohttp de
+integrations.http_client y su pool keep-alive se reutilizan entre ciclos;
+stop() cierra la sesión y el loop.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+
+from core.resonance import ExternalResonanceEngine
+from integrations.http_client import outbound
+
+try:
+    import redis
+except ImportError:  # Redis es opcional: se usa el snapshot en proceso
+    redis = None
+
+REDIS_URL = os.getenv('REDIS_URL')
+RESONANCE_REFRESH_INTERVAL = float(os.getenv('RESONANCE_REFRESH_INTERVAL', '300'))
+# Edad a partir de la cual una petición dispara un refresco inmediato (el
+# hilo de fondo se ha retrasado o ha muerto); se sigue sirviendo el snapshot.
+RESONANCE_STALE_AFTER = float(os.getenv('RESONANCE_STALE_AFTER', str(RESONANCE_REFRESH_INTERVAL * 2)))
+RESONANCE_CACHE_KEY = os.getenv('RESONANCE_CACHE_KEY', 'aethos:resonance:snapshot')
+
+
+class ResonanceSnapshotCache:
+    """Snapshot de fetch_global_resonance con refresco en segundo plano"""
+
+    def __init__(self, engine=None, interval=RESONANCE_REFRESH_INTERVAL,
+                 stale_after=RESONANCE_STALE_AFTER, redis_url=REDIS_URL):
+        self.engine = engine or ExternalResonanceEngine()
+        self.interval = interval
+        self.stale_after = stale_after
+        self._snapshot = None            # (data, fetched_at epoch)
+        self._refresh_lock = threading.Lock()
+        self._loop = None                # event loop de larga vida para los refrescos
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._redis = None
+        if redis_url and redis is not None:
+            try:
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+            except Exception as e:
+                print(f"Resonance cache: Redis no disponible ({e}), usando snapshot en proceso")
+
+    # ------------------------------------------------------------------ lectura
+    def get(self):
+        """Devuelve el snapshot actual (lectura en memoria) con su edad"""
+        self.start()
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Arranque en frío: otro worker puede haberlo publicado ya
+            snapshot = self._load_shared() or self.refresh()
+
+        data, fetched_at = snapshot
+        age = time.time() - fetched_at
+        if age > self.stale_after:
+            self.refresh_async()
+
+        payload = dict(data)
+        payload['snapshot'] = {
+            'fetched_at': fetched_at,
+            'age_s': round(age, 1),
+            'stale': age > self.interval,
+            'refresh_interval_s': self.interval
+        }
+        return payload
+
+    # ----------------------------------------------------------------- refresco
+    def refresh(self):
+        """Recalcula el snapshot (single-flight por proceso y, con Redis, entre procesos)"""
+        with self._refresh_lock:
+            if self._snapshot is not None and time.time() - self._snapshot[1] < self.interval / 2:
+                # Otro hilo acaba de refrescar mientras esperábamos el lock
+                return self._snapshot
+
+            if not self._acquire_shared_lock():
+                shared = self._load_shared()
+                if shared is not None:
+                    self._snapshot = shared
+                    return shared
+
+            try:
+                data = self._run_async(self.engine.fetch_global_resonance())
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"Resonance cache refresh failed: {e}")
+                if self._snapshot is not None:
+                    return self._snapshot
+                raise
+
+            snapshot = (data, time.time())
+            self._snapshot = snapshot
+            self.refreshes += 1
+            self._store_shared(snapshot)
+            return snapshot
+
+    def _run_async(self, coro):
+        """Ejecuta coro en el loop del cache (llamar con _refresh_lock tomado)"""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    def refresh_async(self):
+        """Lanza un refresco sin bloquear (no hace nada si ya hay uno en curso)"""
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self._safe_refresh, name='resonance-refresh', daemon=True).start()
+
+    def _safe_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Resonance cache refresh failed: {e}")
+
+    def start(self):
+        """Arranca el hilo de refresco periódico (idempotente)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='resonance-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Para el hilo y cierra la sesión aiohttp y el loop de los refrescos"""
+        self._stop.set()
+        with self._refresh_lock:
+            loop, self._loop = self._loop, None
+            if loop is None or loop.is_closed():
+                return
+            try:
+                loop.run_until_complete(outbound.aclose())
+            except Exception as e:
+                print(f"Resonance cache: cierre de sesión falló ({e})")
+            finally:
+                loop.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._safe_refresh()
+            self._stop.wait(self.interval)
+
+    # -------------------------------------------------------------------- Redis
+    def _acquire_shared_lock(self):
+        """True si este proceso debe consultar las fuentes en este ciclo"""
+        if self._redis is None:
+            return True
+        try:
+            ttl = max(1, int(self.interval * 0.9))
+            return bool(self._redis.set(f"{RESONANCE_CACHE_KEY}:lock", os.getpid(), nx=True, ex=ttl))
+        except Exception as e:
+            print(f"Resonance cache: lock Redis falló ({e})")
+            return True
+
+    def _load_shared(self):
+        if self._redis is None:
+            return None
+        try:
+            raw = self._redis.get(RESONANCE_CACHE_KEY)
+        except Exception as e:
+            print(f"Resonance cache: lectura Redis falló ({e})")
+            return None
+        if not raw:
+            return None
+        stored = json.loads(raw)
+        snapshot = (stored['data'], stored['fetched_at'])
+        self._snapshot = snapshot
+        return snapshot
+
+    def _store_shared(self, snapshot):
+        if self._redis is None:
+            return
+        data, fetched_at = snapshot
+        try:
+            self._redis.set(RESONANCE_CACHE_KEY, json.dumps({'data': data, 'fetched_at': fetched_at}),
+                            ex=int(self.stale_after * 4))
+        except Exception as e:
+            print(f"Resonance cache: escritura Redis falló ({e})")
+
+    def stats(self):
+        fetched_at = self._snapshot[1] if self._snapshot else None
+        return {
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'age_s': round(time.time() - fetched_at, 1) if fetched_at else None,
+            'shared': self._redis is not None
+        }
+
+
+_resonance_cache = None
+
+
+def get_resonance_cache():
+    """Instancia compartida del proceso"""
+    global _resonance_cache
+    if _resonance_cache is None:
+        _resonance_cache = ResonanceSnapshotCache()
+    return _resonance_cache
@@ -0,0 +1,126 @@
+# api/core/spreads.py
+"""Generador de tiradas reproducible y vectorizado.
+
+Cada tirada usa su propio generador NumPy (PCG64) con una semilla explícita:
+la misma semilla, el mismo modo y el mismo mazo dan siempre las mismas
+cartas, en el mismo orden y con las mismas inversiones. Si la petición no
+trae semilla se genera una y se devuelve, para poder reproducirla.
+
+draw_batch() produce N tiradas de una vez como matrices (N, k) de índices y
+de inversiones: una clave aleatoria por carta y tirada, argpartition para
+quedarse con las k menores y un argsort de solo esas k para el orden de las
+posiciones (muestra uniforme sin reemplazo). La tirada individual es la
+fila 0 de un lote de tamaño 1, así que ambos caminos coinciden.
+
+simulate() recorre millones de tiradas por bloques para el análisis Monte
+Carlo (frecuencia por carta, tasa de inversión, coste de activación).
+"""
+import numpy as np
+
+SPREAD_SIZES = {'single': 1, 'triple': 3, 'cross': 5}
+# Tope de semilla aceptada en la API (entero sin signo de 64 bits)
+MAX_SEED = 2 ** 64 - 1
+SIMULATION_CHUNK = 65536
+
+
+def spread_size(mode, deck_size):
+    """Cartas de la tirada: 'full' es el mazo entero, modo desconocido -> 1"""
+    if mode == 'full':
+        return deck_size
+    return min(SPREAD_SIZES.get(mode, 1), deck_size)
+
+
+def new_seed():
+    """Semilla nueva (entropía del sistema) de 53 bits: se devuelve en JSON y
+    tiene que sobrevivir a un Number de JavaScript"""
+    return int(np.random.SeedSequence().generate_state(1, dtype=np.uint64)[0] >> np.uint64(11))
+
+
+def parse_seed(value):
+    """Semilla de la petición -> int (None si no viene); ValueError si no es válida"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError("seed must be an integer")
+    seed = int(value)
+    if not 0 <= seed <= MAX_SEED:
+        raise ValueError("seed out of range")
+    return seed
+
+
+def make_rng(seed):
+    return np.random.Generator(np.random.PCG64(seed))
+
+
+def draw_batch(deck_size, k, n, rng):
+    """n tiradas de k cartas distintas: (índices (n, k) int32, inversiones (n, k) bool)"""
+    k = min(k, deck_size)
+    if n <= 0 or k <= 0:
+        return np.empty((max(n, 0), 0), dtype=np.int32), np.empty((max(n, 0), 0), dtype=bool)
+    keys = rng.random((n, deck_size), dtype=np.float32)
+    if k < deck_size:
+        chosen = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(keys, chosen, axis=1), axis=1)
+        indices = np.take_along_axis(chosen, order, axis=1)
+    else:
+        indices = np.argsort(keys, axis=1)
+    inverted = rng.random((n, k), dtype=np.float32) < 0.5
+    return indices.astype(np.int32), inverted
+
+
+def draw_spread(deck_size, mode, seed=None):
+    """Una tirada reproducible: (índices, inversiones, semilla usada)"""
+    if seed is None:
+        seed = new_seed()
+    indices, inverted = draw_batch(deck_size, spread_size(mode, deck_size), 1, make_rng(seed))
+    return indices[0].tolist(), inverted[0].tolist(), seed
+
+
+def draw_inversions(k, seed):
+    """Solo las inversiones de k cartas elegidas a mano (misma semilla -> mismas inversiones)"""
+    return (make_rng(seed).random(k, dtype=np.float32) < 0.5).tolist()
+
+
+def simulate(deck_size, mode, n, seed=None, costs=None, chunk=SIMULATION_CHUNK):
+    """Monte Carlo de n tiradas por bloques de 'chunk'.
+
+    Devuelve la frecuencia de cada carta (índice del mazo) por posición, la
+    tasa de inversión y, si se pasan los activation_cost del mazo, la
+    distribución del coste total por tirada.
+    """
+    if seed is None:
+        seed = new_seed()
+    rng = make_rng(seed)
+    k = spread_size(mode, deck_size)
+    frequency = np.zeros((k, deck_size), dtype=np.int64)
+    inverted_total = 0
+    cost_totals = []
+    costs = None if costs is None else np.nan_to_num(np.asarray(costs, dtype=np.float64))
+    done = 0
+    while done < n:
+        size = min(chunk, n - done)
+        indices, inverted = draw_batch(deck_size, k, size, rng)
+        for position in range(k):
+            frequency[position] += np.bincount(indices[:, position], minlength=deck_size)
+        inverted_total += int(inverted.sum())
+        if costs is not None:
+            cost_totals.append(costs[indices].sum(1))
+        done += size
+
+    result = {
+        'mode': mode,
+        'spreads': n,
+        'cards_per_spread': k,
+        'seed': seed,
+        'frequency': frequency,
+        'inversion_rate': inverted_total / max(n * k, 1)
+    }
+    if cost_totals:
+        totals = np.concatenate(cost_totals)
+        result['activation_cost'] = {
+            'mean': float(totals.mean()),
+            'std': float(totals.std()),
+            'p50': float(np.percentile(totals, 50)),
+            'p95': float(np.percentile(totals, 95))
+        }
+    return result
@@ -0,0 +1,67 @@
+# api/core/user_stats.py
+"""Agregados incrementales por usuario (tabla user_stats).
+
+Cada manifestación se pliega sobre el agregado en la misma transacción del
+INSERT, así las métricas contextuales se leen en O(1) sin recorrer el
+historial. Las ventanas guardan las últimas HISTORY_WINDOW entradas, la más
+reciente primero, igual que el historial que consumen compute_entropy y el
+perfil de compute_alignment.
+"""
+import os
+import numpy as np
+
+HISTORY_WINDOW = 10
+PROFILE_WINDOW = 5
+EWMA_ALPHA = float(os.getenv('STATS_EWMA_ALPHA', '0.2'))
+
+
+def _ewma(previous, value):
+    return value if previous is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * previous
+
+
+def fold_manifestation(stats, entropy, alignment, created_at):
+    """Incorpora una manifestación al agregado (in place)"""
+    # Listas nuevas: las columnas JSON solo detectan cambios por reasignación
+    stats.entropy_window = ([entropy] + list(stats.entropy_window or []))[:HISTORY_WINDOW]
+    stats.alignment_window = ([alignment] + list(stats.alignment_window or []))[:HISTORY_WINDOW]
+    stats.ewma_entropy = _ewma(stats.ewma_entropy, entropy)
+    stats.ewma_alignment = _ewma(stats.ewma_alignment, alignment)
+    if stats.first_entropy is None:
+        stats.first_entropy = entropy
+    stats.manifest_count = (stats.manifest_count or 0) + 1
+    stats.last_manifest_at = created_at
+    return stats
+
+
+def history_from_stats(stats):
+    """Historial reciente (más reciente primero) con la forma de las filas de manifests"""
+    if stats is None:
+        return []
+    return [
+        {'entropy': entropy, 'alignment': alignment}
+        for entropy, alignment in zip(stats.entropy_window or [], stats.alignment_window or [])
+    ]
+
+
+def profile_from_stats(stats, coherence):
+    """Perfil para compute_alignment: promedio de las últimas PROFILE_WINDOW alineaciones"""
+    recent = (stats.alignment_window or [])[:PROFILE_WINDOW] if stats is not None else []
+    return {'avg_alignment': np.mean(recent) if recent else 0.5, 'coherence': coherence}
+
+
+def seed_from_history(stats, recent_rows, manifest_count, first_entropy, last_manifest_at):
+    """Inicializa el agregado de un usuario con historial previo a user_stats.
+
+    recent_rows: (entropy, alignment) más reciente primero. Las EWMA se
+    reconstruyen plegando la ventana desde la entrada más antigua.
+    """
+    stats.entropy_window = [e for e, _ in recent_rows][:HISTORY_WINDOW]
+    stats.alignment_window = [a for _, a in recent_rows][:HISTORY_WINDOW]
+    stats.ewma_entropy = stats.ewma_alignment = None
+    for entropy, alignment in reversed(recent_rows):
+        stats.ewma_entropy = _ewma(stats.ewma_entropy, entropy)
+        stats.ewma_alignment = _ewma(stats.ewma_alignment, alignment)
+    stats.manifest_count = manifest_count
+    stats.first_entropy = first_entropy
+    stats.last_manifest_at = last_manifest_at
+    return stats
@@ -0,0 +1,249 @@
+# api/instrumentation.py
+"""Instrumentación por request: conteo de statements SQL y latencias.
+
+init_query_counter(app) engancha un listener al engine de SQLAlchemy que
+acumula en flask.g cuántos statements ejecuta cada request, separados por
+verbo (select/insert/update/...). Sirve para fijar presupuestos de queries
+en tests y, con QUERY_COUNT_HEADER=true, para verlos en X-Query-Count.
+
+init_tracing(app) mide cada request (histograma por ruta) y las etapas que
+el código marca con span('nombre'); el cliente saliente registra cada
+llamada como 'outbound.<host>'. Las etapas del request salen en la
+cabecera Server-Timing y los percentiles en perf_snapshot(). Con
+TRACING_ENABLED=false span() devuelve un objeto no-op compartido y no se
+registra ningún hook.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', 'false').lower() == 'true'
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+# Caracteres no permitidos en un token de Server-Timing (p. ej. el ':' de host:puerto)
+_TIMING_NAME_INVALID = re.compile(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]")
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context():
+        return
+    counts = g.get('query_counts')
+    if counts is None:
+        counts = g.query_counts = Counter()
+    counts[statement.lstrip().split(None, 1)[0].lower()] += 1
+
+
+def init_query_counter(app, db):
+    """Registra el contador en el engine de la app (una vez por engine)"""
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _count_statement):
+        event.listen(engine, 'before_cursor_execute', _count_statement)
+
+    if QUERY_COUNT_HEADER:
+        @app.after_request
+        def _query_count_header(response):
+            response.headers['X-Query-Count'] = str(get_query_count())
+            return response
+
+
+def get_query_count(verb=None):
+    """Statements ejecutados en el contexto actual (todos o solo un verbo SQL)"""
+    counts = g.get('query_counts') or Counter()
+    return counts[verb] if verb else sum(counts.values())
+
+
+def reset_query_count():
+    g.query_counts = Counter()
+
+
+# ------------------------------------------------------------------ tracing
+class LatencyHistogram:
+    """Histograma de latencias con buckets geométricos (memoria constante).
+
+    Los percentiles se estiman interpolando dentro del bucket; con un factor
+    de 1.2 el error relativo queda por debajo del 10 %.
+    """
+
+    MIN_MS = 0.05
+    FACTOR = 1.2
+    BUCKETS = 80     # 0.05 ms · 1.2^80 ≈ 11 min
+
+    __slots__ = ('counts', 'count', 'total', 'max', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * (self.BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def _bucket(self, ms):
+        if ms <= self.MIN_MS:
+            return 0
+        return min(self.BUCKETS, int(math.log(ms / self.MIN_MS, self.FACTOR)) + 1)
+
+    def _upper(self, index):
+        return self.MIN_MS * self.FACTOR ** index
+
+    def observe(self, ms):
+        index = self._bucket(ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += ms
+            if ms > self.max:
+                self.max = ms
+
+    def quantile(self, q):
+        with self._lock:
+            counts, count, maximum = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self._upper(index - 1) if index else 0.0
+                upper = min(self._upper(index), maximum)
+                return lower + (upper - lower) * max(0.0, rank - seen) / n
+            seen += n
+        return maximum
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.50), 3),
+            'p95_ms': round(self.quantile(0.95), 3),
+            'p99_ms': round(self.quantile(0.99), 3),
+            'max_ms': round(self.max, 3)
+        }
+
+
+class PerfRegistry:
+    """Histogramas por tipo ('route', 'stage', 'outbound') y nombre"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, kind, name, ms):
+        histogram = self._histograms.get((kind, name))
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault((kind, name), LatencyHistogram())
+        histogram.observe(ms)
+
+    def summary(self, kind, name):
+        histogram = self._histograms.get((kind, name))
+        return histogram.summary() if histogram is not None else LatencyHistogram().summary()
+
+    def snapshot(self):
+        with self._lock:
+            items = sorted(self._histograms.items())
+        result = {}
+        for (kind, name), histogram in items:
+            result.setdefault(kind, {})[name] = histogram.summary()
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+_perf = PerfRegistry()
+
+
+def get_perf_registry():
+    return _perf
+
+
+def perf_snapshot():
+    """p50/p95/p99 por ruta, etapa y host saliente"""
+    return _perf.snapshot()
+
+
+def record_timing(kind, name, seconds):
+    """Registra una duración ya medida (histograma + Server-Timing si hay request)"""
+    if not TRACING_ENABLED:
+        return
+    ms = seconds * 1000
+    _perf.observe(kind, name, ms)
+    if has_app_context():
+        timings = g.get('server_timings')
+        if timings is None:
+            timings = g.server_timings = []
+        timings.append((name, ms))
+
+
+class _Span:
+    __slots__ = ('name', 'kind', 'started')
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_timing(self.kind, self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name, kind='stage'):
+    """with span('manifest.analysis'): ... -> mide la etapa"""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, kind)
+
+
+def server_timing_header(timings, total_ms=None):
+    """[(nombre, ms)] -> valor de Server-Timing (las repeticiones se suman)"""
+    merged = {}
+    for name, ms in timings:
+        merged[name] = merged.get(name, 0.0) + ms
+    parts = [f"{_TIMING_NAME_INVALID.sub('_', name)};dur={ms:.2f}" for name, ms in merged.items()]
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.2f}")
+    return ', '.join(parts)
+
+
+def init_tracing(app):
+    """Histograma por ruta y cabecera Server-Timing (no hace nada si está desactivado)"""
+    if not TRACING_ENABLED:
+        return
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request_timing(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        total_ms = (time.perf_counter() - started) * 1000
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        _perf.observe('route', f"{request.method} {rule}", total_ms)
+        response.headers['Server-Timing'] = server_timing_header(g.get('server_timings') or (), total_ms)
+        return response
@@ -3,6 +3,7 @@ import os
 import requests
 import json
 from dotenv import load_dotenv
+from integrations.http_client import outbound
 
 # Cargar variables de entorno (para la API Key)
 load_dotenv(dotenv_path='api/migrations/.env')
@@ -10,6 +11,9 @@ load_dotenv(dotenv_path='api/migrations/.env')
 # La URL de la API de Gemini (Nodo Coral)
 CORAL_NODE_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro-latest:generateContent"
 
+# Análisis profundo: presupuesto de 120s y sin reintentos (el POST no es idempotente)
+outbound.configure_host("generativelanguage.googleapis.com", timeout=120, retries=0, max_concurrency=2)
+
 def deposit_logs_to_coral_node(kpi_data: dict, architect_seed: str, world_context: str) -> str:
     """
     Deposita los logs (KPIs) en el Nodo Coral (Gemini) para un análisis profundo.
@@ -70,7 +74,7 @@ def deposit_logs_to_coral_node(kpi_data: dict, architect_seed: str, world_contex
     }
 
     try:
-        response = requests.post(f"{CORAL_NODE_API_URL}?key={api_key}", headers=headers, data=json.dumps(payload), timeout=120)
+        response = outbound.post(f"{CORAL_NODE_API_URL}?key={api_key}", headers=headers, data=json.dumps(payload))
         
         response.raise_for_status()  # Lanza un error si la respuesta es 4xx o 5xx
         
@@ -0,0 +1,323 @@
+# api/integrations/generation_cache.py
+"""Cache direccionado por contenido para generate_text.
+
+La clave es sha256(modelo, sha256(prompt), parámetros), así que la misma
+intención + máscara + métricas no vuelve a costar una inferencia remota.
+Capas:
+  - LRU en memoria con TTL (GENERATION_CACHE_SIZE / GENERATION_CACHE_TTL)
+  - Single-flight: peticiones idénticas concurrentes esperan a una sola llamada
+  - Capa persistente opcional (GENERATION_CACHE_BACKEND=disk|redis) que
+    sobrevive a reinicios y se comparte entre workers
+
+Las respuestas de error ([ERROR_HF ...], [EXCEPTION ...]) nunca se guardan.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # Redis es opcional
+    redis = None
+
+GENERATION_CACHE_SIZE = int(os.getenv('GENERATION_CACHE_SIZE', '1024'))
+GENERATION_CACHE_TTL = float(os.getenv('GENERATION_CACHE_TTL', '86400'))
+GENERATION_CACHE_BACKEND = os.getenv('GENERATION_CACHE_BACKEND', 'memory').lower()
+GENERATION_CACHE_PATH = os.getenv(
+    'GENERATION_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'generation_cache')
+)
+# Tope de entradas de la capa disk y cada cuánto se poda (caducadas + las más viejas sobre el tope)
+GENERATION_CACHE_DISK_MAX_ENTRIES = int(os.getenv('GENERATION_CACHE_DISK_MAX_ENTRIES', '100000'))
+GENERATION_CACHE_PRUNE_INTERVAL = float(os.getenv('GENERATION_CACHE_PRUNE_INTERVAL', '600'))
+REDIS_URL = os.getenv('REDIS_URL')
+
+ERROR_PREFIXES = ('[ERROR_HF', '[EXCEPTION')
+
+
+def generation_key(model, prompt, params):
+    """Clave estable para (modelo, prompt, parámetros de generación)"""
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    material = json.dumps([model, prompt_hash, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(text):
+    return isinstance(text, str) and not text.startswith(ERROR_PREFIXES)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+class DiskTier:
+    """Un archivo JSON por clave (escritura atómica con os.replace).
+
+    El mtime de cada archivo es su caducidad, así que prune() decide con un
+    stat por archivo: borra las caducadas, los .tmp huérfanos y, si sigue
+    habiendo más de max_entries, las que caducan antes. set() lanza la poda
+    en un hilo de fondo como mucho cada prune_interval segundos.
+    """
+
+    def __init__(self, path, max_entries=GENERATION_CACHE_DISK_MAX_ENTRIES,
+                 prune_interval=GENERATION_CACHE_PRUNE_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        os.makedirs(path, exist_ok=True)
+        self._prune_lock = threading.Lock()
+        self._pruning = False
+        self._next_prune = time.monotonic() + prune_interval
+        self.pruned = 0
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key):
+        target = self._file(key)
+        try:
+            with open(target, encoding='utf-8') as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if entry['expires_at'] < time.time():
+            _remove(target)
+            return None
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        target = self._file(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        expires_at = time.time() + ttl
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump({'value': value, 'expires_at': expires_at}, fh, ensure_ascii=False)
+        os.utime(tmp, (expires_at, expires_at))
+        os.replace(tmp, target)
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        with self._prune_lock:
+            if self._pruning or time.monotonic() < self._next_prune:
+                return
+            self._pruning = True
+        threading.Thread(target=self.prune, name='generation-cache-prune', daemon=True).start()
+
+    def prune(self):
+        """Borra caducadas, .tmp huérfanos y el exceso sobre max_entries; devuelve cuántos borró"""
+        try:
+            now = time.time()
+            removed = 0
+            live = []
+            for shard in os.scandir(self.path):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        mtime = entry.stat().st_mtime
+                    except OSError:
+                        continue
+                    if entry.name.endswith('.tmp'):
+                        # Escritura a medias de un proceso caído (las vivas duran milisegundos)
+                        if mtime < now - self.prune_interval:
+                            removed += _remove(entry.path)
+                    elif mtime < now:
+                        removed += _remove(entry.path)
+                    else:
+                        live.append((mtime, entry.path))
+            if len(live) > self.max_entries:
+                live.sort()
+                for _, path in live[:len(live) - self.max_entries]:
+                    removed += _remove(path)
+            self.pruned += removed
+            return removed
+        finally:
+            with self._prune_lock:
+                self._pruning = False
+                self._next_prune = time.monotonic() + self.prune_interval
+
+
+class RedisTier:
+    PREFIX = 'aethos:generation:'
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    def get(self, key):
+        raw = self.client.get(self.PREFIX + key)
+        return raw.decode('utf-8') if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.PREFIX + key, value.encode('utf-8'), ex=max(1, int(ttl)))
+
+
+class _Flight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class GenerationCache:
+    """LRU + TTL con single-flight y capa persistente opcional"""
+
+    def __init__(self, maxsize=GENERATION_CACHE_SIZE, ttl=GENERATION_CACHE_TTL, tier=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.tier = tier
+        self._entries = OrderedDict()    # key -> (value, expires_at)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'tier_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'uncacheable': 0,
+            'tier_errors': 0
+        }
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.upstream_max_seconds = 0.0
+
+    def get_or_compute(self, key, compute):
+        """Devuelve el valor cacheado o ejecuta compute() una sola vez por clave"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] >= time.time():
+                    self._entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return entry[0]
+                del self._entries[key]
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.counters['coalesced'] += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._tier_get(key)
+            if value is not None:
+                with self._lock:
+                    self.counters['tier_hits'] += 1
+            else:
+                with self._lock:
+                    self.counters['misses'] += 1
+                value = self._call_upstream(compute)
+                if is_cacheable(value):
+                    self._tier_set(key, value)
+                else:
+                    with self._lock:
+                        self.counters['uncacheable'] += 1
+
+            if is_cacheable(value):
+                self._store(key, value)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _call_upstream(self, compute):
+        started = time.monotonic()
+        try:
+            return compute()
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.upstream_calls += 1
+                self.upstream_seconds += elapsed
+                self.upstream_max_seconds = max(self.upstream_max_seconds, elapsed)
+
+    def _store(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _tier_get(self, key):
+        if self.tier is None:
+            return None
+        try:
+            return self.tier.get(key)
+        except Exception as e:
+            print(f"Generation cache tier read failed: {e}")
+            with self._lock:
+                self.counters['tier_errors'] += 1
+            return None
+
+    def _tier_set(self, key, value):
+        if self.tier is None:
+            return
+        try:
+            self.tier.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Generation cache tier write failed: {e}")
+            with self._lock:
+                self.counters['tier_errors'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['tier_hits'] + self.counters['misses'] + self.counters['coalesced']
+            served = lookups - self.counters['misses']
+            return {
+                **self.counters,
+                'size': len(self._entries),
+                'hit_ratio': round(served / lookups, 4) if lookups else 0.0,
+                'upstream_calls': self.upstream_calls,
+                'upstream_avg_ms': round(self.upstream_seconds / self.upstream_calls * 1000, 2) if self.upstream_calls else 0.0,
+                'upstream_max_ms': round(self.upstream_max_seconds * 1000, 2),
+                'backend': type(self.tier).__name__ if self.tier else 'memory'
+            }
+
+
+def _build_tier(backend):
+    if backend == 'disk':
+        return DiskTier(GENERATION_CACHE_PATH)
+    if backend == 'redis':
+        if redis is None or not REDIS_URL:
+            print("Generation cache: backend redis sin cliente o REDIS_URL, usando solo memoria")
+            return None
+        return RedisTier(REDIS_URL)
+    return None
+
+
+_generation_cache = None
+
+
+def get_generation_cache():
+    """Instancia compartida del proceso"""
+    global _generation_cache
+    if _generation_cache is None:
+        _generation_cache = GenerationCache(tier=_build_tier(GENERATION_CACHE_BACKEND))
+    return _generation_cache
@@ -0,0 +1,336 @@
+# api/integrations/http_client.py
+"""Capa compartida de HTTP saliente para todas las integraciones.
+
+- Un requests.Session por host con pool keep-alive (HTTPAdapter).
+- Límite de concurrencia por host (semáforo) para no agotar workers.
+- Presupuesto de tiempo por llamada que incluye los reintentos, con backoff
+  exponencial + jitter ante errores de conexión, timeouts y 429/5xx.
+- Variantes async sobre aiohttp (un ClientSession por event loop); sin
+  aiohttp se delega la versión síncrona a un executor. La sesión vive lo
+  que viva su loop: hay que reutilizar el loop (no asyncio.run por llamada)
+  y llamar a aclose() antes de cerrarlo.
+
+Los errores propios heredan de requests.RequestException, así que el
+manejo existente en las integraciones sigue funcionando.
+"""
+import asyncio
+import functools
+import os
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass, replace
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import record_timing
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp es opcional: las variantes async usan un executor
+    aiohttp = None
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class OutboundError(requests.exceptions.RequestException):
+    """Error de la capa saliente"""
+
+
+class OutboundSaturated(OutboundError):
+    """No hubo turno en el límite de concurrencia del host dentro del presupuesto"""
+
+
+class OutboundTimeout(OutboundError, requests.exceptions.Timeout):
+    """Se agotó el presupuesto de tiempo de la llamada"""
+
+
+@dataclass(frozen=True)
+class HostPolicy:
+    timeout: float = float(os.getenv('OUTBOUND_TIMEOUT', '10'))       # presupuesto total (s)
+    connect_timeout: float = float(os.getenv('OUTBOUND_CONNECT_TIMEOUT', '3.05'))
+    retries: int = int(os.getenv('OUTBOUND_RETRIES', '2'))
+    backoff: float = float(os.getenv('OUTBOUND_BACKOFF', '0.25'))
+    max_concurrency: int = int(os.getenv('OUTBOUND_MAX_PER_HOST', '8'))
+    pool_size: int = int(os.getenv('OUTBOUND_POOL_SIZE', '16'))
+
+
+class AsyncResponse:
+    """Respuesta mínima de las variantes async (interfaz tipo requests.Response)"""
+
+    def __init__(self, status_code, text, headers, url):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.url = url
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        import json
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class _HostState:
+    def __init__(self, host, policy):
+        self.host = host
+        self.policy = policy
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=policy.pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.semaphore = threading.BoundedSemaphore(policy.max_concurrency)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.saturated = 0
+        self.in_flight = 0
+        self.latency_total = 0.0
+
+    def record(self, elapsed, failed):
+        with self.lock:
+            self.requests += 1
+            self.latency_total += elapsed
+            if failed:
+                self.failures += 1
+        record_timing('outbound', f"outbound.{self.host}", elapsed)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'failures': self.failures,
+                'retries': self.retries,
+                'saturated': self.saturated,
+                'in_flight': self.in_flight,
+                'avg_latency_ms': round(self.latency_total / self.requests * 1000, 2) if self.requests else 0.0,
+                'max_concurrency': self.policy.max_concurrency
+            }
+
+
+class OutboundClient:
+    """Cliente saliente con pools, límites y presupuestos por host"""
+
+    def __init__(self, default_policy=None):
+        self.default_policy = default_policy or HostPolicy()
+        self._policies = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+        # loop -> (ClientSession, {host: asyncio.Semaphore})
+        self._async_state = weakref.WeakKeyDictionary()
+
+    # ---------------------------------------------------------------- config
+    def configure_host(self, host, **overrides):
+        """Ajusta la política de un host (timeout, retries, max_concurrency, ...)"""
+        with self._lock:
+            self._policies[host] = replace(self._policies.get(host, self.default_policy), **overrides)
+            state = self._hosts.pop(host, None)
+        if state is not None:
+            state.session.close()
+
+    def policy_for(self, host):
+        return self._policies.get(host, self.default_policy)
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            with self._lock:
+                state = self._hosts.get(host)
+                if state is None:
+                    state = self._hosts[host] = _HostState(host, self.policy_for(host))
+        return state
+
+    # ------------------------------------------------------------ retry plan
+    @staticmethod
+    def _should_retry(method, status, attempt, policy, retry_non_idempotent):
+        if attempt >= policy.retries:
+            return False
+        if method not in IDEMPOTENT_METHODS and not retry_non_idempotent:
+            return False
+        return status is None or status in RETRY_STATUSES
+
+    @staticmethod
+    def _backoff(policy, attempt, response=None):
+        delay = policy.backoff * (2 ** attempt) * (0.5 + random.random())
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    # ------------------------------------------------------------------ sync
+    def request(self, method, url, *, timeout=None, retries=None, retry_non_idempotent=False, **kwargs):
+        """requests.request con pool por host, límite de concurrencia y reintentos.
+
+        timeout es el presupuesto total de la llamada (incluye reintentos).
+        """
+        method = method.upper()
+        host = urlsplit(url).netloc
+        state = self._state(host)
+        policy = state.policy
+        if timeout is not None or retries is not None:
+            policy = replace(policy, timeout=timeout or policy.timeout,
+                             retries=policy.retries if retries is None else retries)
+        deadline = time.monotonic() + policy.timeout
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OutboundTimeout(f"Presupuesto agotado para {host}")
+            if not state.semaphore.acquire(timeout=remaining):
+                with state.lock:
+                    state.saturated += 1
+                raise OutboundSaturated(f"Límite de concurrencia alcanzado para {host}")
+
+            response, error = None, None
+            started = time.monotonic()
+            with state.lock:
+                state.in_flight += 1
+            try:
+                # La espera por el semáforo sale del presupuesto
+                remaining = max(deadline - time.monotonic(), 0.001)
+                response = state.session.request(
+                    method, url, timeout=(min(policy.connect_timeout, remaining), remaining), **kwargs
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+                state.semaphore.release()
+                state.record(time.monotonic() - started, response is None or response.status_code >= 500)
+
+            status = response.status_code if response is not None else None
+            if not self._should_retry(method, status, attempt, policy, retry_non_idempotent):
+                if response is not None:
+                    return response
+                raise error
+
+            delay = self._backoff(policy, attempt, response)
+            if time.monotonic() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+            with state.lock:
+                state.retries += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    # ----------------------------------------------------------------- async
+    def _async_session(self, loop, state):
+        entry = self._async_state.get(loop)
+        if entry is None or entry[0].closed:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.default_policy.pool_size,
+                                             keepalive_timeout=30)
+            entry = (aiohttp.ClientSession(connector=connector), {})
+            self._async_state[loop] = entry
+        session, semaphores = entry
+        semaphore = semaphores.get(state.host)
+        if semaphore is None:
+            semaphore = semaphores[state.host] = asyncio.Semaphore(state.policy.max_concurrency)
+        return session, semaphore
+
+    async def arequest(self, method, url, *, timeout=None, retries=None, retry_non_idempotent=False, **kwargs):
+        """Variante async de request(); devuelve AsyncResponse"""
+        if aiohttp is None:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(self.request, method, url, timeout=timeout, retries=retries,
+                                     retry_non_idempotent=retry_non_idempotent, **kwargs)
+            response = await loop.run_in_executor(None, call)
+            return AsyncResponse(response.status_code, response.text, response.headers, response.url)
+
+        method = method.upper()
+        host = urlsplit(url).netloc
+        state = self._state(host)
+        policy = state.policy
+        if timeout is not None or retries is not None:
+            policy = replace(policy, timeout=timeout or policy.timeout,
+                             retries=policy.retries if retries is None else retries)
+        session, semaphore = self._async_session(asyncio.get_running_loop(), state)
+        deadline = time.monotonic() + policy.timeout
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OutboundTimeout(f"Presupuesto agotado para {host}")
+            try:
+                await asyncio.wait_for(semaphore.acquire(), remaining)
+            except asyncio.TimeoutError:
+                with state.lock:
+                    state.saturated += 1
+                raise OutboundSaturated(f"Límite de concurrencia alcanzado para {host}")
+
+            response, error = None, None
+            started = time.monotonic()
+            with state.lock:
+                state.in_flight += 1
+            try:
+                remaining = max(deadline - time.monotonic(), 0.001)
+                client_timeout = aiohttp.ClientTimeout(total=remaining,
+                                                       connect=min(policy.connect_timeout, remaining))
+                async with session.request(method, url, timeout=client_timeout, **kwargs) as raw:
+                    response = AsyncResponse(raw.status, await raw.text(), raw.headers, str(raw.url))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = OutboundTimeout(str(e)) if isinstance(e, asyncio.TimeoutError) else OutboundError(str(e))
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+                semaphore.release()
+                state.record(time.monotonic() - started, response is None or response.status_code >= 500)
+
+            status = response.status_code if response is not None else None
+            if not self._should_retry(method, status, attempt, policy, retry_non_idempotent):
+                if response is not None:
+                    return response
+                raise error
+
+            delay = self._backoff(policy, attempt, response)
+            if time.monotonic() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+            with state.lock:
+                state.retries += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aget(self, url, **kwargs):
+        return await self.arequest('GET', url, **kwargs)
+
+    async def apost(self, url, **kwargs):
+        return await self.arequest('POST', url, **kwargs)
+
+    async def aclose(self):
+        """Cierra la sesión aiohttp del loop actual"""
+        entry = self._async_state.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].close()
+
+    # ----------------------------------------------------------------- stats
+    def stats(self):
+        """Contadores por host: requests, fallos, reintentos, saturación, latencia media"""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        return {state.host: state.snapshot() for state in hosts}
+
+
+# Cliente compartido por todas las integraciones del proceso
+outbound = OutboundClient()
@@ -1,35 +1,79 @@
 import os
-import requests
+import hashlib
+import logging
 import numpy as np
+from collections import Counter
 from datetime import datetime
+from core.cluster_lexicon import get_matcher
+from integrations.http_client import outbound
+from integrations.generation_cache import generation_key, get_generation_cache
+from integrations.local_generation import LOCAL_GENERATION_MODEL, generate_local, local_generation_available
 
 HF_TOKEN = os.environ.get("HUGGINGFACE_TOKEN")
 HF_API_URL = "https://api-inference.huggingface.co/models"
 
+logger = logging.getLogger(__name__)
+
+# remote = Inference API de HF; local = modelo CPU en proceso (integrations.local_generation)
+GENERATION_BACKEND = os.getenv("GENERATION_BACKEND", "remote").lower()
+if GENERATION_BACKEND == "local" and not local_generation_available():
+    logger.warning("GENERATION_BACKEND=local sin torch/transformers, usando Inference API remota")
+    GENERATION_BACKEND = "remote"
+
+# La inferencia puede tardar (wait_for_model): presupuesto amplio y un solo reintento
+outbound.configure_host("api-inference.huggingface.co", timeout=45, retries=1, max_concurrency=4)
+
+EMBEDDING_DIM = 128
+KEYWORD_STRIP = '.,;:!?()[]{}"'
+
+_EMBEDDING_STREAM = np.arange(1, EMBEDDING_DIM + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+
+# Parámetros de muestreo (forman parte de la clave del cache de generación)
+GENERATION_PARAMS = {
+    "temperature": 0.85,
+    "top_p": 0.95,
+    "repetition_penalty": 1.2
+}
+
 def generate_text(prompt, model="microsoft/DialoGPT-large", max_tokens=200):
-    """Generación de texto con modelos más avanzados"""
+    """Generación de texto con modelos más avanzados.
+
+    Pasa por el cache de generación: prompts idénticos (mismo modelo y
+    parámetros) se sirven sin inferencia y las peticiones concurrentes
+    iguales comparten una sola llamada. Con GENERATION_BACKEND=local el
+    modelo es LOCAL_GENERATION_MODEL y se ignora el argumento model.
+    """
+    params = {**GENERATION_PARAMS, "max_new_tokens": max_tokens}
+    if GENERATION_BACKEND == "local":
+        return get_generation_cache().get_or_compute(
+            generation_key(f"local:{LOCAL_GENERATION_MODEL}", prompt, params),
+            lambda: generate_local(prompt, params)
+        )
+
     if not HF_TOKEN:
         # Fallback determinista en staging: no dependemos de aleatoriedad
         return f"[SIMULATED] {prompt[:100]}... [Configure HUGGINGFACE_TOKEN para respuestas reales]"
-    
+
+    return get_generation_cache().get_or_compute(
+        generation_key(model, prompt, params),
+        lambda: _generate_remote(prompt, model, params)
+    )
+
+def _generate_remote(prompt, model, params):
+    """Llamada a la Inference API de Hugging Face"""
     headers = {"Authorization": f"Bearer {HF_TOKEN}"}
     payload = {
         "inputs": prompt,
-        "parameters": {
-            "max_new_tokens": max_tokens,
-            "temperature": 0.85,
-            "top_p": 0.95,
-            "repetition_penalty": 1.2
-        },
+        "parameters": params,
         "options": {"wait_for_model": True}
     }
     
     try:
-        response = requests.post(
+        response = outbound.post(
             f"{HF_API_URL}/{model}",
             headers=headers,
             json=payload,
-            timeout=45
+            retry_non_idempotent=True
         )
         if response.status_code == 200:
             result = response.json()
@@ -45,21 +89,14 @@ def analyze_narrative(text):
     depth_score = analyze_semantic_depth(text)
     
     # Extracción de keywords mejorada
-    words = [w.strip('.,;:!?()[]{}"').lower() for w in text.split() if len(w) > 4]
-    word_freq = {}
-    for word in words:
-        word_freq[word] = word_freq.get(word, 0) + 1
-    
-    keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:8]
+    keywords = _extract_keywords(text.split())
     
     # Determinación de clúster basada en contenido semántico
     cluster = determine_semantic_cluster(text, keywords)
     
     # Cálculo de vector de embedding: uso una función determinista en staging
     # EN PRODUCCIÓN: reemplazar por llamadas a HF embeddings y normalizar.
-    seed = abs(hash(text)) % (10 ** 8)
-    rng = np.random.RandomState(seed)
-    embedding = list(rng.normal(0, 1, 128))
+    embedding = narrative_embeddings([text])[0].tolist()
 
     # Resonance score determinista basado en depth_score y keywords
     resonance_score = min(0.99, 0.2 + 0.6 * depth_score + 0.02 * len(keywords))
@@ -73,6 +110,90 @@ def analyze_narrative(text):
         "resonance_score": float(resonance_score)
     }
 
+def analyze_narratives(texts):
+    """Análisis por lotes equivalente a analyze_narrative para backfills.
+
+    Tokeniza cada texto una sola vez, puntúa todos los clústeres con el
+    autómata Aho–Corasick del léxico y devuelve resultados columnares: listas
+    para keywords/cluster, arrays para semantic_depth/resonance_score y un solo
+    ndarray (N, 128) float32 en "embeddings".
+    """
+    texts = list(texts)
+    matcher = get_matcher()
+
+    keywords = []
+    depth_counts = []
+    cluster_counts = []
+    for text in texts:
+        tokens = text.split()
+        top = _extract_keywords(tokens)
+        keywords.append([k[0] for k in top])
+
+        # Palabras complejas, preguntas, énfasis y oraciones (ver analyze_semantic_depth)
+        depth_counts.append(
+            sum(len(w) > 6 for w in tokens)
+            + text.count('?')
+            + text.count('!')
+            + sum(1 for s in text.split('.') if s.strip())
+        )
+
+        cluster_counts.append(matcher.cluster_counts(text, top))
+
+    semantic_depth = np.minimum(1.0, np.array(depth_counts, dtype=np.float64) / 50)
+    keyword_totals = np.array([len(k) for k in keywords], dtype=np.float64)
+    resonance_score = np.minimum(0.99, 0.2 + 0.6 * semantic_depth + 0.02 * keyword_totals)
+
+    cluster_scores = np.array(cluster_counts, dtype=np.float64).reshape(len(texts), len(matcher.names))
+    cluster_scores *= np.array(matcher.trend_weights)
+    clusters = [matcher.names[idx] for idx in cluster_scores.argmax(axis=1)]
+
+    return {
+        "keywords": keywords,
+        "cluster": clusters,
+        "semantic_depth": semantic_depth,
+        "embeddings": narrative_embeddings(texts),
+        "temporal_marker": datetime.now().isoformat(),
+        "resonance_score": resonance_score
+    }
+
+def narrative_embeddings(texts):
+    """Embeddings deterministas (N, 128) float32 para staging.
+
+    Cada texto se reduce a una semilla estable (blake2b) y los componentes
+    salen de un generador por contador (splitmix64 + Box-Muller), así el lote
+    completo se calcula en NumPy sin instanciar un RandomState por texto.
+    A diferencia de hash(), la semilla no depende de PYTHONHASHSEED, por lo
+    que el vector es el mismo en todos los workers.
+    """
+    seeds = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'little') for t in texts),
+        dtype=np.uint64,
+        count=len(texts)
+    )
+    bits = _splitmix64(seeds[:, None] + _EMBEDDING_STREAM)
+    # 53 bits de mantisa -> uniforme en (0, 1]
+    uniforms = ((bits >> np.uint64(11)).astype(np.float64) + 1.0) / 9007199254740992.0
+
+    half = EMBEDDING_DIM // 2
+    radius = np.sqrt(-2.0 * np.log(uniforms[:, :half]))
+    angle = 2.0 * np.pi * uniforms[:, half:]
+
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    embeddings[:, :half] = radius * np.cos(angle)
+    embeddings[:, half:] = radius * np.sin(angle)
+    return embeddings
+
+def _splitmix64(x):
+    """Finalizador splitmix64 sobre arrays uint64 (la aritmética desborda módulo 2**64)"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _extract_keywords(tokens, limit=8):
+    """Top keywords (palabra, frecuencia) a partir de tokens ya separados"""
+    words = [w.strip(KEYWORD_STRIP).lower() for w in tokens if len(w) > 4]
+    return Counter(words).most_common(limit)
+
 def analyze_semantic_depth(text):
     """Analiza la profundidad semántica del texto"""
     depth_indicators = [
@@ -84,33 +205,10 @@ def analyze_semantic_depth(text):
     return min(1.0, sum(depth_indicators) / 50)
 
 def determine_semantic_cluster(text, keywords):
-    """Determina el clúster semántico basado en análisis de contenido"""
-    text_lower = text.lower()
-    
-    cluster_patterns = {
-        "AETHOS": ["crear", "construir", "diseñar", "manifestar", "generar"],
-        "VÍNCULO": ["amar", "conectar", "relacionar", "compartir", "comunidad"],
-        "TRANSFORMACIÓN": ["cambiar", "evolucionar", "crecer", "transformar", "renacer"],
-        "CAOS": ["desorden", "confusión", "incertidumbre", "ruido", "fragmentación"],
-        "ORDEN": ["estructura", "sistema", "organizar", "plan", "patrón"],
-        "SOMBRA": ["miedo", "bloqueo", "resistencia", "duda", "crítico"],
-        "MANIFESTACIÓN": ["lograr", "conseguir", "materializar", "realizar", "cumplir"]
-    }
-    
-    cluster_scores = {}
-    for cluster, patterns in cluster_patterns.items():
-        score = sum(text_lower.count(pattern) for pattern in patterns)
-        score += sum(k[0] in patterns for k in keywords) * 2
-        cluster_scores[cluster] = score
-    
-    # Añadir tendencias temporales (simuladas)
-    current_trends = {
-        "AETHOS": 0.8,  # Tendencia alta en 2025
-        "TRANSFORMACIÓN": 0.7,
-        "VÍNCULO": 0.6
-    }
-    
-    for cluster, trend in current_trends.items():
-        cluster_scores[cluster] = cluster_scores.get(cluster, 0) * (1 + trend)
-    
-    return max(cluster_scores.items(), key=lambda x: x[1])[0]
\ No newline at end of file
+    """Determina el clúster semántico basado en análisis de contenido.
+
+    Una sola pasada del autómata del léxico (core.cluster_lexicon) cuenta todos
+    los términos de todos los clústeres; las keywords suman 2 si coinciden
+    exactamente con un término y las tendencias temporales ponderan el score.
+    """
+    return get_matcher().classify(text, keywords)
\ No newline at end of file
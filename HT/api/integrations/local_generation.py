@@ -0,0 +1,185 @@
+# api/integrations/local_generation.py
+"""Backend de generación local (CPU) con batching dinámico.
+
+Con GENERATION_BACKEND=local, generate_text usa un modelo causal pequeño
+(LOCAL_GENERATION_MODEL, por defecto distilgpt2) que se carga una sola vez
+por worker. Los prompts concurrentes se agrupan en un único forward pass:
+el DynamicBatcher espera hasta LOCAL_GENERATION_MAX_WAIT_MS desde el primer
+prompt o hasta juntar LOCAL_GENERATION_MAX_BATCH, lo que ocurra antes.
+
+torch/transformers son opcionales: si no están instalados el backend local
+no está disponible y generate_text sigue usando la Inference API remota.
+Si la carga del modelo falla, el error se recuerda durante
+LOCAL_GENERATION_RETRY_S segundos: las peticiones fallan al momento en vez
+de reintentar la carga (y esperar el lock) una por una.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+except ImportError:  # Dependencias pesadas opcionales
+    torch = None
+    AutoModelForCausalLM = AutoTokenizer = None
+
+LOCAL_GENERATION_MODEL = os.getenv('LOCAL_GENERATION_MODEL', 'distilgpt2')
+LOCAL_GENERATION_MAX_BATCH = int(os.getenv('LOCAL_GENERATION_MAX_BATCH', '8'))
+LOCAL_GENERATION_MAX_WAIT_MS = float(os.getenv('LOCAL_GENERATION_MAX_WAIT_MS', '25'))
+LOCAL_GENERATION_MAX_INPUT_TOKENS = int(os.getenv('LOCAL_GENERATION_MAX_INPUT_TOKENS', '512'))
+LOCAL_GENERATION_THREADS = int(os.getenv('LOCAL_GENERATION_THREADS', '0'))  # 0 = default de torch
+LOCAL_GENERATION_RETRY_S = float(os.getenv('LOCAL_GENERATION_RETRY_S', '60'))
+
+
+def local_generation_available():
+    return torch is not None
+
+
+class DynamicBatcher:
+    """Agrupa peticiones concurrentes y las procesa en lotes.
+
+    process_batch recibe una lista de items y devuelve una lista de
+    resultados del mismo tamaño y orden. submit() devuelve un Future.
+    """
+
+    def __init__(self, process_batch, max_batch_size=LOCAL_GENERATION_MAX_BATCH,
+                 max_wait_ms=LOCAL_GENERATION_MAX_WAIT_MS, name='dynamic-batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'pending': self._queue.qsize()
+        }
+
+
+class LocalGenerator:
+    """Modelo causal en CPU; generate_batch hace un forward por grupo de parámetros"""
+
+    def __init__(self, model_name=LOCAL_GENERATION_MODEL):
+        if torch is None:
+            raise RuntimeError("torch/transformers no instalados: backend local no disponible")
+        if LOCAL_GENERATION_THREADS:
+            torch.set_num_threads(LOCAL_GENERATION_THREADS)
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Padding a la izquierda: la continuación empieza donde acaba cada prompt
+        self.tokenizer.padding_side = 'left'
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_name)
+        self.model.eval()
+
+    def generate_batch(self, items):
+        """items: [(prompt, params)] -> [texto generado]"""
+        results = [None] * len(items)
+        groups = {}
+        for idx, (prompt, params) in enumerate(items):
+            groups.setdefault(tuple(sorted(params.items())), []).append(idx)
+
+        for key, indices in groups.items():
+            params = dict(key)
+            prompts = [items[i][0] for i in indices]
+            encoded = self.tokenizer(prompts, return_tensors='pt', padding=True, truncation=True,
+                                     max_length=LOCAL_GENERATION_MAX_INPUT_TOKENS)
+            with torch.inference_mode():
+                output = self.model.generate(
+                    **encoded,
+                    max_new_tokens=params.get('max_new_tokens', 200),
+                    do_sample=True,
+                    temperature=params.get('temperature', 1.0),
+                    top_p=params.get('top_p', 1.0),
+                    repetition_penalty=params.get('repetition_penalty', 1.0),
+                    pad_token_id=self.tokenizer.pad_token_id
+                )
+            prompt_len = encoded['input_ids'].shape[1]
+            texts = self.tokenizer.batch_decode(output[:, prompt_len:], skip_special_tokens=True)
+            for i, text in zip(indices, texts):
+                results[i] = items[i][0] + text
+        return results
+
+
+_local_batcher = None
+_local_lock = threading.Lock()
+_local_failure = None    # (mensaje, monotonic a partir del cual se reintenta la carga)
+
+
+def _raise_if_backing_off():
+    failure = _local_failure
+    if failure is not None and time.monotonic() < failure[1]:
+        raise RuntimeError(f"Modelo local no disponible: {failure[0]}")
+
+
+def get_local_batcher():
+    """Carga el modelo una vez por worker y devuelve su batcher"""
+    global _local_batcher, _local_failure
+    if _local_batcher is None:
+        _raise_if_backing_off()
+        with _local_lock:
+            if _local_batcher is None:
+                _raise_if_backing_off()
+                try:
+                    generator = LocalGenerator()
+                except Exception as e:
+                    print(f"Local generation model load failed: {e}")
+                    _local_failure = (str(e), time.monotonic() + LOCAL_GENERATION_RETRY_S)
+                    raise
+                _local_failure = None
+                _local_batcher = DynamicBatcher(generator.generate_batch, name='local-generation')
+    return _local_batcher
+
+
+def generate_local(prompt, params):
+    """Genera con el modelo local; mismo contrato de errores que la ruta remota"""
+    try:
+        return get_local_batcher()((prompt, params))
+    except Exception as e:
+        return f"[EXCEPTION: {str(e)}]"
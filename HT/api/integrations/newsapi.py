@@ -1,15 +1,12 @@
 import os
-import requests
+from integrations.http_client import outbound
 
 NEWS_API_KEY = os.getenv('NEWS_API_KEY', '')
 NEWSAPI_URL = 'https://newsapi.org/v2/top-headlines'
 
-def fetch_top_headlines(country='us', q=None, page_size=20):
-    """Fetch top headlines using NewsAPI.org. Returns list of articles or [] on failure."""
-    if not NEWS_API_KEY:
-        # fallback deterministic empty list for staging
-        return []
+outbound.configure_host('newsapi.org', timeout=10, retries=2)
 
+def _headline_params(country, q, page_size):
     params = {
         'apiKey': NEWS_API_KEY,
         'country': country,
@@ -17,9 +14,30 @@ def fetch_top_headlines(country='us', q=None, page_size=20):
     }
     if q:
         params['q'] = q
+    return params
+
+def fetch_top_headlines(country='us', q=None, page_size=20):
+    """Fetch top headlines using NewsAPI.org. Returns list of articles or [] on failure."""
+    if not NEWS_API_KEY:
+        # fallback deterministic empty list for staging
+        return []
+
+    try:
+        r = outbound.get(NEWSAPI_URL, params=_headline_params(country, q, page_size))
+        if r.status_code == 200:
+            return r.json().get('articles', [])
+    except Exception:
+        pass
+
+    return []
+
+async def fetch_top_headlines_async(country='us', q=None, page_size=20):
+    """Async variant of fetch_top_headlines for use inside the event loop."""
+    if not NEWS_API_KEY:
+        return []
 
     try:
-        r = requests.get(NEWSAPI_URL, params=params, timeout=10)
+        r = await outbound.aget(NEWSAPI_URL, params=_headline_params(country, q, page_size))
         if r.status_code == 200:
             return r.json().get('articles', [])
     except Exception:
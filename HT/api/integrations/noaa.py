@@ -1,5 +1,5 @@
 import os
-import requests
+from integrations.http_client import outbound
 
 """Skeleton adapter for NOAA (geomagnetic / space weather) data.
 
@@ -11,6 +11,26 @@ This module intentionally contains minimal code and safe defaults for staging.
 """
 
 NOAA_API_KEY = os.getenv('NOAA_API_KEY')
+# Example endpoint (replace with actual NOAA endpoint and params)
+NOAA_URL = 'https://api.weather.gov/alerts'  # NOT the geomag endpoint; placeholder
+
+outbound.configure_host('api.weather.gov', timeout=10, retries=2)
+
+NEUTRAL_GEOMAGNETIC = {
+    'storm_level': 0.5,
+    'kp_index': 3.0,
+    'activity': 'quiet'
+}
+
+def _parse_geomagnetic(r):
+    """Parse response into expected shape (placeholder values until the real endpoint is wired)."""
+    if r.status_code == 200:
+        return {
+            'storm_level': 0.4,
+            'kp_index': 2.5,
+            'activity': 'quiet'
+        }
+    return None
 
 def fetch_geomagnetic_data():
     """Fetch geomagnetic data. Return a dict with 'storm_level' and 'kp_index'.
@@ -18,30 +38,29 @@ def fetch_geomagnetic_data():
     """
     if not NOAA_API_KEY:
         # Deterministic neutral fallback for staging
-        return {
-            'storm_level': 0.5,
-            'kp_index': 3.0,
-            'activity': 'quiet'
-        }
+        return dict(NEUTRAL_GEOMAGNETIC)
 
     # Example placeholder - implement real NOAA API calls here
     try:
-        # Example endpoint (replace with actual NOAA endpoint and params)
-        url = 'https://api.weather.gov/alerts'  # NOT the geomag endpoint; placeholder
-        r = requests.get(url, timeout=10)
-        if r.status_code == 200:
-            # Parse response into expected shape
-            return {
-                'storm_level': 0.4,
-                'kp_index': 2.5,
-                'activity': 'quiet'
-            }
+        parsed = _parse_geomagnetic(outbound.get(NOAA_URL))
+        if parsed:
+            return parsed
     except Exception:
         pass
 
     # Fallback neutral
-    return {
-        'storm_level': 0.5,
-        'kp_index': 3.0,
-        'activity': 'quiet'
-    }
+    return dict(NEUTRAL_GEOMAGNETIC)
+
+async def fetch_geomagnetic_data_async():
+    """Async variant of fetch_geomagnetic_data for use inside the event loop."""
+    if not NOAA_API_KEY:
+        return dict(NEUTRAL_GEOMAGNETIC)
+
+    try:
+        parsed = _parse_geomagnetic(await outbound.aget(NOAA_URL))
+        if parsed:
+            return parsed
+    except Exception:
+        pass
+
+    return dict(NEUTRAL_GEOMAGNETIC)
@@ -1,9 +1,11 @@
 import os
-import requests
+from integrations.http_client import outbound
 
 TWITTER_BEARER_TOKEN = os.getenv('TWITTER_BEARER_TOKEN', '')
 TWITTER_SEARCH_URL = 'https://api.twitter.com/2/tweets/search/recent'
 
+outbound.configure_host('api.twitter.com', timeout=10, retries=2)
+
 def search_tweets(query, max_results=10):
     """Search recent tweets (v2). Returns list of tweets or [] on missing token/failure."""
     if not TWITTER_BEARER_TOKEN:
@@ -17,7 +19,27 @@ def search_tweets(query, max_results=10):
         'max_results': max_results
     }
     try:
-        r = requests.get(TWITTER_SEARCH_URL, headers=headers, params=params, timeout=10)
+        r = outbound.get(TWITTER_SEARCH_URL, headers=headers, params=params)
+        if r.status_code == 200:
+            return r.json().get('data', [])
+    except Exception:
+        pass
+    return []
+
+async def search_tweets_async(query, max_results=10):
+    """Async variant of search_tweets for use inside the event loop."""
+    if not TWITTER_BEARER_TOKEN:
+        return []
+
+    headers = {
+        'Authorization': f'Bearer {TWITTER_BEARER_TOKEN}'
+    }
+    params = {
+        'query': query,
+        'max_results': max_results
+    }
+    try:
+        r = await outbound.aget(TWITTER_SEARCH_URL, headers=headers, params=params)
         if r.status_code == 200:
             return r.json().get('data', [])
     except Exception:
@@ -0,0 +1,2 @@
+# api/migrations/__init__.py
+"""Migraciones de esquema (ver migrations.runner)"""
@@ -0,0 +1,141 @@
+# api/migrations/runner.py
+"""Migraciones de esquema versionadas.
+
+Cada archivo de migrations/versions/ (NNNN_nombre.py) define upgrade(ctx);
+el docstring del módulo es su descripción. Las versiones aplicadas se
+registran en schema_migrations y cada migración corre en su propia
+transacción junto con su registro: o se aplica entera o no se aplica.
+
+Las migraciones son idempotentes (comprueban tablas, columnas e índices antes
+de crearlos), así que se pueden aplicar tanto sobre una base creada con
+db/init.sql como sobre una creada por db.create_all() o una vacía.
+
+En PostgreSQL el runner toma un advisory lock: si varios procesos arrancan
+a la vez, solo uno migra y el resto espera y encuentra todo aplicado.
+"""
+import importlib
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+VERSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'versions')
+VERSION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+MIGRATIONS_TABLE = 'schema_migrations'
+# Clave del advisory lock de PostgreSQL (arbitraria, fija para todo el proyecto)
+MIGRATION_LOCK_KEY = 7316402
+
+
+class Migration:
+    __slots__ = ('version', 'name', 'module')
+
+    def __init__(self, version, name, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def description(self):
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+
+class MigrationContext:
+    """Lo que recibe upgrade(): conexión en transacción + introspección"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+
+    @property
+    def is_postgres(self):
+        return self.dialect == 'postgresql'
+
+    def execute(self, sql, **params):
+        return self.conn.execute(text(sql), params)
+
+    # La introspección se rehace en cada llamada: el DDL previo de la misma migración cuenta
+    def has_table(self, table):
+        return inspect(self.conn).has_table(table)
+
+    def columns(self, table):
+        return {column['name'] for column in inspect(self.conn).get_columns(table)}
+
+    def indexes(self, table):
+        return {index['name'] for index in inspect(self.conn).get_indexes(table)}
+
+    def add_columns(self, table, columns):
+        """ALTER TABLE ADD COLUMN para las (nombre, tipo) que faltan; devuelve sus nombres"""
+        existing = self.columns(table)
+        added = []
+        for name, ddl in columns:
+            if name in existing:
+                continue
+            self.execute(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}')
+            added.append(name)
+        return added
+
+    def create_index(self, name, table, expression, using=None):
+        """CREATE INDEX si no existe; 'using' (brin, gin...) solo en PostgreSQL"""
+        if name in self.indexes(table):
+            return False
+        method = f' USING {using}' if using and self.is_postgres else ''
+        self.execute(f'CREATE INDEX {name} ON {table}{method} ({expression})')
+        return True
+
+
+def discover():
+    """Migraciones disponibles, en orden de versión"""
+    migrations = []
+    for filename in sorted(os.listdir(VERSIONS_DIR)):
+        match = VERSION_FILE.match(filename)
+        if match:
+            module = importlib.import_module(f'migrations.versions.{filename[:-3]}')
+            migrations.append(Migration(match.group(1), match.group(2), module))
+    return migrations
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version VARCHAR(16) PRIMARY KEY, name VARCHAR(120) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        _ensure_table(conn)
+        return {row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+
+def status(engine):
+    """[(versión, nombre, descripción, aplicada)] de todas las migraciones"""
+    applied = applied_versions(engine)
+    return [(m.version, m.name, m.description, m.version in applied) for m in discover()]
+
+
+def run_migrations(engine, target=None, log=print):
+    """Aplica las migraciones pendientes (hasta 'target' inclusive); devuelve las versiones aplicadas"""
+    lock_conn = None
+    if engine.dialect.name == 'postgresql':
+        lock_conn = engine.connect()
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+    try:
+        applied = applied_versions(engine)
+        done = []
+        for migration in discover():
+            if migration.version in applied or (target and migration.version > target):
+                continue
+            with engine.begin() as conn:
+                migration.module.upgrade(MigrationContext(conn))
+                conn.execute(
+                    text(f"INSERT INTO {MIGRATIONS_TABLE} (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {'v': migration.version, 'n': migration.name, 't': datetime.utcnow()}
+                )
+            log(f"Migración {migration.version} aplicada: {migration.description}")
+            done.append(migration.version)
+        return done
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            lock_conn.close()
@@ -0,0 +1,115 @@
+# api/migrations/versions/0001_reconcile_schema.py
+"""Reconcilia db/init.sql con los modelos: manifestations -> manifests y columnas que faltan.
+
+init.sql creaba 'manifestations' mientras los modelos usan 'manifests'. Si
+solo existe la primera se renombra; si existen ambas (la API ya había
+creado 'manifests' con create_all) se copian las filas de la vieja con ids
+nuevos y se deja como 'manifestations_legacy'. Después se crean las tablas
+que falten y se añaden las columnas nuevas de users, cards y manifests.
+
+El DDL está congelado aquí (no se lee de models): cambios posteriores de los
+modelos van en su propia migración y esta sigue produciendo el mismo esquema.
+"""
+LEGACY_COLUMNS = 'user_id, intention, mask, entropy, alignment, keywords, created_at'
+
+# Orden de creación: las FK apuntan a tablas anteriores. {pk} depende del dialecto.
+TABLES = (
+    ('users', """
+        id {pk},
+        username VARCHAR(120) NOT NULL UNIQUE,
+        password_hash VARCHAR(256),
+        role VARCHAR(32),
+        coherence FLOAT,
+        style TEXT,
+        created_at TIMESTAMP,
+        last_seen TIMESTAMP
+    """),
+    ('cards', """
+        id {pk},
+        title VARCHAR(120) NOT NULL,
+        path VARCHAR(80),
+        frequency VARCHAR(80),
+        principle VARCHAR(200),
+        protocol TEXT,
+        inverted_protocol TEXT,
+        image_url VARCHAR(300),
+        resonance_type VARCHAR(50),
+        activation_cost FLOAT,
+        dependencies JSON,
+        evolution_path JSON
+    """),
+    ('manifests', """
+        id {pk},
+        user_id INTEGER REFERENCES users (id),
+        intention TEXT,
+        mask VARCHAR(80),
+        entropy FLOAT,
+        alignment FLOAT,
+        keywords TEXT,
+        cluster VARCHAR(80),
+        resonance_score FLOAT,
+        progress FLOAT,
+        created_at TIMESTAMP
+    """),
+    ('manifest_narrations', """
+        manifest_id INTEGER NOT NULL PRIMARY KEY REFERENCES manifests (id),
+        status VARCHAR(16) NOT NULL,
+        narration TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL,
+        enqueued_at TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP
+    """),
+    ('user_stats', """
+        user_id INTEGER NOT NULL PRIMARY KEY REFERENCES users (id),
+        manifest_count INTEGER NOT NULL,
+        entropy_window JSON,
+        alignment_window JSON,
+        ewma_entropy FLOAT,
+        ewma_alignment FLOAT,
+        first_entropy FLOAT,
+        last_manifest_at TIMESTAMP
+    """),
+    ('diagnostics', """
+        id {pk},
+        user_id INTEGER REFERENCES users (id),
+        query JSON,
+        result JSON,
+        created_at TIMESTAMP
+    """),
+)
+
+# Columnas que init.sql no tenía (o que añadieron versiones posteriores de la API)
+NEW_COLUMNS = {
+    'users': (('last_seen', 'TIMESTAMP'),),
+    'cards': (
+        ('resonance_type', 'VARCHAR(50)'),
+        ('activation_cost', 'FLOAT'),
+        ('dependencies', 'JSON'),
+        ('evolution_path', 'JSON'),
+    ),
+    'manifests': (
+        ('cluster', 'VARCHAR(80)'),
+        ('resonance_score', 'FLOAT'),
+        ('progress', 'FLOAT'),
+    ),
+}
+
+
+def upgrade(ctx):
+    if ctx.has_table('manifestations'):
+        if not ctx.has_table('manifests'):
+            ctx.execute('ALTER TABLE manifestations RENAME TO manifests')
+        else:
+            ctx.execute(
+                f'INSERT INTO manifests ({LEGACY_COLUMNS}) '
+                f'SELECT {LEGACY_COLUMNS} FROM manifestations ORDER BY created_at, id'
+            )
+            ctx.execute('ALTER TABLE manifestations RENAME TO manifestations_legacy')
+
+    pk = 'SERIAL PRIMARY KEY' if ctx.is_postgres else 'INTEGER NOT NULL PRIMARY KEY'
+    for name, columns in TABLES:
+        ctx.execute(f'CREATE TABLE IF NOT EXISTS {name} ({columns.format(pk=pk)})')
+    for name, columns in NEW_COLUMNS.items():
+        ctx.add_columns(name, columns)
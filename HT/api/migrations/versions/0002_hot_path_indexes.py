@@ -0,0 +1,30 @@
+# api/migrations/versions/0002_hot_path_indexes.py
+"""Índices de las consultas calientes de manifests y user_stats.
+
+- ix_manifests_user_feed (user_id, created_at, id): historial del usuario
+  (user_id = ? ORDER BY created_at DESC) y feed por usuario; el btree se
+  recorre hacia atrás, no hace falta declararlo DESC.
+- ix_manifests_cluster_feed (cluster, created_at, id): feed por clúster.
+- ix_manifests_feed (created_at, id): feed global y rangos de created_at.
+- ix_manifests_created_brin: BRIN sobre created_at (solo PostgreSQL). Las
+  filas se insertan en orden de created_at, así que el BRIN cubre los
+  rangos de fechas de los paneles ocupando unas pocas páginas.
+- ix_user_stats_last_manifest: usuarios activos en una ventana (admin).
+"""
+
+INDEXES = (
+    ('ix_manifests_user_feed', 'manifests', 'user_id, created_at, id'),
+    ('ix_manifests_cluster_feed', 'manifests', 'cluster, created_at, id'),
+    ('ix_manifests_feed', 'manifests', 'created_at, id'),
+    ('ix_user_stats_last_manifest', 'user_stats', 'last_manifest_at'),
+)
+
+
+def upgrade(ctx):
+    for name, table, columns in INDEXES:
+        ctx.create_index(name, table, columns)
+    if ctx.is_postgres:
+        ctx.create_index('ix_manifests_created_brin', 'manifests', 'created_at', using='brin')
+        # Estadísticas frescas para que el planner vea los índices nuevos
+        ctx.execute('ANALYZE manifests')
+        ctx.execute('ANALYZE user_stats')
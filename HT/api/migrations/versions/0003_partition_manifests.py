@@ -0,0 +1,126 @@
+# api/migrations/versions/0003_partition_manifests.py
+"""Particiona manifests por mes sobre created_at (PostgreSQL) y crea las tablas de rollups.
+
+La conversión copia la tabla a una particionada con la misma definición de
+columnas (LIKE ... INCLUDING DEFAULTS, conserva la secuencia del id):
+  - la PK pasa a ser (id, created_at): PostgreSQL exige la clave de partición
+    en las restricciones únicas; el id sigue saliendo de la misma secuencia
+  - la FK manifest_narrations.manifest_id -> manifests.id se elimina (no hay
+    UNIQUE sobre id solo); la integridad la mantiene persist_manifestation,
+    que crea ambas filas en la misma transacción
+  - se crean las particiones desde el mes más antiguo hasta
+    MANIFEST_PARTITIONS_AHEAD meses por delante, más la default
+  - los índices de 0002 se recrean sobre la tabla padre (se propagan a cada
+    partición)
+
+En sqlite no hay particiones. En ambos casos los rollups se construyen con
+todo el histórico.
+
+Como 0001, no importa código de la aplicación: el DDL de las particiones y
+de los rollups y el SQL del backfill están congelados aquí (el mantenimiento
+de core.manifest_rollups sigue desde lo que deja esta migración).
+"""
+import importlib
+from datetime import datetime
+
+PARTITIONS_AHEAD = 3
+ROLLUP_TABLES = ('manifest_rollups_hourly', 'manifest_rollups_daily')
+ROLLUP_COLUMNS = """
+    bucket TIMESTAMP NOT NULL,
+    cluster VARCHAR(80) NOT NULL DEFAULT '',
+    manifest_count INTEGER NOT NULL DEFAULT 0,
+    entropy_sum FLOAT NOT NULL DEFAULT 0.0,
+    alignment_sum FLOAT NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (bucket, cluster)
+"""
+# Buckets como los guarda DateTime de SQLAlchemy en cada dialecto
+HOUR_BUCKET = {
+    'postgresql': "date_trunc('hour', {column})",
+    'sqlite': "strftime('%Y-%m-%d %H:00:00.000000', {column})",
+}
+DAY_BUCKET = {
+    'postgresql': "date_trunc('day', {column})",
+    'sqlite': "strftime('%Y-%m-%d 00:00:00.000000', {column})",
+}
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def upgrade(ctx):
+    now = datetime.utcnow()
+    for name in ROLLUP_TABLES:
+        ctx.execute(f"CREATE TABLE IF NOT EXISTS {name} ({ROLLUP_COLUMNS})")
+    if ctx.is_postgres and not _is_partitioned(ctx):
+        _partition(ctx, now)
+    # Como texto: sqlite compara cadenas con el formato de DateTime (PostgreSQL lo convierte)
+    _backfill_rollups(ctx, f"{now:%Y-%m-%d %H}:00:00.000000")
+
+
+def _is_partitioned(ctx):
+    return ctx.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'manifests' AND c.relnamespace = 'public'::regnamespace"
+    ).first() is not None
+
+
+def _backfill_rollups(ctx, until):
+    """Rollups de todas las horas completas hasta 'until' (desde aquí el mantenimiento los lleva al día)"""
+    hour = HOUR_BUCKET[ctx.dialect].format(column='created_at')
+    day = DAY_BUCKET[ctx.dialect].format(column='bucket')
+    for name in ROLLUP_TABLES:
+        ctx.execute(f"DELETE FROM {name} WHERE bucket < :until", until=until)
+    ctx.execute(
+        "INSERT INTO manifest_rollups_hourly (bucket, cluster, manifest_count, entropy_sum, alignment_sum) "
+        f"SELECT {hour}, coalesce(cluster, ''), count(*), coalesce(sum(entropy), 0), coalesce(sum(alignment), 0) "
+        f"FROM manifests WHERE created_at < :until GROUP BY {hour}, coalesce(cluster, '')",
+        until=until
+    )
+    # Los días solo llevan horas completas: el día en curso lo termina el mantenimiento
+    ctx.execute(
+        "INSERT INTO manifest_rollups_daily (bucket, cluster, manifest_count, entropy_sum, alignment_sum) "
+        f"SELECT {day}, cluster, sum(manifest_count), sum(entropy_sum), sum(alignment_sum) "
+        f"FROM manifest_rollups_hourly WHERE bucket < :until GROUP BY {day}, cluster",
+        until=until
+    )
+
+
+def _partition(ctx, now):
+    """manifests -> tabla particionada por mes (misma definición de columnas y datos)"""
+    ctx.execute("UPDATE manifests SET created_at = now() WHERE created_at IS NULL")
+    oldest = as_datetime(ctx.execute("SELECT min(created_at) FROM manifests").scalar() or now)
+    sequence = ctx.execute("SELECT pg_get_serial_sequence('manifests', 'id')").scalar()
+    for name, in ctx.execute(
+        "SELECT conname FROM pg_constraint WHERE contype = 'f' "
+        "AND conrelid = 'manifest_narrations'::regclass AND confrelid = 'manifests'::regclass"
+    ).all():
+        ctx.execute(f'ALTER TABLE manifest_narrations DROP CONSTRAINT "{name}"')
+
+    ctx.execute("ALTER TABLE manifests RENAME TO manifests_unpartitioned")
+    ctx.execute("CREATE TABLE manifests (LIKE manifests_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    if sequence:
+        ctx.execute(f"ALTER SEQUENCE {sequence} OWNED BY manifests.id")
+    ctx.execute("CREATE TABLE manifests_default PARTITION OF manifests DEFAULT")
+    month, last = month_start(oldest), add_months(month_start(now), PARTITIONS_AHEAD)
+    while month <= last:
+        ctx.execute(
+            f"CREATE TABLE manifests_p{month:%Y%m} PARTITION OF manifests "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        )
+        month = add_months(month, 1)
+    ctx.execute("INSERT INTO manifests SELECT * FROM manifests_unpartitioned")
+    # Al borrar la tabla vieja se liberan los nombres de su PK y sus índices
+    ctx.execute("DROP TABLE manifests_unpartitioned")
+    ctx.execute("ALTER TABLE manifests ADD CONSTRAINT manifests_pkey PRIMARY KEY (id, created_at)")
+    ctx.execute("ALTER TABLE manifests ADD CONSTRAINT manifests_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)")
+    importlib.import_module('migrations.versions.0002_hot_path_indexes').upgrade(ctx)
@@ -12,6 +12,7 @@ class User(db.Model):
     coherence = db.Column(db.Float, default=0.5)  # 0..1
     style = db.Column(db.Text, nullable=True)     # CSS personalizado (string)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime)           # última manifestación
 
 class Card(db.Model):
     __tablename__ = "cards"
@@ -38,8 +39,67 @@ class Manifest(db.Model):
     entropy = db.Column(db.Float)
     alignment = db.Column(db.Float)
     keywords = db.Column(db.Text)
+    cluster = db.Column(db.String(80))
+    resonance_score = db.Column(db.Float)
+    progress = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # En PostgreSQL la tabla está particionada por mes sobre created_at (migración
+    # 0003, core.manifest_partitions); la PK física es (id, created_at).
+    # Feed keyset (created_at, id) DESC: global, por clúster y por usuario
+    __table_args__ = (
+        db.Index("ix_manifests_feed", "created_at", "id"),
+        db.Index("ix_manifests_cluster_feed", "cluster", "created_at", "id"),
+        db.Index("ix_manifests_user_feed", "user_id", "created_at", "id"),
+    )
+
+class ManifestNarration(db.Model):
+    """Narración generada en segundo plano (modo async de POST /manifest)"""
+    __tablename__ = "manifest_narrations"
+    # En PostgreSQL sin FK física: manifests está particionada y su PK es (id, created_at)
+    manifest_id = db.Column(db.Integer, db.ForeignKey("manifests.id"), primary_key=True)
+    status = db.Column(db.String(16), default="pending", nullable=False)  # pending|running|done|failed
+    narration = db.Column(db.Text)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class UserStats(db.Model):
+    __tablename__ = "user_stats"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    manifest_count = db.Column(db.Integer, default=0, nullable=False)
+    entropy_window = db.Column(db.JSON)        # últimas entropías, más reciente primero
+    alignment_window = db.Column(db.JSON)      # últimas alineaciones, más reciente primero
+    ewma_entropy = db.Column(db.Float)
+    ewma_alignment = db.Column(db.Float)
+    first_entropy = db.Column(db.Float)        # línea base del porcentaje de limpieza
+    last_manifest_at = db.Column(db.DateTime)
+
+    # Usuarios activos en una ventana (dashboard admin)
+    __table_args__ = (
+        db.Index("ix_user_stats_last_manifest", "last_manifest_at"),
+    )
+
+class ManifestRollupHourly(db.Model):
+    """Agregado por hora y clúster (cluster '' = sin clúster); las medias son suma / count"""
+    __tablename__ = "manifest_rollups_hourly"
+    bucket = db.Column(db.DateTime, primary_key=True)
+    cluster = db.Column(db.String(80), primary_key=True, default="")
+    manifest_count = db.Column(db.Integer, default=0, nullable=False)
+    entropy_sum = db.Column(db.Float, default=0.0, nullable=False)
+    alignment_sum = db.Column(db.Float, default=0.0, nullable=False)
+
+class ManifestRollupDaily(db.Model):
+    """Agregado por día y clúster, derivado de los horarios; se conserva tras la retención de manifests"""
+    __tablename__ = "manifest_rollups_daily"
+    bucket = db.Column(db.DateTime, primary_key=True)
+    cluster = db.Column(db.String(80), primary_key=True, default="")
+    manifest_count = db.Column(db.Integer, default=0, nullable=False)
+    entropy_sum = db.Column(db.Float, default=0.0, nullable=False)
+    alignment_sum = db.Column(db.Float, default=0.0, nullable=False)
+
 class Diagnostic(db.Model):
     __tablename__ = "diagnostics"
     id = db.Column(db.Integer, primary_key=True)
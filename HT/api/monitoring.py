@@ -0,0 +1,300 @@
+# api/monitoring.py
+"""Muestreo periódico de métricas del sistema para el dashboard admin.
+
+Un hilo de fondo toma una muestra cada METRICS_SAMPLE_INTERVAL segundos y
+la guarda en un buffer circular de METRICS_HISTORY_SIZE muestras:
+  - host: CPU, memoria, disco y load average (psutil)
+  - process: RSS, hilos, CPU y descriptores del proceso de la API
+  - database: ping real (SELECT 1) con latencia y estado del pool
+  - sockets: clientes y rooms conectados, cola de fan-out, agregador y
+    protocolo binario
+  - outbound: contadores por host del cliente saliente compartido
+  - narration: cola de narraciones async (profundidad, en curso, espera)
+  - caches: cache de generación, snapshot de resonancia y mazo de cartas
+
+Las peticiones nunca llaman a psutil ni a la base de datos: leen la última
+muestra en memoria. prometheus_text() expone la misma muestra en el formato
+de texto de Prometheus.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+from sqlalchemy import text
+
+METRICS_SAMPLE_INTERVAL = float(os.getenv('METRICS_SAMPLE_INTERVAL', '10'))
+METRICS_HISTORY_SIZE = int(os.getenv('METRICS_HISTORY_SIZE', '60'))
+METRICS_PREFIX = 'aethos'
+
+# Campos de cada muestra que se incluyen en la serie corta del dashboard
+SERIES_FIELDS = (
+    ('host', 'cpu_percent'),
+    ('host', 'memory_percent'),
+    ('process', 'rss_mb'),
+    ('database', 'latency_ms'),
+    ('sockets', 'clients'),
+    ('sockets', 'fanout_pending'),
+    ('narration', 'depth')
+)
+
+
+class MetricsSampler:
+    def __init__(self, app=None, db=None, socketio=None,
+                 interval=METRICS_SAMPLE_INTERVAL, history=METRICS_HISTORY_SIZE):
+        self.app = app
+        self.db = db
+        self.socketio = socketio
+        self.interval = interval
+        self._samples = deque(maxlen=history)
+        self._process = psutil.Process()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.sample_errors = 0
+        # La primera lectura de cpu_percent(None) siempre es 0: se ceba aquí
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+
+    # ------------------------------------------------------------------ lectura
+    def latest(self):
+        """Última muestra (toma una en el momento si aún no hay ninguna)"""
+        self.start()
+        if not self._samples:
+            return self.sample()
+        return self._samples[-1]
+
+    def history(self, limit=None):
+        samples = list(self._samples)
+        return samples[-limit:] if limit else samples
+
+    def series(self, limit=None):
+        """Serie compacta (timestamp + campos clave) para gráficas del dashboard"""
+        return [
+            {'timestamp': s['timestamp'], **{f"{section}_{field}": s[section].get(field)
+                                             for section, field in SERIES_FIELDS}}
+            for s in self.history(limit)
+        ]
+
+    # ---------------------------------------------------------------- muestreo
+    def sample(self):
+        """Toma una muestra y la añade al buffer"""
+        sample = {
+            'timestamp': time.time(),
+            'host': self._safe(self._host),
+            'process': self._safe(self._process_stats),
+            'database': self._safe(self._database),
+            'sockets': self._safe(self._sockets),
+            'outbound': self._safe(self._outbound),
+            'narration': self._safe(self._narration),
+            'caches': self._safe(self._caches)
+        }
+        self._samples.append(sample)
+        return sample
+
+    def _safe(self, collector):
+        try:
+            return collector()
+        except Exception as e:
+            self.sample_errors += 1
+            print(f"Metrics sampler {collector.__name__} failed: {e}")
+            return {}
+
+    @staticmethod
+    def _host():
+        memory = psutil.virtual_memory()
+        load = os.getloadavg() if hasattr(os, 'getloadavg') else (None, None, None)
+        return {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': memory.percent,
+            'memory_available_mb': round(memory.available / 2 ** 20, 1),
+            'disk_percent': psutil.disk_usage('/').percent,
+            'load_1m': load[0],
+            'load_5m': load[1]
+        }
+
+    def _process_stats(self):
+        process = self._process
+        with process.oneshot():
+            stats = {
+                'cpu_percent': process.cpu_percent(interval=None),
+                'rss_mb': round(process.memory_info().rss / 2 ** 20, 1),
+                'threads': process.num_threads()
+            }
+            if hasattr(process, 'num_fds'):
+                stats['open_fds'] = process.num_fds()
+        return stats
+
+    def _database(self):
+        if self.app is None or self.db is None:
+            return {'status': 'unknown'}
+        with self.app.app_context():
+            engine = self.db.engine
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                status = 'connected'
+            except Exception as e:
+                print(f"Metrics sampler: base de datos no responde ({e})")
+                status = 'error'
+            stats = {
+                'status': status,
+                'up': status == 'connected',
+                'latency_ms': round((time.perf_counter() - started) * 1000, 2)
+            }
+            pool = engine.pool
+            # StaticPool/NullPool (sqlite, tests) no tienen estos contadores
+            for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+                method = getattr(pool, name, None)
+                if callable(method):
+                    stats[f'pool_{name}'] = method()
+        return stats
+
+    def _sockets(self):
+        from sockets.cluster_aggregator import get_cluster_aggregator
+        from sockets.encoding import get_protocol
+        from sockets.fanout import get_fanout
+
+        clients = rooms = 0
+        manager = getattr(getattr(self.socketio, 'server', None), 'manager', None)
+        if manager is not None:
+            for namespace_rooms in list(manager.rooms.values()):
+                connected = namespace_rooms.get(None, {})
+                clients += len(connected)
+                # Cada sid tiene su propio room: solo cuentan los rooms con nombre
+                rooms += sum(1 for room in list(namespace_rooms) if room is not None and room not in connected)
+
+        fanout = get_fanout().stats()
+        aggregator = get_cluster_aggregator().stats()
+        return {
+            'clients': clients,
+            'rooms': rooms,
+            'binary_sessions': get_protocol().stats()['binary_sessions'],
+            'fanout_pending': fanout['pending'],
+            'fanout_emitted': fanout['emitted'],
+            'fanout_dropped': fanout['dropped'],
+            'fanout_failed': fanout['failed'],
+            'fanout_max_lag_ms': fanout['max_lag_ms'],
+            'aggregator_events_in': aggregator['events_in'],
+            'aggregator_frames_out': aggregator['frames_out'],
+            'aggregator_deferred_ticks': aggregator['deferred_ticks']
+        }
+
+    @staticmethod
+    def _outbound():
+        from integrations.http_client import outbound
+        return outbound.stats()
+
+    @staticmethod
+    def _narration():
+        from core.narration_queue import get_narration_queue
+
+        stats = get_narration_queue().stats()
+        return {
+            'depth': stats['depth'],
+            'capacity': stats['capacity'],
+            'workers': stats['workers'],
+            'in_flight': stats['in_flight'],
+            'enqueued': stats['enqueued'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'rejected': stats['rejected'],
+            'wait_p95_ms': stats['wait']['p95_ms'],
+            'run_p95_ms': stats['run']['p95_ms']
+        }
+
+    @staticmethod
+    def _caches():
+        from core.card_deck import get_card_deck
+        from core.resonance_cache import get_resonance_cache
+        from integrations.generation_cache import get_generation_cache
+
+        generation = get_generation_cache().stats()
+        resonance = get_resonance_cache().stats()
+        deck = get_card_deck().stats()
+        return {
+            'generation_hits': generation['hits'],
+            'generation_misses': generation['misses'],
+            'generation_size': generation['size'],
+            'generation_hit_ratio': generation['hit_ratio'],
+            'resonance_refreshes': resonance['refreshes'],
+            'resonance_refresh_errors': resonance['refresh_errors'],
+            'resonance_age_s': resonance['age_s'],
+            'card_deck_version': deck['version'],
+            'card_deck_reloads': deck['reloads']
+        }
+
+    # ------------------------------------------------------------------- hilo
+    def start(self):
+        """Arranca el hilo de muestreo (idempotente)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+
+def prometheus_text(sample, prefix=METRICS_PREFIX):
+    """Muestra -> formato de texto de Prometheus (todas gauges).
+
+    Cada sección es un prefijo (aethos_host_cpu_percent); la sección
+    'outbound' lleva el host como etiqueta. Se omiten valores no numéricos.
+    """
+    lines = []
+    declared = set()
+
+    def gauge(name, value, labels=''):
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            return
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{labels} {value}")
+
+    for section, values in sample.items():
+        if section == 'timestamp':
+            gauge(f"{prefix}_sample_timestamp_seconds", values)
+        elif section == 'outbound':
+            # Prometheus exige las líneas de cada métrica contiguas: clave por fuera, host por dentro
+            keys = dict.fromkeys(key for counters in values.values() for key in counters)
+            for key in keys:
+                for host, counters in values.items():
+                    label = '{host="%s"}' % host.replace('\\', '\\\\').replace('"', '\\"')
+                    gauge(f"{prefix}_outbound_{key}", counters.get(key), label)
+        else:
+            for key, value in values.items():
+                gauge(f"{prefix}_{section}_{key}", value)
+    return '\n'.join(lines) + '\n'
+
+
+_sampler = None
+
+
+def init_metrics_sampler(app, db, socketio):
+    """Crea el sampler del proceso ligado a la app (no arranca el hilo)"""
+    global _sampler
+    _sampler = MetricsSampler(app, db, socketio)
+    return _sampler
+
+
+def get_metrics_sampler():
+    """Sampler compartido del proceso"""
+    global _sampler
+    if _sampler is None:
+        _sampler = MetricsSampler()
+    return _sampler
@@ -1,11 +1,33 @@
-﻿import numpy as np
-from flask import Blueprint, jsonify, request
-from models import db, Manifest, User
+﻿import base64
+import hashlib
+import os
+from datetime import datetime
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import func, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Manifest, ManifestNarration, User, UserStats
 from auth import require_jwt
 from core.agents import create_agent_mask
-from integrations.huggingface import analyze_narrative
+from integrations.huggingface import analyze_narrative, narrative_embeddings
 from core.metrics import compute_entropy, compute_alignment, compute_manifestation_progress
 from sockets.events import emit_resonance_update
+from core.cluster_state import get_cluster_state
+from core.embedding_store import get_embedding_store
+from core.user_stats import fold_manifestation, history_from_stats, profile_from_stats, seed_from_history
+from instrumentation import span
+from core.narration_queue import NARRATION_RETRY_AFTER, get_narration_queue
+
+# Sin 'async' explícito en la petición, POST /manifest responde 202 y narra en segundo plano
+MANIFEST_ASYNC_DEFAULT = os.getenv('MANIFEST_ASYNC_DEFAULT', 'false').lower() == 'true'
+FEED_PAGE_SIZE = int(os.getenv('FEED_PAGE_SIZE', '20'))
+FEED_MAX_PAGE_SIZE = int(os.getenv('FEED_MAX_PAGE_SIZE', '100'))
+
+# Columnas del feed: se leen como tuplas, sin hidratar objetos Manifest
+FEED_COLUMNS = (
+    Manifest.id, Manifest.created_at, Manifest.user_id, User.username,
+    Manifest.intention, Manifest.mask, Manifest.cluster,
+    Manifest.entropy, Manifest.alignment, Manifest.keywords
+)
 
 manifest_bp = Blueprint('manifest', __name__)
 
@@ -22,23 +44,37 @@ def create_manifestation():
         if not intention:
             return jsonify({'error': 'IntenciÃ³n vacÃ­a'}), 400
         
+        # Modo async: se persiste ya y la narración la genera el pool de narración
+        async_mode = wants_async(data)
+        if async_mode and not get_narration_queue().has_capacity():
+            get_narration_queue().reject()
+            response = jsonify({'error': 'Cola de narración llena', 'code': 'NARRATION_QUEUE_FULL'})
+            response.headers['Retry-After'] = str(NARRATION_RETRY_AFTER)
+            return response, 503
+        
         # 1. AnÃ¡lisis narrativo avanzado
-        analysis = analyze_narrative(intention)
+        with span('manifest.analysis'):
+            analysis = analyze_narrative(intention)
         
         # 2. Obtener historial del usuario para mÃ©tricas contextuales
-        user_history = get_user_manifestation_history(user_id)
-        user_profile = get_user_profile(user_id)
+        # (agregado user_stats: una lectura O(1) alimenta entropía, perfil y limpieza)
+        with span('manifest.history'):
+            user_history, user_profile, user_stats = load_user_context(user_id)
         
         # 3. Calcular mÃ©tricas avanzadas
-        entropy = compute_entropy(analysis, user_history)
-        alignment = compute_alignment(intention, analysis, user_profile)
+        with span('manifest.metrics'):
+            entropy = compute_entropy(analysis, user_history)
+            alignment = compute_alignment(intention, analysis, user_profile)
         
         # 4. Crear agente segÃºn mÃ¡scara seleccionada
-        agent = create_agent_mask(mask_name)
-        
-        # 5. Generar respuesta contextualizada
+        # 5. Generar respuesta contextualizada (en modo async, en el pool de narración)
         user_metrics = {'entropy': entropy, 'alignment': alignment}
-        agent_response = agent.respond(intention, analysis, user_metrics)
+        agent_response = None
+        if not async_mode:
+            with span('manifest.agent'):
+                agent = create_agent_mask(mask_name)
+            with span('manifest.generation'):
+                agent_response = agent.respond(intention, analysis, user_metrics)
         
         # 6. Calcular progreso de manifestaciÃ³n
         session_data = {
@@ -47,9 +83,10 @@ def create_manifestation():
             'interactions': user_history[-3:] if user_history else [],
             'cluster_strength': analysis['resonance_score']
         }
-        manifestation_progress = compute_manifestation_progress(user_id, session_data)
+        with span('manifest.progress'):
+            manifestation_progress = compute_manifestation_progress(user_id, session_data)
         
-        # 7. Guardar en base de datos
+        # 7. Guardar en base de datos + actualizar coherencia (una transacción)
         manifest = Manifest(
             user_id=user_id,
             intention=intention,
@@ -59,13 +96,30 @@ def create_manifestation():
             keywords=','.join(analysis['keywords']),
             cluster=analysis['cluster'],
             resonance_score=analysis['resonance_score'],
-            progress=manifestation_progress
+            progress=manifestation_progress,
+            created_at=datetime.utcnow()
         )
-        db.session.add(manifest)
-        db.session.commit()
+        baseline_entropy = user_stats.first_entropy if user_stats is not None else None
+        with span('manifest.db_write'):
+            manifest_id, created_at = persist_manifestation(manifest, user_id, alignment, entropy, user_stats,
+                                                            pending_narration=async_mode)
+        if async_mode:
+            # Si el push falla, submit() devuelve False y la fila 'pending' la reencola el barrido
+            get_narration_queue().submit({
+                'manifest_id': manifest_id,
+                'user_id': user_id,
+                'intention': intention,
+                'mask': mask_name,
+                'context': {'keywords': analysis['keywords'], 'cluster': analysis['cluster']},
+                'metrics': user_metrics
+            }, app=current_app._get_current_object())
         
-        # 8. Actualizar mÃ©tricas del usuario
-        update_user_coherence(user_id, alignment, entropy)
+        # 8. Persistir embedding para búsquedas de resonancia (no bloqueante)
+        try:
+            with span('manifest.embedding'):
+                get_embedding_store().append([manifest_id], [analysis['embedding']])
+        except Exception as e:
+            print(f"Embedding store append failed: {e}")
         
         # 9. Emitir actualizaciÃ³n de resonancia
         resonance_data = {
@@ -74,71 +128,269 @@ def create_manifestation():
             'entropy': entropy,
             'alignment': alignment,
             'progress': manifestation_progress,
-            'timestamp': manifest.created_at.isoformat()
+            'timestamp': created_at.isoformat()
         }
-        emit_resonance_update(analysis['cluster'], resonance_data)
+        with span('manifest.emit'):
+            get_cluster_state().record_manifestation(analysis['cluster'], {
+                **resonance_data,
+                'manifest_id': manifest_id,
+                'keywords': analysis['keywords'][:5]
+            })
+            emit_resonance_update(analysis['cluster'], resonance_data)
         
         # 10. Preparar respuesta completa
-        response = {
-            'manifest_id': manifest.id,
-            'narration': agent_response,
-            'metrics': {
-                'entropy': entropy,
-                'alignment': alignment,
-                'manifestation_progress': manifestation_progress,
-                'clearing_percentage': calculate_clearing_percentage(user_history, entropy) if user_history else 0,
-                'cluster': analysis['cluster'],
-                'resonance': analysis['resonance_score'],
-                'semantic_depth': analysis['semantic_depth']
-            },
-            'context': {
-                'keywords': analysis['keywords'],
-                'recommended_masks': suggest_alternative_masks(mask_name, analysis),
-                'next_steps': generate_next_steps(manifestation_progress, entropy)
+        with span('manifest.response'):
+            response = {
+                'manifest_id': manifest_id,
+                'narration': agent_response,
+                'metrics': {
+                    'entropy': entropy,
+                    'alignment': alignment,
+                    'manifestation_progress': manifestation_progress,
+                    'clearing_percentage': calculate_clearing_percentage(baseline_entropy, entropy) if user_history else 0,
+                    'cluster': analysis['cluster'],
+                    'resonance': analysis['resonance_score'],
+                    'semantic_depth': analysis['semantic_depth']
+                },
+                'context': {
+                    'keywords': analysis['keywords'],
+                    'recommended_masks': suggest_alternative_masks(mask_name, analysis),
+                    'next_steps': generate_next_steps(manifestation_progress, entropy)
+                }
             }
-        }
-        
-        return jsonify(response)
+            if async_mode:
+                response['status'] = 'pending'
+                response['narration_url'] = f"/api/manifest/{manifest_id}/narration"
+                http_response = jsonify(response)
+                http_response.headers['Location'] = response['narration_url']
+                return http_response, 202
+            return jsonify(response)
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error en manifestaciÃ³n: {str(e)}'}), 500
 
-def get_user_manifestation_history(user_id):
-    """Obtiene historial reciente de manifestaciones del usuario"""
-    manifests = Manifest.query.filter_by(user_id=user_id)\
+@manifest_bp.route('/manifest/<int:manifest_id>/similar', methods=['GET'])
+@require_jwt
+def similar_manifestations(manifest_id):
+    """Manifestaciones resonantes: vecinos más cercanos por embedding (IVF)"""
+    k = max(1, min(request.args.get('k', 10, type=int), 50))
+    store = get_embedding_store()
+    
+    vector = store.vector_of(manifest_id)
+    if vector is None:
+        # Manifestaciones anteriores al almacén: se indexan bajo demanda
+        manifest = db.session.get(Manifest, manifest_id)
+        if not manifest:
+            return jsonify({'error': 'Manifestación no encontrada'}), 404
+        vector = narrative_embeddings([manifest.intention or ''])[0]
+        store.append([manifest_id], [vector])
+    
+    similar = store.search(vector, k=k, exclude_id=manifest_id)
+    return jsonify({
+        'manifest_id': manifest_id,
+        'similar': [{'manifest_id': mid, 'score': round(score, 4)} for mid, score in similar]
+    })
+
+@manifest_bp.route('/manifest/<int:manifest_id>/narration', methods=['GET'])
+@require_jwt
+def manifest_narration(manifest_id):
+    """Estado de la narración async (alternativa por polling al evento 'manifest_narration')"""
+    row = db.session.query(ManifestNarration)\
+        .join(Manifest, Manifest.id == ManifestNarration.manifest_id)\
+        .filter(ManifestNarration.manifest_id == manifest_id, Manifest.user_id == request.user['id'])\
+        .first()
+    if row is None:
+        return jsonify({'error': 'Narración no encontrada'}), 404
+    
+    response = jsonify({
+        'manifest_id': manifest_id,
+        'status': row.status,
+        'narration': row.narration,
+        'error': row.error,
+        'attempts': row.attempts,
+        'enqueued_at': row.enqueued_at.isoformat() if row.enqueued_at else None,
+        'finished_at': row.finished_at.isoformat() if row.finished_at else None
+    })
+    if row.status in ('pending', 'running'):
+        response.headers['Retry-After'] = str(NARRATION_RETRY_AFTER)
+    return response
+
+@manifest_bp.route('/manifests', methods=['GET'])
+@require_jwt
+def manifest_feed():
+    """Feed del Tablón: más recientes primero, paginación keyset sobre (created_at, id).
+
+    ?cursor=<next_cursor de la página anterior>&limit=&cluster=&user_id=
+    El coste de cada página no depende de la profundidad (sin OFFSET): usa
+    los índices ix_manifests_feed / _cluster_feed / _user_feed. El ETag
+    depende solo de la primera fila de la página, así que un cliente que
+    sondea con If-None-Match recibe 304 tras una lectura de una fila.
+    """
+    limit = max(1, min(request.args.get('limit', FEED_PAGE_SIZE, type=int), FEED_MAX_PAGE_SIZE))
+    cluster = request.args.get('cluster')
+    user_id = request.args.get('user_id', type=int)
+    cursor = request.args.get('cursor')
+    
+    query = db.session.query(*FEED_COLUMNS).outerjoin(User, User.id == Manifest.user_id)
+    if cluster:
+        query = query.filter(Manifest.cluster == cluster)
+    if user_id is not None:
+        query = query.filter(Manifest.user_id == user_id)
+    if cursor:
+        try:
+            position = decode_feed_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Cursor inválido', 'code': 'INVALID_CURSOR'}), 400
+        query = query.filter(tuple_(Manifest.created_at, Manifest.id) < position)
+    query = query.order_by(Manifest.created_at.desc(), Manifest.id.desc())
+    
+    params = f"{cluster}|{user_id}|{cursor}|{limit}"
+    if request.if_none_match:
+        head = query.with_entities(Manifest.created_at, Manifest.id).first()
+        etag = feed_etag(params, head)
+        if request.if_none_match.contains_weak(etag):
+            not_modified = current_app.response_class(status=304)
+            not_modified.set_etag(etag, weak=True)
+            return not_modified
+    
+    rows = query.limit(limit + 1).all()
+    page = rows[:limit]
+    response = jsonify({
+        'items': [serialize_feed_row(row) for row in page],
+        'next_cursor': encode_feed_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None
+    })
+    response.set_etag(feed_etag(params, (page[0].created_at, page[0].id) if page else None), weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def serialize_feed_row(row):
+    return {
+        'id': row.id,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'user_id': row.user_id,
+        'author': row.username,
+        'intention': row.intention,
+        'mask': row.mask,
+        'cluster': row.cluster,
+        'entropy': row.entropy,
+        'alignment': row.alignment,
+        'keywords': row.keywords.split(',') if row.keywords else []
+    }
+
+def encode_feed_cursor(created_at, manifest_id):
+    raw = f"{created_at.isoformat()}|{manifest_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_feed_cursor(cursor):
+    """cursor -> (created_at, id); ValueError si no es válido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, manifest_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(manifest_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError(f"cursor inválido: {e}")
+
+def feed_etag(params, head):
+    """ETag de una página: filtros + primera fila ((created_at, id) o None si está vacía)"""
+    marker = f"{head[0].isoformat()}|{head[1]}" if head else 'empty'
+    return hashlib.sha1(f"{params}|{marker}".encode('utf-8')).hexdigest()[:20]
+
+def wants_async(data):
+    """'async' en el cuerpo o la query, o 'Prefer: respond-async' (RFC 7240)"""
+    flag = data.get('async')
+    if flag is None:
+        flag = request.args.get('async')
+    if flag is None:
+        return MANIFEST_ASYNC_DEFAULT or 'respond-async' in request.headers.get('Prefer', '')
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+def load_user_context(user_id):
+    """Historial reciente, perfil y agregado del usuario en una sola query.
+
+    users LEFT JOIN user_stats: sin filas -> el usuario no existe. Los usuarios
+    con manifestaciones anteriores a user_stats se siembran una única vez
+    desde manifests (ver backfill_user_stats).
+    """
+    row = db.session.query(User.coherence, UserStats)\
+        .outerjoin(UserStats, UserStats.user_id == User.id)\
+        .filter(User.id == user_id)\
+        .first()
+    if row is None:
+        return [], {}, None
+    
+    coherence, stats = row
+    if stats is None:
+        stats = backfill_user_stats(user_id)
+    return history_from_stats(stats), profile_from_stats(stats, coherence), stats
+
+def backfill_user_stats(user_id):
+    """Construye el agregado desde manifests y lo inserta si no existe.
+
+    Dos primeras peticiones concurrentes del mismo usuario pueden sembrarlo a
+    la vez: INSERT ... ON CONFLICT DO NOTHING y se relee la fila que quede.
+    """
+    stats = UserStats(user_id=user_id, manifest_count=0)
+    recent = db.session.query(Manifest.entropy, Manifest.alignment)\
+        .filter(Manifest.user_id == user_id)\
         .order_by(Manifest.created_at.desc())\
         .limit(10)\
         .all()
-    return [{'entropy': m.entropy, 'alignment': m.alignment} for m in manifests]
-
-def get_user_profile(user_id):
-    """Obtiene perfil del usuario para personalizaciÃ³n"""
-    user = User.query.get(user_id)
-    if user:
-        recent_manifests = Manifest.query.filter_by(user_id=user_id)\
-            .order_by(Manifest.created_at.desc())\
-            .limit(5)\
-            .all()
-        avg_alignment = np.mean([m.alignment for m in recent_manifests]) if recent_manifests else 0.5
-        return {'avg_alignment': avg_alignment, 'coherence': user.coherence}
-    return {}
+    if recent:
+        count, last_manifest_at = db.session.query(func.count(Manifest.id), func.max(Manifest.created_at))\
+            .filter(Manifest.user_id == user_id)\
+            .one()
+        first_entropy = db.session.query(Manifest.entropy)\
+            .filter(Manifest.user_id == user_id)\
+            .order_by(Manifest.created_at.asc())\
+            .limit(1)\
+            .scalar()
+        seed_from_history(stats, [tuple(r) for r in recent], count, first_entropy, last_manifest_at)
+    values = {column.name: getattr(stats, column.key) for column in UserStats.__table__.columns}
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    db.session.execute(dialect.insert(UserStats).values(**values).on_conflict_do_nothing(index_elements=['user_id']))
+    return db.session.get(UserStats, user_id, populate_existing=True)
+
+def persist_manifestation(manifest, user_id, alignment, entropy, stats=None, pending_narration=False):
+    """INSERT del manifiesto + coherencia + agregado en una sola transacción.
+
+    El agregado se relee con SELECT ... FOR UPDATE antes de plegar: dos POST
+    concurrentes del mismo usuario se serializan en vez de pisarse las
+    ventanas y el contador. Con pending_narration se crea también la fila 'pending' de
+    manifest_narrations (modo async). Devuelve (id, created_at) leídos antes
+    del commit para no disparar el refresh implícito de los atributos expirados.
+    """
+    db.session.add(manifest)
+    db.session.flush()
+    if pending_narration:
+        db.session.add(ManifestNarration(manifest_id=manifest.id, status='pending'))
+    with span('manifest.coherence'):
+        update_user_coherence(user_id, alignment, entropy)
+        if stats is not None:
+            stats = db.session.query(UserStats)\
+                .filter(UserStats.user_id == user_id)\
+                .with_for_update()\
+                .populate_existing()\
+                .one()
+            fold_manifestation(stats, entropy, alignment, manifest.created_at)
+    manifest_id, created_at = manifest.id, manifest.created_at
+    db.session.commit()
+    return manifest_id, created_at
 
 def update_user_coherence(user_id, alignment, entropy):
-    """Actualiza coherencia del usuario basada en manifestaciones"""
-    user = User.query.get(user_id)
-    if user:
-        # Coherencia como balance entre alineamiento y baja entropÃ­a
-        new_coherence = (alignment + (1 - entropy)) / 2
-        user.coherence = max(0.1, min(0.99, new_coherence))
-        db.session.commit()
-
-def calculate_clearing_percentage(history, current_entropy):
-    """Calcula porcentaje de limpieza basado en reducciÃ³n de entropÃ­a"""
-    if not history:
-        return 0.0
-    
-    initial_entropy = history[0]['entropy'] if history else 0.5
+    """Actualiza coherencia y last_seen del usuario dentro de la transacción en curso (sin releer)"""
+    # Coherencia como balance entre alineamiento y baja entropÃ­a
+    new_coherence = max(0.1, min(0.99, (alignment + (1 - entropy)) / 2))
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(coherence=new_coherence, last_seen=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+def calculate_clearing_percentage(baseline_entropy, current_entropy):
+    """Calcula porcentaje de limpieza: reducción de entropía respecto a la primera manifestación"""
+    initial_entropy = baseline_entropy if baseline_entropy is not None else 0.5
     entropy_reduction = initial_entropy - current_entropy
     clearing = (entropy_reduction / initial_entropy) * 100 if initial_entropy > 0 else 0
     return round(max(0, min(100, clearing)), 1)
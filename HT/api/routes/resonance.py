@@ -1,17 +1,15 @@
 from flask import Blueprint, jsonify, current_app
 import os
-from core.resonance import ExternalResonanceEngine
+from core.resonance_cache import get_resonance_cache
 
 resonance_bp = Blueprint('resonance', __name__)
-resonance_engine = ExternalResonanceEngine()
 
 
 @resonance_bp.route('/external', methods=['GET'])
-async def get_external_resonance():
-    """Obtiene datos de resonancia externa en tiempo real"""
+def get_external_resonance():
+    """Obtiene datos de resonancia externa (snapshot refrescado en segundo plano)"""
     try:
-        resonance_data = await resonance_engine.fetch_global_resonance()
-        return jsonify(resonance_data)
+        return jsonify(get_resonance_cache().get())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,19 +1,21 @@
 # api/tarot.py
-from flask import Blueprint, jsonify, request
-from models import Card, db
+from flask import Blueprint, current_app, jsonify, request
 from auth import require_jwt
-import random
+from core.advance_metrics import compute_resonance_coherence
+from core.card_deck import get_card_deck
+from core.card_graph import get_card_graph
+from core.spreads import draw_inversions, draw_spread, new_seed, parse_seed
 
 tarot_bp = Blueprint("tarot", __name__)
 
 @tarot_bp.route("/cards", methods=["GET"])
 @require_jwt
 def get_cards():
-    cards = Card.query.all()
-    return jsonify([{
-        "id": c.id, "title": c.title, "path": c.path, "frequency": c.frequency,
-        "principle": c.principle, "image_url": c.image_url
-    } for c in cards])
+    # JSON del mazo serializado una vez por versión; If-None-Match -> 304
+    deck = get_card_deck().snapshot()
+    response = current_app.response_class(deck.listing_json, mimetype="application/json")
+    response.set_etag(deck.etag)
+    return response.make_conditional(request)
 
 @tarot_bp.route("/draw", methods=["POST"])
 @require_jwt
@@ -21,20 +23,24 @@ def draw_cards():
     data = request.get_json()
     mode = data.get("mode","single")
     manual = data.get("manual_cards",[])
-    all_cards = Card.query.all()
-    deck = all_cards.copy()
-    random.shuffle(deck)
-    draw_count = {"single":1,"triple":3,"cross":5,"full":len(deck)}.get(mode,1)
+    try:
+        seed = parse_seed(data.get("seed"))
+    except (TypeError, ValueError):
+        return jsonify({"error":"Semilla inválida","code":"INVALID_SEED"}), 400
+    deck = get_card_deck().snapshot()
+    # Tirada reproducible: misma semilla + modo + mazo (deck_etag) -> mismas cartas e inversiones
     if manual:
-        selected = [Card.query.get(cid) for cid in manual if Card.query.get(cid)]
+        selected = deck.lookup(manual)
+        seed = new_seed() if seed is None else seed
+        inverted = draw_inversions(len(selected), seed)
     else:
-        selected = deck[:draw_count]
-    res=[]
-    for c in selected:
-        inv = random.choice([True,False])
-        res.append({
-            "id": c.id, "title": c.title, "inverted": inv, "principle": c.principle,
-            "protocol": c.inverted_protocol if inv else c.protocol,
-            "image_url": c.image_url
-        })
-    return jsonify({"mode":mode,"cards":res})
+        indices, inverted, seed = draw_spread(len(deck), mode, seed)
+        selected = [deck.cards[i] for i in indices]
+    res = [c.view(inv) for c, inv in zip(selected, inverted)]
+    graph = get_card_graph()
+    payload = {"mode":mode,"cards":res,"seed":seed,"deck_etag":deck.etag,
+               "coherence":compute_resonance_coherence(data.get("intention"), [c.id for c in selected], {"card_graph":graph})}
+    if manual:
+        # Orden elegido por el usuario: se comprueban las dependencias entre cartas
+        payload["sequence"] = graph.validate([c.id for c in selected])
+    return jsonify(payload)
@@ -0,0 +1,86 @@
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, jsonify, request
+
+import auth
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PUBLIC_PEM = PRIVATE_KEY.public_key().public_bytes(
+    serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+
+
+def admin_token(permissions=('system:admin', 'users:read:all'), **claims):
+    payload = {
+        'username': 'root', 'role': 'SystemAdministrator', 'permissions': list(permissions),
+        'aud': 'HellTheater.API.Admin', 'iss': 'HellTheater.Auth.System',
+        'exp': int(time.time()) + 60, **claims
+    }
+    return jwt.encode(payload, PRIVATE_KEY, algorithm='RS256')
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('JWT_PUBLIC_KEY', PUBLIC_PEM)
+    monkeypatch.setattr(auth, '_admin_auth_instance', None)
+    app = Flask(__name__)
+
+    @app.route('/monitor')
+    @auth.require_admin('system:monitor')
+    def monitor():
+        return jsonify(request.admin_context)
+
+    @app.route('/stacked')
+    @auth.require_admin_jwt
+    @auth.require_admin_permission('system:admin')
+    def stacked():
+        return jsonify(request.admin_context)
+
+    yield app.test_client()
+
+
+def _get(client, path, token):
+    return client.get(path, headers={'Authorization': f'Bearer {token}'})
+
+
+def test_stacked_decorators_verify_token_once(client, monkeypatch):
+    calls = []
+    decode = jwt.decode
+    monkeypatch.setattr(auth.jwt, 'decode', lambda *a, **kw: calls.append(1) or decode(*a, **kw))
+
+    token = admin_token()
+    response = _get(client, '/stacked', token)
+    assert response.status_code == 200
+    assert response.get_json()['username'] == 'root'
+    assert len(calls) == 1
+
+    # Mismo token en otra petición: verificación cacheada hasta 'exp'
+    assert _get(client, '/stacked', token).status_code == 200
+    assert len(calls) == 1
+    assert _get(client, '/stacked', admin_token(jti='otro')).status_code == 200
+    assert len(calls) == 2
+
+
+def test_missing_permission_is_forbidden(client):
+    response = _get(client, '/monitor', admin_token())
+    assert response.status_code == 403
+    assert response.get_json()['required_permission'] == 'system:monitor'
+
+    allowed = admin_token(permissions=('system:admin', 'users:read:all', 'system:monitor'))
+    assert _get(client, '/monitor', allowed).status_code == 200
+
+
+def test_missing_header_and_invalid_claims(client):
+    assert client.get('/monitor').get_json()['code'] == 'MISSING_AUTH_HEADER'
+    response = _get(client, '/monitor', admin_token(role='Guest'))
+    assert response.status_code == 401
+    assert response.get_json()['detail'] == 'Invalid admin claims'
+
+
+def test_not_configured_returns_503(client, monkeypatch):
+    monkeypatch.delenv('JWT_PUBLIC_KEY')
+    monkeypatch.setattr(auth, '_admin_auth_instance', None)
+    assert _get(client, '/monitor', admin_token()).status_code == 503
@@ -0,0 +1,234 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+import routes.manifest as manifest_routes
+from core import agents
+from core.narration_queue import NARRATION_STALE_AFTER, NarrationQueue, RedisNarrationBackend
+from models import db, Manifest, ManifestNarration, User
+from sockets.fanout import get_fanout
+
+
+class NullStore:
+    def append(self, ids, vectors):
+        pass
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    # Archivo (no :memory:): los hilos del pool usan su propia conexión
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'aethos.db'}"
+    db.init_app(app)
+    app.register_blueprint(manifest_routes.manifest_bp, url_prefix="/api")
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="dev", coherence=0.5))
+        db.session.commit()
+
+    monkeypatch.setattr(manifest_routes, 'get_embedding_store', lambda: NullStore())
+    monkeypatch.setattr(agents, 'generate_text', lambda prompt, max_tokens=300: "narración generada")
+    yield app
+
+
+def use_queue(monkeypatch, queue):
+    monkeypatch.setattr(manifest_routes, 'get_narration_queue', lambda: queue)
+    return queue
+
+
+def post_async(client):
+    return client.post('/api/manifest', json={'intention': 'quiero ordenar mi proyecto', 'async': True})
+
+
+def test_async_mode_persists_and_returns_202(app, monkeypatch):
+    queue = use_queue(monkeypatch, NarrationQueue(workers=0))
+    response = post_async(app.test_client())
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['status'] == 'pending'
+    assert body['narration'] is None
+    assert response.headers['Location'] == f"/api/manifest/{body['manifest_id']}/narration"
+    with app.app_context():
+        manifest = db.session.get(Manifest, body['manifest_id'])
+        assert manifest.cluster == body['metrics']['cluster']
+        assert db.session.get(ManifestNarration, body['manifest_id']).status == 'pending'
+    assert queue.backend.depth() == 1
+
+    poll = app.test_client().get(body['narration_url'])
+    assert poll.get_json()['status'] == 'pending'
+    assert 'Retry-After' in poll.headers
+
+
+def test_worker_stores_narration_and_pushes_to_user_room(app, monkeypatch):
+    queue = use_queue(monkeypatch, NarrationQueue(workers=0))
+    manifest_id = post_async(app.test_client()).get_json()['manifest_id']
+
+    result = queue.process(queue.backend.pop(timeout=0))
+    assert result['status'] == 'done'
+    assert queue.stats()['completed'] == 1
+
+    pushed = [entry for entry in get_fanout()._queue if entry[0] == 'manifest_narration']
+    assert pushed[-1][1]['manifest_id'] == manifest_id
+    assert pushed[-1][2] == 'user:1'
+
+    poll = app.test_client().get(f"/api/manifest/{manifest_id}/narration").get_json()
+    assert poll['status'] == 'done'
+    assert 'narración generada' in poll['narration']
+    assert poll['attempts'] == 1
+
+
+def test_worker_pool_drains_queue(app, monkeypatch):
+    use_queue(monkeypatch, NarrationQueue(workers=2))
+    client = app.test_client()
+    ids = [post_async(client).get_json()['manifest_id'] for _ in range(3)]
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        statuses = [client.get(f"/api/manifest/{i}/narration").get_json()['status'] for i in ids]
+        if statuses == ['done'] * 3:
+            break
+        time.sleep(0.05)
+    assert statuses == ['done'] * 3
+
+
+def test_full_queue_rejects_before_persisting(app, monkeypatch):
+    queue = use_queue(monkeypatch, NarrationQueue(workers=0, maxsize=0))
+    response = post_async(app.test_client())
+    assert response.status_code == 503
+    assert response.get_json()['code'] == 'NARRATION_QUEUE_FULL'
+    assert response.headers['Retry-After']
+    assert queue.stats()['rejected'] == 1
+    with app.app_context():
+        assert Manifest.query.count() == 0
+
+
+def test_sync_mode_is_unchanged(app, monkeypatch):
+    queue = use_queue(monkeypatch, NarrationQueue(workers=0))
+    response = app.test_client().post('/api/manifest', json={'intention': 'quiero ordenar mi proyecto'})
+    assert response.status_code == 200
+    assert 'narración generada' in response.get_json()['narration']
+    assert queue.backend.depth() == 0
+
+
+class BrokenBackend:
+    def push(self, job):
+        raise ConnectionError("redis caído")
+
+    def depth(self):
+        return 0
+
+    def requeue_expired(self):
+        return 0
+
+
+class FakeRedisLists:
+    """Subconjunto de redis.Redis usado por RedisNarrationBackend (listas + hash de claims)"""
+
+    def __init__(self):
+        self.lists = {}
+        self.hashes = {}
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value.encode() if isinstance(value, str) else value)
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    def blmove(self, src, dest, timeout, src_side, dest_side):
+        items = self.lists.get(src)
+        if not items:
+            return None
+        value = items.pop() if src_side == 'RIGHT' else items.pop(0)
+        target = self.lists.setdefault(dest, [])
+        target.insert(0, value) if dest_side == 'LEFT' else target.append(value)
+        return value
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value).encode()
+
+    def hsetnx(self, key, field, value):
+        self.hashes.setdefault(key, {}).setdefault(field, str(value).encode())
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+
+def test_failed_enqueue_still_answers_202_and_is_swept(app, monkeypatch):
+    queue = use_queue(monkeypatch, NarrationQueue(backend=BrokenBackend(), workers=0))
+    response = post_async(app.test_client())
+    assert response.status_code == 202
+    manifest_id = response.get_json()['manifest_id']
+    assert queue.stats()['submit_errors'] == 1
+
+    # El barrido reconstruye el job desde manifests cuando la fila lleva demasiado pendiente
+    queue.backend = recovered = NarrationQueue().backend
+    later = datetime.utcnow() + timedelta(seconds=NARRATION_STALE_AFTER + 1)
+    with app.app_context():
+        assert queue.sweep(now=datetime.utcnow()) == (0, 0)
+        assert queue.sweep(now=later) == (1, 0)
+    job = recovered.pop(timeout=0)
+    assert job['manifest_id'] == manifest_id
+    assert job['intention'] == 'quiero ordenar mi proyecto'
+    assert queue.process(job)['status'] == 'done'
+
+
+def test_sweeper_abandons_rows_after_max_attempts(app, monkeypatch):
+    queue = use_queue(monkeypatch, NarrationQueue(workers=0))
+    manifest_id = post_async(app.test_client()).get_json()['manifest_id']
+    queue.backend.pop(timeout=0)
+    with app.app_context():
+        row = db.session.get(ManifestNarration, manifest_id)
+        row.status, row.attempts, row.started_at = 'running', 3, datetime.utcnow()
+        db.session.commit()
+        later = datetime.utcnow() + timedelta(seconds=NARRATION_STALE_AFTER + 1)
+        assert queue.sweep(now=later) == (0, 1)
+        assert db.session.get(ManifestNarration, manifest_id).status == 'failed'
+    assert queue.backend.depth() == 0
+
+
+def test_duplicate_job_for_a_finished_row_is_skipped(app, monkeypatch):
+    queue = use_queue(monkeypatch, NarrationQueue(workers=0))
+    post_async(app.test_client())
+    job = queue.backend.pop(timeout=0)
+    assert queue.process(dict(job))['status'] == 'done'
+    assert queue.process(dict(job)) is None
+    assert queue.stats()['completed'] == 1
+
+
+def test_redis_pop_is_acknowledged_or_requeued():
+    client = FakeRedisLists()
+    backend = RedisNarrationBackend(client=client, key='q')
+    backend.push({'manifest_id': 1})
+    backend.push({'manifest_id': 2})
+
+    first = backend.pop(timeout=1)
+    assert first['manifest_id'] == 1
+    assert backend.depth() == 1 and client.llen('q:processing') == 1
+    backend.ack(first)
+    assert client.llen('q:processing') == 0
+
+    # Worker caído con el job 2 en procesamiento: vuelve a la cola al vencer la visibilidad
+    assert backend.pop(timeout=1)['manifest_id'] == 2
+    assert backend.requeue_expired(timeout=60) == 0
+    assert backend.requeue_expired(timeout=0) == 1
+    assert client.llen('q:processing') == 0
+    assert backend.pop(timeout=1)['manifest_id'] == 2
@@ -0,0 +1,124 @@
+import json
+import os
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, jsonify, request
+
+import auth
+
+
+@pytest.fixture
+def app(monkeypatch):
+    for name in ('JWT_SECRET', 'JWT_SECRETS', 'JWT_PUBLIC_KEY', 'JWT_PUBLIC_KEYS', 'JWT_KEYS_FILE'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(auth, 'ENVIRONMENT', 'production')
+    app = Flask(__name__)
+
+    @app.route('/me')
+    @auth.require_jwt
+    def me():
+        return jsonify(request.user)
+
+    yield app
+    auth._key_ring = None
+    auth._token_cache.clear()
+
+
+def _rsa_pair():
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    return private, pem
+
+
+def _get(app, token):
+    return app.test_client().get('/me', headers={'Authorization': f'Bearer {token}'})
+
+
+def test_hs256_token_is_verified_once_then_cached(app, monkeypatch):
+    monkeypatch.setenv('JWT_SECRET', 'secreto')
+    auth.reload_key_ring()
+    token = jwt.encode({'id': 7, 'exp': int(time.time()) + 60}, 'secreto', algorithm='HS256')
+
+    calls = []
+    decode = jwt.decode
+    monkeypatch.setattr(auth.jwt, 'decode', lambda *a, **kw: calls.append(1) or decode(*a, **kw))
+    for _ in range(3):
+        response = _get(app, token)
+        assert response.status_code == 200
+        assert response.get_json()['id'] == 7
+    assert len(calls) == 1
+
+
+def test_cached_entry_does_not_outlive_token_exp(app, monkeypatch):
+    monkeypatch.setenv('JWT_SECRET', 'secreto')
+    auth.reload_key_ring()
+    token = jwt.encode({'id': 7, 'exp': int(time.time()) + 1}, 'secreto', algorithm='HS256')
+    assert _get(app, token).status_code == 200
+
+    time.sleep(2.1)
+    response = _get(app, token)
+    assert response.status_code == 401
+    assert response.get_json()['code'] == 'TOKEN_EXPIRED'
+
+
+def test_invalid_tokens_are_not_cached(app, monkeypatch):
+    monkeypatch.setenv('JWT_SECRET', 'secreto')
+    auth.reload_key_ring()
+    token = jwt.encode({'id': 7}, 'otro', algorithm='HS256')
+    for _ in range(2):
+        assert _get(app, token).get_json()['code'] == 'INVALID_TOKEN'
+
+
+def test_rs256_rotation_by_kid(app, monkeypatch):
+    old_key, old_pem = _rsa_pair()
+    new_key, new_pem = _rsa_pair()
+    monkeypatch.setenv('JWT_PUBLIC_KEY', old_pem.replace('\n', '\\n'))
+    monkeypatch.setenv('JWT_PUBLIC_KEYS', json.dumps({'k2': new_pem}))
+    auth.reload_key_ring()
+
+    legacy = jwt.encode({'id': 1}, old_key, algorithm='RS256')
+    rotated = jwt.encode({'id': 2}, new_key, algorithm='RS256', headers={'kid': 'k2'})
+    forged = jwt.encode({'id': 3}, old_key, algorithm='RS256', headers={'kid': 'k2'})
+
+    assert _get(app, legacy).get_json()['id'] == 1
+    assert _get(app, rotated).get_json()['id'] == 2
+    assert _get(app, forged).status_code == 401
+
+
+def test_keys_file_rotation_without_restart(app, monkeypatch, tmp_path):
+    keys_file = tmp_path / 'jwt_keys.json'
+    keys_file.write_text(json.dumps({'secrets': {'k1': 'uno'}}))
+    monkeypatch.setenv('JWT_KEYS_FILE', str(keys_file))
+    monkeypatch.setattr(auth, 'JWT_KEYS_CHECK_INTERVAL', 0)
+    auth.reload_key_ring()
+
+    first = jwt.encode({'id': 1}, 'uno', algorithm='HS256', headers={'kid': 'k1'})
+    second = jwt.encode({'id': 2}, 'dos', algorithm='HS256', headers={'kid': 'k2'})
+    assert _get(app, first).get_json()['id'] == 1
+    assert _get(app, second).status_code == 401
+
+    # Rotación: se añade k2 y se retira k1 en el archivo, sin reiniciar
+    keys_file.write_text(json.dumps({'secrets': {'k2': 'dos'}}))
+    mtime = keys_file.stat().st_mtime + 5
+    os.utime(keys_file, (mtime, mtime))
+    assert _get(app, second).get_json()['id'] == 2
+    assert _get(app, first).status_code == 401
+
+    # Un archivo roto conserva las llaves anteriores
+    keys_file.write_text('{')
+    os.utime(keys_file, (mtime + 5, mtime + 5))
+    third = jwt.encode({'id': 3}, 'dos', algorithm='HS256', headers={'kid': 'k2'})
+    assert _get(app, third).get_json()['id'] == 3
+
+
+def test_cache_is_bounded():
+    cache = auth.VerifiedTokenCache(maxsize=2, ttl=60)
+    for token in ('a', 'b', 'c'):
+        cache.put(token, {'id': token})
+    assert cache.get('a') is None
+    assert cache.get('c') == {'id': 'c'}
@@ -0,0 +1,91 @@
+import pytest
+from flask import Flask
+
+from core.card_deck import get_card_deck
+from instrumentation import get_query_count, init_query_counter
+from models import db, Card
+from routes.tarot import tarot_bp
+
+
+@pytest.fixture()
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    init_query_counter(app, db)
+    app.register_blueprint(tarot_bp, url_prefix="/api")
+    with app.app_context():
+        db.create_all()
+        for i in range(1, 23):
+            db.session.add(Card(id=i, title=f"Arcano {i}", principle=f"p{i}",
+                                protocol=f"derecho {i}", inverted_protocol=f"invertido {i}"))
+        db.session.commit()
+    # El cache es del proceso: cada app de test parte de un snapshot nuevo
+    get_card_deck().invalidate()
+    counts = []
+
+    @app.after_request
+    def capture(response):
+        counts.append(get_query_count())
+        return response
+
+    app.query_counts = counts
+    yield app
+
+
+def test_draws_hit_the_snapshot_not_the_database(app):
+    client = app.test_client()
+    client.post('/api/draw', json={'mode': 'single'})
+    for mode in ('single', 'triple', 'cross', 'full'):
+        cards = client.post('/api/draw', json={'mode': mode}).get_json()['cards']
+        assert len({c['id'] for c in cards}) == {'single': 1, 'triple': 3, 'cross': 5, 'full': 22}[mode]
+        for card in cards:
+            expected = ('invertido ' if card['inverted'] else 'derecho ') + str(card['id'])
+            assert card['protocol'] == expected
+    assert app.query_counts == [1, 0, 0, 0, 0]
+
+
+def test_manual_draw_keeps_order_and_skips_missing(app):
+    payload = app.test_client().post('/api/draw', json={'manual_cards': [5, 99, '2', 'x']}).get_json()
+    assert [c['id'] for c in payload['cards']] == [5, 2]
+    assert payload['sequence']['valid']
+    assert set(payload['coherence']) == {'narrative_flow', 'symbolic_density', 'transformative_potential'}
+
+
+def test_listing_etag_and_invalidation_on_commit(app):
+    client = app.test_client()
+    first = client.get('/api/cards')
+    assert len(first.get_json()) == 22
+    etag = first.headers['ETag']
+    assert client.get('/api/cards', headers={'If-None-Match': etag}).status_code == 304
+
+    version = get_card_deck().stats()['version']
+    with app.app_context():
+        db.session.get(Card, 3).title = "Arcano renombrado"
+        db.session.flush()
+        assert not get_card_deck().stats()['stale']   # aún sin commit
+        db.session.commit()
+    assert get_card_deck().stats()['stale']
+
+    changed = client.get('/api/cards', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()[2]['title'] == "Arcano renombrado"
+    assert get_card_deck().stats()['version'] == version + 1
+
+
+def test_rollback_does_not_invalidate(app):
+    app.test_client().get('/api/cards')
+    with app.app_context():
+        db.session.add(Card(id=50, title="efímera"))
+        db.session.flush()
+        db.session.rollback()
+    assert not get_card_deck().stats()['stale']
+
+
+def test_reload_swaps_snapshot(app):
+    with app.app_context():
+        old = get_card_deck().snapshot()
+        new = get_card_deck().reload()
+    assert new is not old
+    assert new.version == old.version + 1
+    assert old.by_id[1].title == new.by_id[1].title
@@ -0,0 +1,87 @@
+import numpy as np
+
+from core.advance_metrics import compute_resonance_coherence
+from core.card_deck import CardRecord, DeckSnapshot
+from core.card_graph import CardGraph
+
+
+def make_graph(specs, version=1):
+    cards = [CardRecord(id=cid, title=f"Arcano {cid}", **fields) for cid, fields in specs.items()]
+    return CardGraph(DeckSnapshot(version, cards))
+
+
+# 1 -> 2 -> 3 en dependencias (3 requiere 2, 2 requiere 1); 1 evoluciona a 4, 4 a 5
+DECK = {
+    1: {'resonance_type': 'temporal', 'evolution_path': [4]},
+    2: {'resonance_type': 'espacial', 'dependencies': [1]},
+    3: {'resonance_type': 'relacional', 'dependencies': ['2', 99]},
+    4: {'resonance_type': 'temporal', 'evolution_path': [5]},
+    5: {'resonance_type': 'temporal'},
+    6: {},
+}
+
+
+def test_csr_and_closures():
+    graph = make_graph(DECK)
+    assert graph.dep_offsets.tolist() == [0, 0, 1, 2, 2, 2, 2]
+    assert graph.dangling == 1
+    assert graph.dependencies_of(3) == [1, 2]
+    assert graph.dependencies_of(3, transitive=False) == [2]
+    assert graph.evolutions_of(1) == [4, 5]
+    assert graph.can_evolve(1, 5) and not graph.can_evolve(5, 1)
+    assert graph.stats()['cyclic_cards'] == 0
+
+
+def test_validate_sequence():
+    graph = make_graph(DECK)
+    assert graph.validate([1, 2, 3])['valid']
+    result = graph.validate([3, 2, 2, 42])
+    assert not result['valid']
+    assert result['missing_dependencies'] == {3: [1, 2], 2: [1]}
+    assert result['duplicates'] == [2]
+    assert result['unknown'] == [42]
+
+
+def test_cycles_are_never_satisfied():
+    graph = make_graph({1: {'dependencies': [2]}, 2: {'dependencies': [1]}})
+    assert graph.cyclic.tolist() == [True, True]
+    assert not graph.validate([1, 2])['valid']
+
+
+def test_batch_scores_match_single_and_rank_sequences():
+    graph = make_graph(DECK)
+    sequences = [[1, 2, 3], [3, 2, 1], [6], [1, 4, 5], []]
+    batch = graph.score_sequences(sequences)
+    for i, seq in enumerate(sequences):
+        single = graph.score_sequence(seq)
+        for name, values in batch.items():
+            assert np.isclose(values[i], single[name], atol=1e-4)
+
+    flow = batch['narrative_flow']
+    assert flow[0] == 1.0 and flow[3] == 1.0      # aristas directas
+    assert flow[1] == 0.0                          # orden inverso: nada conecta
+    assert flow[2] == 0.0 and flow[4] == 0.0      # sin transiciones
+    potential = batch['transformative_potential']
+    assert potential[0] > potential[1]             # dependencias en orden
+    assert potential[0] > 0.5                      # 1 abre la evolución a 4 y 5
+    assert batch['symbolic_density'][0] > batch['symbolic_density'][2]
+
+
+def test_chunked_scores_match_one_block():
+    graph = make_graph(DECK)
+    rng = np.random.default_rng(0)
+    sequences = [rng.choice([1, 2, 3, 4, 5, 6, 42], size=rng.integers(0, 6)).tolist() for _ in range(50)]
+    whole = graph.score_sequences(sequences)
+    chunked = graph.score_sequences(sequences, chunk=7)
+    for name, values in whole.items():
+        assert len(chunked[name]) == 50
+        assert np.array_equal(chunked[name], values), name
+    assert all(len(values) == 0 for values in graph.score_sequences([]).values())
+
+
+def test_compute_resonance_coherence_uses_graph():
+    graph = make_graph(DECK)
+    draw = [{'id': 1, 'inverted': False}, {'id': 4, 'inverted': True}]
+    scores = compute_resonance_coherence("cambio", draw, {'card_graph': graph})
+    assert set(scores) == {'narrative_flow', 'symbolic_density', 'transformative_potential'}
+    assert scores['narrative_flow'] == 1.0
@@ -0,0 +1,63 @@
+import pytest
+
+from sockets.cluster_aggregator import ClusterAggregator
+from sockets.fanout import FanoutQueue
+
+
+class _RecordingSocketIO:
+    def __init__(self):
+        self.emitted = []
+        self.binary = []
+
+    def start_background_task(self, target, *args):
+        return None
+
+    def emit(self, event, payload, to=None, namespace=None):
+        # Variante msgpack para '<room>:bin' (sockets.encoding) aparte
+        target = self.binary if isinstance(payload, bytes) else self.emitted
+        target.append((event, to, payload))
+
+
+@pytest.fixture()
+def pipeline():
+    fanout = FanoutQueue()
+    server = _RecordingSocketIO()
+    fanout.bind(server)
+    return ClusterAggregator(latest_items=3, fanout=fanout), fanout, server
+
+
+def test_events_fold_into_one_frame_per_cluster(pipeline):
+    aggregator, fanout, server = pipeline
+    for i in range(100):
+        aggregator.add("AETHOS", {"entropy": 0.2, "alignment": 0.8, "seq": i})
+    aggregator.add("SOMBRA", {"entropy": 0.9, "alignment": 0.1})
+
+    assert aggregator.flush() == 2
+    fanout.drain()
+    frames = {room: payload for _, room, payload in server.emitted}
+    assert len(server.emitted) == 2
+    assert frames["AETHOS"]["count"] == 100
+    assert frames["AETHOS"]["mean_entropy"] == pytest.approx(0.2)
+    assert [m["seq"] for m in frames["AETHOS"]["latest"]] == [99, 98, 97]
+    assert frames["AETHOS"]["collective_impact"] > frames["SOMBRA"]["collective_impact"]
+
+    # Sin actividad nueva no hay frames
+    assert aggregator.flush() == 0
+
+
+def test_pending_frame_defers_and_keeps_accumulating(pipeline):
+    aggregator, fanout, server = pipeline
+    aggregator.add("AETHOS", {"entropy": 0.5, "alignment": 0.5})
+    aggregator.flush()
+
+    # El frame anterior no ha salido (cliente lento): el tick no encola otro
+    aggregator.add("AETHOS", {"entropy": 0.1, "alignment": 0.9})
+    aggregator.add("AETHOS", {"entropy": 0.3, "alignment": 0.7})
+    assert aggregator.flush() == 0
+    assert fanout.stats()["pending"] == 1
+
+    fanout.drain()
+    assert aggregator.flush() == 1
+    fanout.drain()
+    assert [payload["count"] for _, _, payload in server.emitted] == [1, 2]
+    assert aggregator.stats()["deferred_ticks"] == 1
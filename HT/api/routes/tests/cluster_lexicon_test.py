@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+import core.cluster_lexicon as cluster_lexicon
+from core.cluster_lexicon import ClusterMatcher, get_matcher, reload_lexicon
+
+
+def test_matcher_counts_terms_like_str_count():
+    matcher = ClusterMatcher({"SOL": ["sol", "solar"], "HOGAR": ["lar", "ar"]})
+    # 'solar' contiene sol, solar, lar y ar: todas cuentan
+    assert matcher.count("solar") == [2, 2]
+    # Ocurrencias del mismo término: sin solaparse, como str.count
+    assert ClusterMatcher({"A": ["aa"]}).count("aaaa") == ["aaaa".count("aa")] == [2]
+    assert ClusterMatcher({"A": ["aa"]}).count("aaa") == [1]
+    assert ClusterMatcher({"A": ["ana", "nan"]}).count("ananana") == [3]
+    # Un término de varios clústeres suma en todos
+    assert ClusterMatcher({"A": ["paz"], "B": ["paz", "luz"]}).count("paz y luz") == [1, 2]
+
+
+def test_matcher_is_case_insensitive():
+    matcher = ClusterMatcher({"LUZ": ["Luz", "CLARIDAD"], "SOMBRA": ["miedo"]})
+    assert matcher.cluster_counts("LUZ y Claridad frente al MIEDO", []) == [2, 1]
+    assert matcher.cluster_counts("nada", [("claridad", 1)]) == [2, 0]
+    assert matcher.classify("Busco la LUZ", []) == "LUZ"
+
+
+@pytest.fixture
+def lexicon_file(tmp_path, monkeypatch):
+    # Se restaura el matcher global al terminar
+    for name in ("_matcher", "_loaded_path", "_loaded_mtime", "_next_check"):
+        monkeypatch.setattr(cluster_lexicon, name, getattr(cluster_lexicon, name))
+    path = tmp_path / "lexicon.json"
+    path.write_text(json.dumps({"clusters": {"AGUA": ["río"]}}), encoding="utf-8")
+    reload_lexicon(str(path))
+    return path
+
+
+def test_get_matcher_reloads_after_mtime_change(lexicon_file, monkeypatch):
+    first = get_matcher()
+    assert first.names == ["AGUA"]
+
+    lexicon_file.write_text(json.dumps({"clusters": {"FUEGO": ["llama"]}, "trends": {"FUEGO": 0.5}}),
+                            encoding="utf-8")
+    mtime = os.path.getmtime(lexicon_file) + 10
+    os.utime(lexicon_file, (mtime, mtime))
+    # Antes del siguiente chequeo se sigue sirviendo el matcher cargado
+    assert get_matcher() is first
+
+    monkeypatch.setattr(cluster_lexicon, "_next_check", 0.0)
+    second = get_matcher()
+    assert second is not first
+    assert second.names == ["FUEGO"] and second.trend_weights == [1.5]
+
+
+def test_broken_lexicon_keeps_the_previous_matcher(lexicon_file, monkeypatch):
+    first = get_matcher()
+    lexicon_file.write_text("{roto", encoding="utf-8")
+    mtime = os.path.getmtime(lexicon_file) + 10
+    os.utime(lexicon_file, (mtime, mtime))
+    monkeypatch.setattr(cluster_lexicon, "_next_check", 0.0)
+    assert get_matcher() is first
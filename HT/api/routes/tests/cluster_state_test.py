@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+import pytest
+
+import core.cluster_state as cluster_state
+
+from core.cluster_state import (ClusterStateService, LocalClusterBackend, RedisClusterBackend,
+                                manifestation_coherence)
+
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+@pytest.fixture(params=["local", "redis"])
+def state(request):
+    if request.param == "local":
+        yield ClusterStateService(LocalClusterBackend(recent_size=3))
+        return
+    if not TEST_REDIS_URL:
+        pytest.skip("TEST_REDIS_URL no configurada")
+    backend = RedisClusterBackend(TEST_REDIS_URL, recent_size=3, prefix=f"test:{os.getpid()}:")
+    yield ClusterStateService(backend)
+    for key in backend.client.scan_iter(f"test:{os.getpid()}:*"):
+        backend.client.delete(key)
+
+
+def test_membership_follows_join_leave_and_disconnect(state):
+    state.join("AETHOS", "sid-1")
+    state.join("AETHOS", "sid-2")
+    state.join("SOMBRA", "sid-2")
+    state.join("AETHOS", "sid-2")  # join repetido no duplica
+    assert state.member_count("AETHOS") == 2
+
+    state.leave("AETHOS", "sid-1")
+    assert state.member_count("AETHOS") == 1
+
+    state.disconnect("sid-2")
+    assert state.member_count("AETHOS") == 0
+    assert state.member_count("SOMBRA") == 0
+
+
+def test_recent_buffer_and_running_coherence(state):
+    samples = [(0.8, 0.2), (0.4, 0.6), (0.9, 0.1), (0.5, 0.5), (0.7, 0.3)]
+    for i, (alignment, entropy) in enumerate(samples):
+        state.record_manifestation("AETHOS", {"manifest_id": i, "alignment": alignment, "entropy": entropy})
+
+    assert [m["manifest_id"] for m in state.recent("AETHOS", 5)] == [4, 3, 2]
+    assert [m["manifest_id"] for m in state.recent("AETHOS", 2)] == [4, 3]
+
+    values = [manifestation_coherence(a, e) for a, e in samples]
+    stats = state.coherence_stats("AETHOS")
+    assert stats["count"] == 5
+    assert stats["mean"] == pytest.approx(np.mean(values))
+    assert stats["std"] == pytest.approx(np.std(values, ddof=1))
+    assert state.resonance("VACÍO") == 0.5
+
+
+class _FakeSortedSets:
+    """Subconjunto de redis.Redis para la membresía (sorted sets + pipeline)"""
+
+    def __init__(self):
+        self.zsets = {}
+
+    def register_script(self, script):
+        return None
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+    def zadd(self, key, mapping, xx=False):
+        zset = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            if not xx or member in zset:
+                zset[member] = score
+
+    def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_members_of_a_dead_worker_expire_without_disconnect(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cluster_state.time, "time", lambda: clock[0])
+    client = _FakeSortedSets()
+    alive = ClusterStateService(RedisClusterBackend(client=client, member_ttl=90))
+    dead = ClusterStateService(RedisClusterBackend(client=client, member_ttl=90))
+    monkeypatch.setattr(alive, "start", lambda: None)
+    monkeypatch.setattr(dead, "start", lambda: None)
+
+    alive.join("AETHOS", "sid-vivo")
+    dead.join("AETHOS", "sid-huerfano")
+    assert alive.member_count("AETHOS") == 2
+
+    # El worker vivo late; el caído ya no
+    clock[0] += 60
+    alive.heartbeat()
+    clock[0] += 60
+    assert alive.member_count("AETHOS") == 1
+
+    # Un latido no resucita a un sid que ya se fue
+    alive.leave("AETHOS", "sid-vivo")
+    alive._sessions["sid-vivo"] = {"AETHOS"}
+    alive.heartbeat()
+    assert alive.member_count("AETHOS") == 0
@@ -0,0 +1,5 @@
+# Los módulos de la API se importan como top-level (igual que en app.py)
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
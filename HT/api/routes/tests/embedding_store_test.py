@@ -0,0 +1,160 @@
+import time
+
+import numpy as np
+import pytest
+from flask import Flask
+
+import core.embedding_store as embedding_store
+import routes.manifest as manifest_routes
+from core.embedding_store import EMBEDDING_DIM, EmbeddingStore, _normalize
+from integrations.huggingface import narrative_embeddings
+from models import db, Manifest, User
+
+
+def _clustered(n, centers=32, seed=0):
+    rng = np.random.default_rng(seed)
+    means = rng.standard_normal((centers, EMBEDDING_DIM))
+    labels = rng.integers(0, centers, n)
+    return _normalize(means[labels] + 0.4 * rng.standard_normal((n, EMBEDDING_DIM)))
+
+
+def test_appends_are_visible_to_other_instances(tmp_path):
+    writer = EmbeddingStore(path=str(tmp_path))
+    reader = EmbeddingStore(path=str(tmp_path))
+    vectors = _clustered(20)
+    writer.append(range(1, 11), vectors[:10])
+    assert len(reader) == 10
+
+    writer.append(range(11, 21), vectors[10:])
+    assert reader.row_of(15) == 14
+    assert np.allclose(reader.vector_of(20), vectors[19], atol=1e-6)
+    assert reader.search(vectors[4], k=1)[0][0] == 5
+
+
+def test_row_of_with_out_of_order_ids(tmp_path):
+    store = EmbeddingStore(path=str(tmp_path))
+    vectors = _clustered(6)
+    store.append([10, 20, 30], vectors[:3])
+    assert store.row_of(20) == 1
+
+    # Backfill de una manifestación antigua y un id repetido (gana la última fila)
+    store.append([5, 40, 20], vectors[3:])
+    assert store.row_of(5) == 3
+    assert store.row_of(20) == 5
+    assert store.row_of(30) == 2
+    assert store.row_of(7) is None
+
+    # Otra instancia construye el índice id -> fila desde los archivos
+    other = EmbeddingStore(path=str(tmp_path))
+    assert [other.row_of(i) for i in (10, 20, 40, 5)] == [0, 5, 4, 3]
+
+
+def test_retired_ids_are_hidden_from_lookups_and_search(tmp_path):
+    store = EmbeddingStore(path=str(tmp_path))
+    vectors = _clustered(300)
+    store.append(range(1, 301), vectors)
+    assert store.retire([5, 6]) == 2
+    assert store.row_of(5) is None and store.vector_of(6) is None
+    assert store.row_of(7) == 6
+    assert 5 not in {mid for mid, _ in store.search(vectors[4], k=10)}
+
+    # Otros workers leen retired.i64; las filas nuevas conservan su estado
+    other = EmbeddingStore(path=str(tmp_path))
+    assert other.row_of(5) is None
+    other.append([301], vectors[:1])
+    assert store.row_of(301) == 300
+    assert 5 not in {mid for mid, _ in other.search(vectors[4], k=10)}
+
+    store.rebuild_index(nlist=8)
+    found = {mid for mid, _ in store.search(vectors[5], k=300, nprobe=8)}
+    assert found.isdisjoint({5, 6}) and len(found) == 299
+
+
+def test_search_returns_each_id_once(tmp_path):
+    store = EmbeddingStore(path=str(tmp_path))
+    vectors = _clustered(10)
+    store.append(range(1, 11), vectors)
+    # Dos backfills concurrentes del mismo id
+    store.append([3, 3, 3], vectors[[2, 2, 2]])
+    results = store.search(vectors[2], k=3)
+    assert [mid for mid, _ in results][0] == 3
+    assert len({mid for mid, _ in results}) == 3
+    assert [mid for mid, _ in store.search(vectors[2], k=9, exclude_id=3)].count(3) == 0
+    assert len(store.search(vectors[2], k=20)) == 10
+
+
+def test_ivf_search_recall_against_brute_force(tmp_path):
+    store = EmbeddingStore(path=str(tmp_path))
+    vectors = _clustered(4000)
+    store.append(range(4000), vectors)
+    store.rebuild_index(nlist=64)
+    queries = _clustered(50, seed=1)
+
+    hits = 0
+    for query in queries:
+        exact = set(np.argsort(-(vectors @ query))[:10].tolist())
+        approx = {mid for mid, _ in store.search(query, k=10, nprobe=16)}
+        hits += len(exact & approx)
+    assert hits / (10 * len(queries)) >= 0.9
+
+
+def test_first_training_runs_in_the_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_store, 'IVF_MIN_TRAIN', 256)
+    store = EmbeddingStore(path=str(tmp_path))
+    trained = []
+    rebuild = store.rebuild_index
+
+    def slow_rebuild(nlist=None):
+        time.sleep(0.2)
+        rebuild(nlist)
+        trained.append(True)
+
+    store.rebuild_index = slow_rebuild
+    started = time.monotonic()
+    store.append(range(300), _clustered(300))
+    assert time.monotonic() - started < 0.2
+    assert store._index is None
+    assert len(store.search(_clustered(1)[0], k=5)) == 5
+
+    deadline = time.monotonic() + 5
+    while not trained:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert store._index is not None and store._index.trained_count == 300
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    app.register_blueprint(manifest_routes.manifest_bp, url_prefix="/api")
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="dev", coherence=0.5))
+        for i, intention in enumerate(("abrir caminos", "cerrar ciclos", "abrir puertas"), start=1):
+            db.session.add(Manifest(id=i, user_id=1, intention=intention, mask="Narrador"))
+        db.session.commit()
+
+    store = EmbeddingStore(path=str(tmp_path / "embeddings"))
+    monkeypatch.setattr(manifest_routes, 'get_embedding_store', lambda: store)
+    app.store = store
+    yield app
+
+
+def test_similar_returns_404_for_unknown_manifest(app):
+    response = app.test_client().get('/api/manifest/99/similar')
+    assert response.status_code == 404
+    assert len(app.store) == 0
+
+
+def test_similar_backfills_manifests_missing_from_the_store(app):
+    app.store.append([2, 3], narrative_embeddings(["cerrar ciclos", "abrir puertas"]))
+
+    response = app.test_client().get('/api/manifest/1/similar?k=5')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert sorted(item['manifest_id'] for item in body['similar']) == [2, 3]
+    # Indexada bajo demanda, fuera de orden
+    assert app.store.row_of(1) == 2
+    assert np.allclose(app.store.vector_of(1), _normalize(narrative_embeddings(["abrir caminos"])[0]), atol=1e-6)
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+from integrations import huggingface
+from integrations.generation_cache import DiskTier, GenerationCache, generation_key
+
+PARAMS = {"temperature": 0.85, "max_new_tokens": 300}
+
+
+def test_key_depends_on_model_prompt_and_params():
+    base = generation_key("m", "intención", PARAMS)
+    assert base == generation_key("m", "intención", dict(reversed(list(PARAMS.items()))))
+    assert base != generation_key("otro", "intención", PARAMS)
+    assert base != generation_key("m", "intención ", PARAMS)
+    assert base != generation_key("m", "intención", {**PARAMS, "max_new_tokens": 200})
+
+
+def test_hit_after_miss_and_lru_eviction():
+    cache = GenerationCache(maxsize=2, ttl=60)
+    calls = []
+    for key in ["a", "a", "b", "c", "a"]:
+        cache.get_or_compute(key, lambda key=key: calls.append(key) or f"texto {key}")
+    # "a" se expulsa al entrar "c" (capacidad 2) y se recalcula
+    assert calls == ["a", "b", "c", "a"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_concurrent_identical_requests_share_one_call():
+    cache = GenerationCache(maxsize=16, ttl=60)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "respuesta"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", slow))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ["respuesta"] * 8
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 7
+
+
+def test_error_responses_are_not_cached():
+    cache = GenerationCache(maxsize=16, ttl=60)
+    assert cache.get_or_compute("k", lambda: "[ERROR_HF: 503] loading").startswith("[ERROR_HF")
+    assert cache.get_or_compute("k", lambda: "ok") == "ok"
+    assert cache.stats()["uncacheable"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    GenerationCache(ttl=60, tier=DiskTier(str(tmp_path))).get_or_compute("k", lambda: "persistente")
+    restarted = GenerationCache(ttl=60, tier=DiskTier(str(tmp_path)))
+    assert restarted.get_or_compute("k", lambda: "recalculado") == "persistente"
+    assert restarted.stats()["tier_hits"] == 1
+
+
+def test_disk_tier_deletes_expired_and_prunes_to_the_cap(tmp_path):
+    tier = DiskTier(str(tmp_path), max_entries=3, prune_interval=3600)
+    tier.set("expirada", "vieja", -1)
+    assert tier.get("expirada") is None
+    assert not os.path.exists(tier._file("expirada"))
+
+    for i in range(5):
+        tier.set(f"k{i}", str(i), 60 + i)
+    tier.set("otra", "x", -1)
+    orphan = tier._file("k0") + ".123.1.tmp"
+    open(orphan, "w").close()
+    os.utime(orphan, (time.time() - 7200, time.time() - 7200))
+
+    assert tier.prune() == 4                      # caducada, .tmp huérfano y las 2 que caducan antes
+    assert [tier.get(f"k{i}") for i in range(5)] == [None, None, "2", "3", "4"]
+    assert not os.path.exists(orphan)
+
+
+def test_disk_tier_prunes_in_the_background(tmp_path):
+    tier = DiskTier(str(tmp_path), max_entries=1, prune_interval=0)
+    tier.set("a", "1", 60)
+    deadline = time.monotonic() + 5
+    while tier._pruning:                          # la poda lanzada por "a" (nada que borrar)
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    tier.set("b", "2", 120)
+    while tier.get("a") is not None:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert tier.get("b") == "2"
+
+
+def test_generate_text_goes_through_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(huggingface, "HF_TOKEN", "token")
+    monkeypatch.setattr(huggingface, "_generate_remote", lambda prompt, model, params: calls.append(prompt) or "eco")
+    monkeypatch.setattr(huggingface, "get_generation_cache", lambda cache=GenerationCache(): cache)
+
+    assert huggingface.generate_text("misma intención", max_tokens=300) == "eco"
+    assert huggingface.generate_text("misma intención", max_tokens=300) == "eco"
+    huggingface.generate_text("misma intención", max_tokens=200)
+    assert calls == ["misma intención", "misma intención"]
@@ -0,0 +1,93 @@
+import importlib
+import threading
+
+import pytest
+
+from integrations import huggingface, local_generation
+from integrations.generation_cache import GenerationCache
+from integrations.local_generation import DynamicBatcher
+
+
+def test_concurrent_prompts_share_a_forward_pass():
+    sizes = []
+    gate = threading.Event()
+
+    def forward(items):
+        gate.wait(1)
+        sizes.append(len(items))
+        return [item.upper() for item in items]
+
+    batcher = DynamicBatcher(forward, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(f"p{i}") for i in range(6)]
+    gate.set()
+    assert [f.result(2) for f in futures] == [f"P{i}" for i in range(6)]
+    assert sizes == [4, 2]
+    assert batcher.stats()["batches"] == 2
+
+
+def test_batch_errors_reach_every_caller():
+    def forward(items):
+        raise RuntimeError("sin memoria")
+
+    batcher = DynamicBatcher(forward, max_batch_size=2, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(2)
+
+
+class _FakeGenerator:
+    loads = 0
+
+    def __init__(self):
+        type(self).loads += 1
+        self.calls = []
+
+    def generate_batch(self, items):
+        self.calls.extend(params for _, params in items)
+        return [f"{prompt} local" for prompt, _ in items]
+
+
+@pytest.fixture
+def local_env(monkeypatch):
+    """GENERATION_BACKEND=local en el entorno; huggingface se recarga para leerlo"""
+    monkeypatch.setenv("GENERATION_BACKEND", "local")
+    monkeypatch.delenv("HUGGINGFACE_TOKEN", raising=False)
+    monkeypatch.setattr(local_generation, "local_generation_available", lambda: True)
+    monkeypatch.setattr(local_generation, "_local_batcher", None)
+    monkeypatch.setattr(local_generation, "_local_failure", None)
+    importlib.reload(huggingface)
+    monkeypatch.setattr(huggingface, "get_generation_cache", lambda cache=GenerationCache(): cache)
+    yield monkeypatch
+    monkeypatch.undo()
+    importlib.reload(huggingface)
+
+
+def test_local_backend_is_selected_by_env(local_env):
+    _FakeGenerator.loads = 0
+    local_env.setattr(local_generation, "LocalGenerator", _FakeGenerator)
+
+    assert huggingface.GENERATION_BACKEND == "local"
+    assert huggingface.generate_text("intención", max_tokens=64) == "intención local"
+    assert local_generation.get_local_batcher() is local_generation.get_local_batcher()
+    assert _FakeGenerator.loads == 1
+
+
+def test_failed_model_load_backs_off(local_env):
+    loads = []
+
+    def broken():
+        loads.append(1)
+        raise OSError("modelo no encontrado")
+
+    local_env.setattr(local_generation, "LocalGenerator", broken)
+    for i in range(3):
+        assert huggingface.generate_text(f"intención {i}", max_tokens=8).startswith("[EXCEPTION:")
+    assert len(loads) == 1
+
+    # Vencido el backoff se reintenta la carga
+    failure = local_generation._local_failure
+    local_env.setattr(local_generation, "_local_failure", (failure[0], 0.0))
+    local_env.setattr(local_generation, "LocalGenerator", _FakeGenerator)
+    assert huggingface.generate_text("otra", max_tokens=8) == "otra local"
+    assert local_generation._local_failure is None
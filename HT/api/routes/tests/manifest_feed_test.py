@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from instrumentation import get_query_count, init_query_counter
+from models import db, Manifest, User
+from routes.manifest import manifest_bp
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture()
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    init_query_counter(app, db)
+    app.register_blueprint(manifest_bp, url_prefix="/api")
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="testigo"))
+        db.session.add(User(id=2, username="legión"))
+        for i in range(55):
+            # Pares con el mismo created_at: el desempate es el id
+            db.session.add(Manifest(user_id=1 + i % 2, intention=f"intención {i}", mask="Narrador",
+                                    cluster="AETHOS" if i % 3 else "VÍNCULO", keywords="a,b",
+                                    created_at=START + timedelta(minutes=i // 2)))
+        db.session.commit()
+    yield app
+
+
+def walk(client, query=''):
+    ids, cursor, pages = [], None, 0
+    while True:
+        url = f"/api/manifests?limit=10{query}" + (f"&cursor={cursor}" if cursor else '')
+        body = client.get(url).get_json()
+        ids += [item['id'] for item in body['items']]
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return ids, pages
+
+
+def expected_ids(app, **filters):
+    with app.app_context():
+        rows = Manifest.query.filter_by(**filters).order_by(Manifest.created_at.desc(), Manifest.id.desc()).all()
+        return [m.id for m in rows]
+
+
+def test_keyset_pages_cover_feed_in_order(app):
+    ids, pages = walk(app.test_client())
+    assert ids == expected_ids(app)
+    assert pages == 6
+
+
+def test_filters_by_cluster_and_user(app):
+    client = app.test_client()
+    assert walk(client, '&cluster=VÍNCULO')[0] == expected_ids(app, cluster='VÍNCULO')
+    assert walk(client, '&user_id=2')[0] == expected_ids(app, user_id=2)
+
+    item = client.get('/api/manifests?limit=1&user_id=2').get_json()['items'][0]
+    assert item['author'] == 'legión'
+    assert item['keywords'] == ['a', 'b']
+
+
+def test_etag_polling(app):
+    client = app.test_client()
+    first = client.get('/api/manifests')
+    etag = first.headers['ETag']
+
+    polled = client.get('/api/manifests', headers={'If-None-Match': etag})
+    assert polled.status_code == 304
+    assert polled.headers['ETag'] == etag
+
+    with app.app_context():
+        db.session.add(Manifest(user_id=1, intention="nueva", created_at=START + timedelta(days=1)))
+        db.session.commit()
+    changed = client.get('/api/manifests', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()['items'][0]['intention'] == 'nueva'
+
+
+def test_query_budget(app):
+    client = app.test_client()
+    counts = []
+
+    @app.after_request
+    def capture(response):
+        counts.append(get_query_count())
+        return response
+
+    etag = client.get('/api/manifests').headers['ETag']
+    client.get('/api/manifests', headers={'If-None-Match': etag})
+    assert counts == [1, 1]
+
+
+def test_invalid_cursor(app):
+    response = app.test_client().get('/api/manifests?cursor=no-es-un-cursor')
+    assert response.status_code == 400
+    assert response.get_json()['code'] == 'INVALID_CURSOR'
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from instrumentation import get_query_count, init_query_counter, reset_query_count
+from models import db, Manifest, User, UserStats
+from routes.manifest import backfill_user_stats, load_user_context, persist_manifestation
+
+
+@pytest.fixture()
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    init_query_counter(app, db)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="testigo", coherence=0.5))
+        db.session.add(User(id=2, username="nuevo", coherence=0.5))
+        start = datetime(2025, 1, 1)
+        for i in range(12):
+            db.session.add(Manifest(user_id=1, intention=f"intención {i}", mask="Narrador",
+                                    entropy=0.1 * (i % 10), alignment=0.05 * i,
+                                    created_at=start + timedelta(minutes=i)))
+        db.session.commit()
+    yield app
+
+
+def test_load_user_context_is_one_query_once_seeded(app):
+    with app.test_request_context():
+        # Usuario con historial previo a user_stats: se siembra una vez
+        history, profile, stats = load_user_context(1)
+        db.session.commit()
+
+    with app.test_request_context():
+        reset_query_count()
+        history, profile, stats = load_user_context(1)
+        assert get_query_count() == 1
+
+    # Más reciente primero, 10 filas; el perfil promedia las 5 más recientes
+    assert len(history) == 10
+    assert history[0]["alignment"] == pytest.approx(0.55)
+    assert profile["avg_alignment"] == pytest.approx(sum(0.05 * i for i in range(7, 12)) / 5)
+    assert profile["coherence"] == 0.5
+    assert stats.manifest_count == 12
+    assert stats.first_entropy == pytest.approx(0.0)
+
+
+def test_load_user_context_without_history_or_user(app):
+    with app.test_request_context():
+        history, profile, stats = load_user_context(2)
+        assert (history, profile) == ([], {"avg_alignment": 0.5, "coherence": 0.5})
+        assert stats.manifest_count == 0
+        assert load_user_context(99) == ([], {}, None)
+
+
+def test_persist_manifestation_is_one_write_transaction(app):
+    with app.test_request_context():
+        load_user_context(1)
+        db.session.commit()
+
+    manifest = Manifest(user_id=1, intention="crear", mask="Narrador", entropy=0.2,
+                        alignment=0.8, keywords="crear", created_at=datetime.utcnow())
+    with app.test_request_context():
+        _, _, stats = load_user_context(1)
+        reset_query_count()
+        manifest_id, created_at = persist_manifestation(manifest, 1, 0.8, 0.2, stats)
+        # Solo la relectura con FOR UPDATE del agregado
+        assert get_query_count("select") == 1
+        assert get_query_count("insert") == 1
+        assert get_query_count("update") == 2
+
+    with app.app_context():
+        assert manifest_id is not None
+        assert db.session.get(User, 1).coherence == pytest.approx(0.8)
+        stats = db.session.get(UserStats, 1)
+        assert stats.manifest_count == 13
+        assert stats.entropy_window[0] == pytest.approx(0.2)
+        assert len(stats.entropy_window) == 10
+
+
+def test_persist_manifestation_folds_over_the_committed_aggregate(app):
+    with app.test_request_context():
+        load_user_context(1)
+        db.session.commit()
+
+    manifest = Manifest(user_id=1, intention="crear", mask="Narrador", entropy=0.2,
+                        alignment=0.8, keywords="crear", created_at=datetime.utcnow())
+    with app.test_request_context():
+        _, _, stats = load_user_context(1)
+        # Otra petición del mismo usuario confirma mientras tanto
+        with db.engine.begin() as conn:
+            conn.execute(UserStats.__table__.update().where(UserStats.user_id == 1).values(manifest_count=20))
+        persist_manifestation(manifest, 1, 0.8, 0.2, stats)
+
+    with app.app_context():
+        assert db.session.get(UserStats, 1).manifest_count == 21
+
+
+def test_backfill_tolerates_a_concurrent_seed(app):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(UserStats.__table__.insert().values(user_id=1, manifest_count=7))
+
+    with app.test_request_context():
+        stats = backfill_user_stats(1)
+        db.session.commit()
+        assert stats.manifest_count == 7
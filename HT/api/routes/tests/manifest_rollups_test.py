@@ -0,0 +1,194 @@
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from core.manifest_partitions import add_months, expired_partitions, partition_month, partition_name
+import core.manifest_rollups as manifest_rollups
+from core.manifest_rollups import (
+    daily_series, floor_hour, init_manifest_maintenance, manifest_activity, rebuild, rolled_until
+)
+from migrations.runner import run_migrations
+from models import db, Manifest, ManifestRollupHourly, User
+
+NOW = datetime(2025, 3, 10, 14, 25)
+
+
+@pytest.fixture()
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="ana"))
+        # Una manifestación cada 20 minutos durante los dos últimos días
+        for i in range(144):
+            db.session.add(Manifest(user_id=1, cluster=('AETHOS', 'VÍNCULO', None)[i % 3],
+                                    entropy=(i % 10) / 10, alignment=0.5,
+                                    created_at=NOW - timedelta(minutes=20 * i + 1)))
+        db.session.commit()
+    init_manifest_maintenance(app, db)
+    yield app
+
+
+def raw_activity(since, now=NOW):
+    rows = Manifest.query.filter(Manifest.created_at >= since, Manifest.created_at < now).all()
+    clusters = {}
+    for row in rows:
+        clusters[row.cluster or ''] = clusters.get(row.cluster or '', 0) + 1
+    return len(rows), clusters, round(sum(r.entropy for r in rows) / len(rows), 4)
+
+
+def assert_matches_raw(since):
+    activity = manifest_activity(db.session, since, NOW)
+    count, clusters, mean_entropy = raw_activity(since)
+    assert activity['manifestations'] == count
+    assert activity['clusters'] == clusters
+    assert activity['mean_entropy'] == mean_entropy
+    assert activity['mean_alignment'] == 0.5
+
+
+def test_activity_matches_raw_rows(app):
+    with app.app_context():
+        # Sin mantenimiento: todo sale de manifests y la lectura no escribe rollups
+        assert_matches_raw(NOW - timedelta(days=1))
+        assert db.session.query(ManifestRollupHourly).count() == 0
+
+        init_manifest_maintenance(app, db).run_once(NOW - timedelta(hours=3))
+        for since in (NOW - timedelta(days=1), NOW - timedelta(hours=5, minutes=7), NOW - timedelta(minutes=10)):
+            assert_matches_raw(since)
+        # Las horas completas salen de los rollups (hasta donde llegó el mantenimiento)
+        assert db.session.query(ManifestRollupHourly).count() > 0
+        assert rolled_until(db.session) == floor_hour(NOW) - timedelta(hours=3)
+
+
+def test_late_rows_are_folded_on_next_cycle(app):
+    with app.app_context():
+        init_manifest_maintenance(app, db).run_once(NOW)
+        since = NOW - timedelta(days=1)
+        before = manifest_activity(db.session, since, NOW)['manifestations']
+        db.session.add(Manifest(user_id=1, cluster='AETHOS', entropy=0.1, alignment=0.5,
+                                created_at=NOW - timedelta(hours=2)))
+        db.session.commit()
+        assert manifest_activity(db.session, since, NOW)['manifestations'] == before   # hora ya agregada
+
+        maintenance = init_manifest_maintenance(app, db)
+        maintenance.run_once(NOW)
+        assert maintenance.stats()['runs'] == 1
+        assert manifest_activity(db.session, since, NOW)['manifestations'] == before + 1
+
+
+def test_first_cycle_of_a_worker_resumes_from_the_rollups(app):
+    with app.app_context():
+        init_manifest_maintenance(app, db).run_once(NOW - timedelta(days=1, hours=2))
+        # Otro worker, un día después: recorre el hueco entero desde el último bucket
+        maintenance = init_manifest_maintenance(app, db)
+        maintenance.run_once(NOW)
+        assert rolled_until(db.session) == floor_hour(NOW)
+        assert_matches_raw(NOW - timedelta(days=1, hours=6))
+
+
+def test_cycle_is_skipped_without_the_runner_lock(app, monkeypatch):
+    @contextmanager
+    def held_elsewhere():
+        yield False
+
+    with app.app_context():
+        maintenance = init_manifest_maintenance(app, db)
+        monkeypatch.setattr(maintenance, '_single_runner', held_elsewhere)
+        assert maintenance.run_once(NOW) is False
+        assert maintenance.stats()['skipped'] == 1 and maintenance.stats()['runs'] == 0
+        assert db.session.query(ManifestRollupHourly).count() == 0
+
+
+def test_daily_series_sums_complete_hours(app):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            rebuild(conn, NOW - timedelta(days=3), floor_hour(NOW))
+        series = daily_series(db.session, NOW - timedelta(days=3))
+        assert [d['day'] for d in series] == ['2025-03-08', '2025-03-09', '2025-03-10']
+        yesterday = Manifest.query.filter(Manifest.created_at >= datetime(2025, 3, 9),
+                                          Manifest.created_at < datetime(2025, 3, 10)).count()
+        assert series[1]['manifestations'] == yesterday == 72
+
+
+def test_partition_naming_and_retention_window():
+    assert add_months(datetime(2024, 11, 15), 3) == datetime(2025, 2, 1)
+    assert add_months(datetime(2024, 1, 1), -1) == datetime(2023, 12, 1)
+    assert partition_name(datetime(2025, 3, 1)) == 'manifests_p202503'
+    assert partition_month('manifests_p202503') == datetime(2025, 3, 1)
+    assert partition_month('manifests_default') is None
+
+    partitions = [(partition_name(m), m) for m in (datetime(2024, 11, 1), datetime(2024, 12, 1), datetime(2025, 1, 1))]
+    assert expired_partitions(partitions, NOW, months=0) == []
+    assert [name for name, _ in expired_partitions(partitions, NOW, months=3)] == ['manifests_p202411']
+
+
+def test_retention_retires_embeddings_after_the_commit(app, monkeypatch):
+    retired = []
+
+    class Store:
+        def retire(self, ids):
+            retired.extend(ids)
+            return len(ids)
+
+    month = datetime(2024, 11, 1)
+    monkeypatch.setattr(manifest_rollups, 'is_partitioned', lambda conn: True)
+    monkeypatch.setattr(manifest_rollups, 'list_partitions', lambda conn: [(partition_name(month), month)])
+    monkeypatch.setattr(manifest_rollups, 'retire_partition', lambda conn, name: [11, 12])
+    monkeypatch.setattr(manifest_rollups, 'expired_partitions',
+                        lambda partitions, now: expired_partitions(partitions, now, months=3))
+    monkeypatch.setattr(manifest_rollups, 'get_embedding_store', lambda: Store())
+    with app.app_context():
+        maintenance = init_manifest_maintenance(app, db)
+        maintenance.apply_retention(NOW)
+    assert retired == [11, 12]
+    assert maintenance.stats()['partitions_retired'] == 1
+    assert maintenance.stats()['embeddings_retired'] == 2
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason="TEST_DATABASE_URL (PostgreSQL) no configurada")
+def test_postgres_retirement_takes_the_narrations_along():
+    from core.manifest_partitions import ensure_partitions, retire_partition
+
+    engine = create_engine(os.environ['TEST_DATABASE_URL'])
+    run_migrations(engine, log=lambda _: None)
+    month = datetime(2001, 1, 1)
+    name = partition_name(month)
+    with engine.begin() as conn:
+        ensure_partitions(conn, month, month)
+        manifest_id = conn.execute(text(
+            "INSERT INTO manifests (intention, created_at) VALUES ('p', :at) RETURNING id"
+        ), {'at': month}).scalar()
+        conn.execute(text("INSERT INTO manifest_narrations (manifest_id, status) VALUES (:id, 'done')"),
+                     {'id': manifest_id})
+        assert retire_partition(conn, name, mode='archive') == [manifest_id]
+        assert conn.execute(text("SELECT count(*) FROM manifest_narrations WHERE manifest_id = :id"),
+                            {'id': manifest_id}).scalar() == 0
+        assert conn.execute(text("SELECT count(*) FROM archive.manifest_narrations WHERE manifest_id = :id"),
+                            {'id': manifest_id}).scalar() == 1
+        conn.rollback()
+    engine.dispose()
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason="TEST_DATABASE_URL (PostgreSQL) no configurada")
+def test_postgres_manifests_are_partitioned():
+    from core.manifest_partitions import is_partitioned, list_partitions
+
+    engine = create_engine(os.environ['TEST_DATABASE_URL'])
+    run_migrations(engine, log=lambda _: None)
+    with engine.begin() as conn:
+        assert is_partitioned(conn)
+        months = [month for _, month in list_partitions(conn)]
+        assert datetime(datetime.utcnow().year, datetime.utcnow().month, 1) in months
+        conn.execute(text("INSERT INTO manifests (intention, created_at) VALUES ('p', now())"))
+        plan = '\n'.join(row[0] for row in conn.execute(text(
+            "EXPLAIN SELECT count(*) FROM manifests WHERE created_at >= date_trunc('month', now())")))
+        # Poda de particiones: solo se recorre el mes en curso (y las futuras / default)
+        assert partition_name(months[0]) not in plan or len(months) == 1
+        conn.rollback()
+    engine.dispose()
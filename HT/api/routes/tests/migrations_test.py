@@ -0,0 +1,148 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from core.manifest_rollups import floor_hour, rebuild
+from migrations.runner import run_migrations, status
+from models import db
+
+ROLLUP_TABLES = ('manifest_rollups_hourly', 'manifest_rollups_daily')
+
+# db/init.sql en dialecto sqlite (SERIAL -> INTEGER, NOW() -> CURRENT_TIMESTAMP)
+LEGACY_SCHEMA = (
+    """CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE NOT NULL, password_hash TEXT,
+       role TEXT DEFAULT 'testigo', coherence FLOAT DEFAULT 0.5, style TEXT,
+       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE cards (id INTEGER PRIMARY KEY, title TEXT, path TEXT, frequency TEXT, principle TEXT,
+       protocol TEXT, inverted_protocol TEXT, image_url TEXT)""",
+    """CREATE TABLE manifestations (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), intention TEXT,
+       mask TEXT, entropy FLOAT, alignment FLOAT, keywords TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE diagnostics (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), query JSON,
+       result JSON, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+)
+
+# Consultas calientes y el índice que debe usar cada una
+TOP_QUERIES = (
+    ("SELECT entropy, alignment FROM manifests WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 10",
+     'ix_manifests_user_feed'),
+    ("SELECT id, created_at FROM manifests WHERE cluster = :cluster ORDER BY created_at DESC, id DESC LIMIT 20",
+     'ix_manifests_cluster_feed'),
+    ("SELECT id, created_at FROM manifests ORDER BY created_at DESC, id DESC LIMIT 20",
+     'ix_manifests_feed'),
+    ("SELECT count(*) FROM manifests WHERE created_at >= :since",
+     ('ix_manifests_feed', 'ix_manifests_created_brin')),
+    ("SELECT count(user_id) FROM user_stats WHERE last_manifest_at >= :since",
+     'ix_user_stats_last_manifest'),
+)
+PARAMS = {'user_id': 1, 'cluster': 'AETHOS', 'since': datetime(2024, 1, 1)}
+
+
+def seed(conn, rows=200):
+    conn.execute(text("INSERT INTO users (id, username) VALUES (1, 'ana'), (2, 'leo')"))
+    start = datetime(2024, 1, 1)
+    conn.execute(
+        text("INSERT INTO manifestations (user_id, intention, entropy, alignment, created_at) "
+             "VALUES (:u, 'x', 0.5, 0.5, :t)"),
+        [{'u': 1 + i % 2, 't': start + timedelta(minutes=i)} for i in range(rows)]
+    )
+
+
+@pytest.fixture()
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for ddl in LEGACY_SCHEMA:
+            conn.execute(text(ddl))
+        seed(conn)
+    yield engine
+    engine.dispose()
+
+
+def test_reconciles_init_sql_schema(legacy_engine):
+    assert run_migrations(legacy_engine, log=lambda _: None) == ['0001', '0002', '0003']
+    schema = inspect(legacy_engine)
+    tables = set(schema.get_table_names())
+    assert 'manifestations' not in tables
+    assert {'manifests', 'manifest_narrations', 'user_stats', 'schema_migrations',
+            'manifest_rollups_hourly', 'manifest_rollups_daily'} <= tables
+    assert {'cluster', 'resonance_score', 'progress'} <= {c['name'] for c in schema.get_columns('manifests')}
+    assert 'last_seen' in {c['name'] for c in schema.get_columns('users')}
+    assert {'resonance_type', 'dependencies', 'evolution_path'} <= {c['name'] for c in schema.get_columns('cards')}
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM manifests")).scalar() == 200
+
+    assert run_migrations(legacy_engine, log=lambda _: None) == []
+    assert all(applied for *_, applied in status(legacy_engine))
+
+
+def test_rollup_backfill_matches_maintenance_rebuild(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE manifests (id INTEGER PRIMARY KEY, user_id INTEGER, intention TEXT, mask TEXT, "
+                          "entropy FLOAT, alignment FLOAT, keywords TEXT, created_at TIMESTAMP)"))
+        conn.execute(text("INSERT INTO manifests (id, user_id, intention, entropy, alignment, created_at) "
+                          "VALUES (1, 1, 'nueva', 0.2, 0.9, '2025-01-01 10:30:00.000000')"))
+    run_migrations(legacy_engine, log=lambda _: None)
+    query = "SELECT bucket, cluster, manifest_count, entropy_sum, alignment_sum FROM {} ORDER BY bucket, cluster"
+    with legacy_engine.begin() as conn:
+        migrated = {name: conn.execute(text(query.format(name))).all() for name in ROLLUP_TABLES}
+        assert sum(row[2] for row in migrated['manifest_rollups_daily']) == 201
+        rebuild(conn, datetime(2023, 12, 31), floor_hour(datetime.utcnow()))
+        for name in ROLLUP_TABLES:
+            assert conn.execute(text(query.format(name))).all() == migrated[name], name
+
+
+def test_merges_legacy_rows_when_both_tables_exist(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE manifests (id INTEGER PRIMARY KEY, user_id INTEGER, intention TEXT, mask TEXT, "
+                          "entropy FLOAT, alignment FLOAT, keywords TEXT, created_at TIMESTAMP)"))
+        conn.execute(text("INSERT INTO manifests (id, user_id, intention, created_at) VALUES (1, 1, 'nueva', '2025-01-01')"))
+    run_migrations(legacy_engine, log=lambda _: None)
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM manifests")).scalar() == 201
+        assert conn.execute(text("SELECT count(*) FROM manifestations_legacy")).scalar() == 200
+
+
+def test_fresh_database_matches_create_all(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    run_migrations(engine, log=lambda _: None)
+    indexes = {i['name'] for i in inspect(engine).get_indexes('manifests')}
+    assert {'ix_manifests_feed', 'ix_manifests_cluster_feed', 'ix_manifests_user_feed'} <= indexes
+    # El DDL congelado de las migraciones produce las columnas de los modelos
+    schema = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        assert {c['name'] for c in schema.get_columns(table.name)} == set(table.columns.keys()), table.name
+    engine.dispose()
+
+
+def _plan_uses(plan, expected):
+    expected = (expected,) if isinstance(expected, str) else expected
+    return any(name in plan for name in expected)
+
+
+def test_top_queries_use_indexes_sqlite(legacy_engine):
+    run_migrations(legacy_engine, log=lambda _: None)
+    with legacy_engine.connect() as conn:
+        for sql, expected in TOP_QUERIES:
+            plan = ' | '.join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), PARAMS))
+            assert _plan_uses(plan, expected), f"{sql}\n  -> {plan}"
+            assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, plan
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason="TEST_DATABASE_URL (PostgreSQL) no configurada")
+def test_top_queries_use_indexes_postgres():
+    engine = create_engine(os.environ['TEST_DATABASE_URL'])
+    run_migrations(engine, log=lambda _: None)
+    with engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_manifests_created_brin'"
+        )).scalar().lower().find('using brin') > 0
+        # Tablas de test pequeñas: sin seq scan se comprueba que existe un plan por índice
+        conn.execute(text("SET enable_seqscan = off"))
+        for sql, expected in TOP_QUERIES:
+            plan = '\n'.join(row[0] for row in conn.execute(text(f"EXPLAIN {sql}"), PARAMS))
+            assert _plan_uses(plan, expected), f"{sql}\n{plan}"
+            assert 'Seq Scan' not in plan, plan
+        conn.rollback()
+    engine.dispose()
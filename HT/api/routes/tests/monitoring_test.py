@@ -0,0 +1,59 @@
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from monitoring import MetricsSampler, prometheus_text
+
+
+def make_sampler(history=3, uri="sqlite://"):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    db = SQLAlchemy(app)
+    return MetricsSampler(app, db, history=history)
+
+
+def test_samples_go_into_bounded_ring_buffer():
+    sampler = make_sampler(history=3)
+    for _ in range(5):
+        sampler.sample()
+    history = sampler.history()
+    assert len(history) == 3
+    assert history[-1] is sampler._samples[-1]
+    assert [p['timestamp'] for p in sampler.series(2)] == [s['timestamp'] for s in history[-2:]]
+
+
+def test_sample_checks_database_and_host():
+    sample = make_sampler().sample()
+    assert sample['database']['status'] == 'connected'
+    assert sample['database']['latency_ms'] >= 0
+    assert 0 <= sample['host']['memory_percent'] <= 100
+    assert sample['process']['rss_mb'] > 0
+    assert 'fanout_pending' in sample['sockets']
+
+
+def test_unreachable_database_is_reported():
+    sample = make_sampler(uri="sqlite:////nonexistent/dir/aethos.db").sample()
+    assert sample['database']['status'] == 'error'
+    assert sample['database']['up'] is False
+
+
+def test_prometheus_text_groups_families_and_labels_hosts():
+    sample = {
+        'timestamp': 1.5,
+        'host': {'cpu_percent': 12.5, 'status': 'ignored'},
+        'database': {'up': True, 'latency_ms': 0.8},
+        'outbound': {
+            'newsapi.org': {'requests': 3, 'failures': 0},
+            'api.x.com': {'requests': 1, 'failures': 1}
+        }
+    }
+    lines = prometheus_text(sample).splitlines()
+    assert 'aethos_host_cpu_percent 12.5' in lines
+    assert 'aethos_database_up 1' in lines
+    assert not any('status' in line for line in lines)
+
+    families = [line.split('{')[0].split(' ')[0] for line in lines if not line.startswith('#')]
+    # Las líneas de cada métrica son contiguas
+    assert families.index('aethos_outbound_failures') > max(
+        i for i, name in enumerate(families) if name == 'aethos_outbound_requests')
+    assert 'aethos_outbound_requests{host="api.x.com"} 1' in lines
+    assert lines.count('# TYPE aethos_outbound_requests gauge') == 1
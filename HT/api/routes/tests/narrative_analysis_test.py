@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from core.embedding_store import _normalize
+from integrations.huggingface import analyze_narrative, analyze_narratives, narrative_embeddings
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEXTS = [
+    "Quiero abrir caminos nuevos en mi trabajo y sanar la relación con mi familia.",
+    "¿Cómo transformar el miedo en creatividad? ¡Necesito claridad!",
+    "Energía, abundancia y prosperidad. Meditación diaria. Gratitud.",
+    "",
+    "amor amor amor CONEXIÓN profunda con la naturaleza",
+]
+
+
+def test_batch_analysis_matches_single_analysis():
+    batch = analyze_narratives(TEXTS)
+    for i, text in enumerate(TEXTS):
+        single = analyze_narrative(text)
+        assert batch["keywords"][i] == single["keywords"]
+        assert batch["cluster"][i] == single["cluster"]
+        assert batch["semantic_depth"][i] == pytest.approx(single["semantic_depth"])
+        assert batch["resonance_score"][i] == pytest.approx(single["resonance_score"])
+        assert np.array_equal(batch["embeddings"][i], np.asarray(single["embedding"], dtype=np.float32))
+
+
+def test_embeddings_are_deterministic_and_independent_of_the_batch():
+    first = narrative_embeddings(TEXTS)
+    assert first.shape == (len(TEXTS), 128) and first.dtype == np.float32
+    assert np.array_equal(first, narrative_embeddings(TEXTS))
+    assert np.array_equal(first[2], narrative_embeddings([TEXTS[2]])[0])
+    assert not np.array_equal(first[0], first[1])
+
+    # Misma semilla en cualquier proceso (no depende de PYTHONHASHSEED)
+    script = ("import sys; sys.path.insert(0, %r); from integrations.huggingface import narrative_embeddings; "
+              "print(narrative_embeddings([%r])[0][:4].tolist())") % (API_DIR, TEXTS[0])
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                         env={**os.environ, "PYTHONHASHSEED": "123"}).stdout
+    assert json.loads(out.strip().splitlines()[-1]) == pytest.approx(first[0][:4].tolist())
+
+
+def test_embeddings_are_standard_normal_and_normalize_to_unit_length():
+    vectors = narrative_embeddings([f"intención {i}" for i in range(500)])
+    assert np.isfinite(vectors).all()
+    assert abs(vectors.mean()) < 0.02
+    assert vectors.std() == pytest.approx(1.0, abs=0.02)
+    assert np.linalg.norm(_normalize(vectors), axis=1) == pytest.approx(np.ones(500), abs=1e-5)
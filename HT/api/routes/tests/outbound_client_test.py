@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from integrations.http_client import OutboundClient, OutboundSaturated, OutboundTimeout
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que el cliente pueda reutilizar la conexión (keep-alive)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.hits[self.path.split("?")[0]] = stub.hits.get(self.path.split("?")[0], 0) + 1
+            stub.ports.add(self.client_address[1])
+            stub.active += 1
+            stub.peak = max(stub.peak, stub.active)
+        try:
+            if self.path.startswith("/flaky"):
+                # Falla las dos primeras veces
+                status = 503 if stub.hits["/flaky"] <= 2 else 200
+                self._reply(status, {"ok": status == 200})
+            elif self.path.startswith("/slow"):
+                time.sleep(0.3)
+                self._reply(200, {"ok": True})
+            elif self.path.startswith("/v2/top-headlines"):
+                self._reply(200, {"articles": [{"title": "Marea colectiva", "description": "resonancia"}]})
+            else:
+                self._reply(200, {"ok": True})
+        finally:
+            with stub.lock:
+                stub.active -= 1
+
+
+@pytest.fixture()
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    server.stub = type("Stub", (), {})()
+    server.stub.lock = threading.Lock()
+    server.stub.hits = {}
+    server.stub.ports = set()
+    server.stub.active = 0
+    server.stub.peak = 0
+    server.stub.url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.stub.host = f"127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.stub
+    server.shutdown()
+    server.server_close()
+
+
+def test_keep_alive_reuses_connection(stub):
+    client = OutboundClient()
+    for _ in range(5):
+        assert client.get(f"{stub.url}/ok").status_code == 200
+    assert len(stub.ports) == 1
+    assert client.stats()[stub.host]["requests"] == 5
+
+
+def test_retries_on_503_within_budget(stub):
+    client = OutboundClient()
+    client.configure_host(stub.host, retries=2, backoff=0.01)
+    assert client.get(f"{stub.url}/flaky").status_code == 200
+    assert stub.hits["/flaky"] == 3
+    assert client.stats()[stub.host]["retries"] == 2
+
+
+def test_post_is_not_retried_by_default(stub):
+    client = OutboundClient()
+    client.configure_host(stub.host, retries=2, backoff=0.01)
+    # El stub no implementa POST -> 501; no se reintenta y se devuelve tal cual
+    assert client.post(f"{stub.url}/ok").status_code == 501
+    assert client.stats()[stub.host]["retries"] == 0
+
+
+def test_deadline_covers_the_whole_call(stub):
+    client = OutboundClient()
+    client.configure_host(stub.host, timeout=0.1, retries=3)
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get(f"{stub.url}/slow")
+    assert time.monotonic() - started < 0.5
+
+
+def test_semaphore_wait_counts_against_the_deadline(stub):
+    client = OutboundClient()
+    client.configure_host(stub.host, max_concurrency=1, retries=0)
+    worker = threading.Thread(target=client.get, args=(f"{stub.url}/slow",), kwargs={"timeout": 2})
+    worker.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    # ~0.25 s esperando el hueco: quedan ~0.2 s para una respuesta de 0.3 s
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get(f"{stub.url}/slow", timeout=0.45)
+    assert time.monotonic() - started < 0.55
+    worker.join()
+
+
+def test_per_host_concurrency_limit(stub):
+    client = OutboundClient()
+    client.configure_host(stub.host, max_concurrency=2, timeout=5)
+    threads = [threading.Thread(target=client.get, args=(f"{stub.url}/slow",)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert stub.peak <= 2
+    assert stub.hits["/slow"] == 6
+
+
+def test_saturated_host_fails_fast(stub):
+    client = OutboundClient()
+    client.configure_host(stub.host, max_concurrency=1, timeout=0.2, retries=0)
+    worker = threading.Thread(target=client.get, args=(f"{stub.url}/slow",), kwargs={"timeout": 2})
+    worker.start()
+    time.sleep(0.05)
+    with pytest.raises((OutboundSaturated, OutboundTimeout)):
+        client.get(f"{stub.url}/ok")
+    worker.join()
+    assert client.stats()[stub.host]["saturated"] == 1
+
+
+def test_async_requests_share_limits(stub):
+    client = OutboundClient()
+    client.configure_host(stub.host, max_concurrency=3, timeout=5)
+
+    async def run():
+        try:
+            responses = await asyncio.gather(*(client.aget(f"{stub.url}/slow") for _ in range(6)))
+        finally:
+            await client.aclose()
+        return responses
+
+    responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200] * 6
+    assert responses[0].json() == {"ok": True}
+    assert stub.peak <= 3
+
+
+def test_newsapi_against_stub(stub, monkeypatch):
+    from integrations import newsapi
+
+    monkeypatch.setattr(newsapi, "NEWSAPI_URL", f"{stub.url}/v2/top-headlines")
+    monkeypatch.setattr(newsapi, "NEWS_API_KEY", "stub-key")
+    assert newsapi.fetch_top_headlines()[0]["title"] == "Marea colectiva"
+    assert asyncio.run(newsapi.fetch_top_headlines_async())[0]["title"] == "Marea colectiva"
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+from core.resonance_cache import ResonanceSnapshotCache
+from integrations.http_client import outbound
+
+
+class _CountingEngine:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    async def fetch_global_resonance(self):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.delay)
+        return {"resonance_frequency": 432.0 + call, "degraded": False}
+
+
+class _FakeRedis:
+    """Subconjunto de redis.Redis usado por el cache (get / set con nx, ex)"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+
+def _cache(engine, **kwargs):
+    cache = ResonanceSnapshotCache(engine=engine, redis_url=None, **kwargs)
+    cache.start = lambda: None  # sin hilo periódico: el test controla los refrescos
+    return cache
+
+
+def test_requests_read_the_snapshot_from_memory():
+    engine = _CountingEngine()
+    cache = _cache(engine, interval=60, stale_after=120)
+    first = cache.get()
+    for _ in range(50):
+        assert cache.get()["resonance_frequency"] == first["resonance_frequency"]
+    assert engine.calls == 1
+    assert first["snapshot"]["stale"] is False
+
+
+def test_stale_snapshot_is_served_while_revalidating():
+    engine = _CountingEngine(delay=0.3)
+    cache = _cache(engine, interval=60, stale_after=120)
+    cache.get()
+    data, fetched_at = cache._snapshot
+    cache._snapshot = (data, fetched_at - 600)
+
+    started = time.monotonic()
+    stale = cache.get()
+    assert time.monotonic() - started < 0.1
+    assert stale["resonance_frequency"] == 433.0
+    assert stale["snapshot"]["stale"] is True
+
+    deadline = time.monotonic() + 2
+    while engine.calls < 2 or cache._refresh_lock.locked():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert cache.get()["resonance_frequency"] == 434.0
+
+
+def test_workers_share_one_upstream_fetch_through_redis():
+    shared = _FakeRedis()
+    engines = [_CountingEngine(), _CountingEngine()]
+    caches = []
+    for engine in engines:
+        cache = _cache(engine, interval=60, stale_after=120)
+        cache._redis = shared
+        caches.append(cache)
+
+    first = caches[0].get()
+    second = caches[1].get()
+    assert second["resonance_frequency"] == first["resonance_frequency"]
+    assert [e.calls for e in engines] == [1, 0]
+
+    # Ciclo de refresco del segundo worker: el lock sigue tomado, lee de Redis
+    caches[1]._snapshot = None
+    caches[1].refresh()
+    assert engines[1].calls == 0
+
+
+class _SessionEngine:
+    """Toma la sesión aiohttp compartida como lo haría una petición real"""
+
+    def __init__(self):
+        self.sessions = []
+
+    async def fetch_global_resonance(self):
+        session, _ = outbound._async_session(asyncio.get_running_loop(), outbound._state("resonance.test"))
+        self.sessions.append(session)
+        return {"resonance_frequency": 432.0, "degraded": False}
+
+
+def test_refreshes_reuse_one_session_until_stop():
+    engine = _SessionEngine()
+    cache = _cache(engine, interval=0, stale_after=120)
+    cache.refresh()
+    cache.refresh()
+    assert len(engine.sessions) == 2
+    assert len({id(session) for session in engine.sessions}) == 1
+    assert not engine.sessions[0].closed
+
+    cache.stop()
+    assert engine.sessions[0].closed
+    assert cache._loop is None
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from core import resonance
+from core.resonance import ExternalResonanceEngine
+from integrations import newsapi
+
+ARTICLES = [{"title": "Global progress brings hope", "description": "communities organise renewal"}]
+
+
+def _slow(seconds, value):
+    async def source(*args, **kwargs):
+        await asyncio.sleep(seconds)
+        return value
+    return source
+
+
+def test_sources_run_concurrently_and_single_news_call(monkeypatch):
+    calls = []
+
+    async def headlines(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.2)
+        return ARTICLES
+
+    monkeypatch.setattr(newsapi, "NEWS_API_KEY", "stub-key")
+    monkeypatch.setattr(newsapi, "fetch_top_headlines_async", headlines)
+    engine = ExternalResonanceEngine()
+    monkeypatch.setattr(engine, "_analyze_social_resonance", _slow(0.2, resonance.NEUTRAL_SOCIAL))
+    monkeypatch.setattr(engine, "_fetch_solar_data", _slow(0.2, {"activity": 0.5}))
+
+    started = time.monotonic()
+    data = asyncio.run(engine.fetch_global_resonance())
+    elapsed = time.monotonic() - started
+
+    # Tres fuentes de 0.2s en paralelo: muy por debajo de la suma (0.6s)
+    assert elapsed < 0.45
+    assert len(calls) == 1
+    assert data["degraded"] is False
+    assert all(meta["status"] == "ok" for meta in data["sources"].values())
+    assert "progress" in data["temporal_markers"]
+
+
+def test_slow_source_is_cut_at_its_deadline(monkeypatch):
+    monkeypatch.setattr(newsapi, "NEWS_API_KEY", "stub-key")
+    monkeypatch.setattr(newsapi, "fetch_top_headlines_async", _slow(5, ARTICLES))
+    engine = ExternalResonanceEngine()
+    engine.deadlines["news"] = 0.2
+
+    started = time.monotonic()
+    data = asyncio.run(engine.fetch_global_resonance())
+
+    assert time.monotonic() - started < 1.0
+    assert data["sources"]["news"]["status"] == "timeout"
+    assert data["sources"]["news"]["degraded"] is True
+    assert data["sources"]["social"]["degraded"] is False
+    assert data["degraded"] is True
+    assert data["temporal_markers"] == []
+    assert data["resonance_frequency"] > 0
+
+
+def test_missing_news_key_is_reported_without_request(monkeypatch):
+    async def headlines(**kwargs):
+        raise AssertionError("NewsAPI no debe llamarse sin clave")
+
+    monkeypatch.setattr(newsapi, "NEWS_API_KEY", "")
+    monkeypatch.setattr(newsapi, "fetch_top_headlines_async", headlines)
+    data = asyncio.run(ExternalResonanceEngine().fetch_global_resonance())
+    assert data["sources"]["news"]["status"] == "disabled"
@@ -0,0 +1,185 @@
+import msgpack
+from flask import Flask
+from flask_socketio import SocketIO
+
+from sockets import encoding, events
+from sockets.cluster_aggregator import ClusterAggregator
+from sockets.encoding import BinaryProtocol, DeltaChannel, compact
+from sockets.fanout import FanoutQueue
+
+
+def test_compact_uses_short_keys_and_epoch_ms():
+    frame = compact({"cluster": "AETHOS", "timestamp": "2025-01-01T00:00:01", "latest": [{"entropy": 0.2}]})
+    assert frame["c"] == "AETHOS"
+    assert isinstance(frame["ts"], int)
+    assert frame["l"] == [{"e": 0.2}]
+
+
+def test_delta_chain_sends_only_changes(monkeypatch):
+    monkeypatch.setattr(encoding, "SOCKET_KEYFRAME_EVERY", 3)
+    channel = DeltaChannel()
+    first = channel.frame({"cluster": "AETHOS", "count": 1, "insight": "x"}, "w1")
+    second = channel.frame({"cluster": "AETHOS", "count": 2}, "w1")
+    third = channel.frame({"cluster": "AETHOS", "count": 2}, "w1")
+    fourth = channel.frame({"cluster": "AETHOS", "count": 3}, "w1")
+
+    assert first == {"s": 1, "o": "w1", "k": 1, "d": {"c": "AETHOS", "n": 1, "in": "x"}}
+    assert second == {"s": 2, "o": "w1", "d": {"n": 2}, "x": ["in"]}
+    assert third == {"s": 3, "o": "w1", "d": {}}
+    assert fourth["k"] == 1 and fourth["d"] == {"c": "AETHOS", "n": 3}
+
+
+def test_binary_clients_get_msgpack_json_clients_unchanged(monkeypatch):
+    protocol = BinaryProtocol()
+    fanout = FanoutQueue()
+    aggregator = ClusterAggregator(fanout=fanout)
+    monkeypatch.setattr(encoding, "_protocol", protocol)
+    monkeypatch.setattr("sockets.fanout.get_protocol", lambda: protocol)
+    monkeypatch.setattr(events, "get_protocol", lambda: protocol)
+    monkeypatch.setattr(events, "get_fanout", lambda: fanout)
+    monkeypatch.setattr(events, "publish", fanout.publish)
+    monkeypatch.setattr(events, "get_cluster_aggregator", lambda: aggregator)
+    monkeypatch.setattr(fanout, "bind", lambda server: setattr(fanout, "socketio", server))
+    monkeypatch.setattr(aggregator, "bind", lambda server: None)
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="threading")
+    events.register_socket_events(socketio)
+
+    binary = socketio.test_client(app, auth={"encoding": "msgpack"})
+    plain = socketio.test_client(app)
+    hello = binary.get_received()[0]
+    assert hello["name"] == "connection_established"
+    assert msgpack.unpackb(hello["args"][0])["d"]["enc"] == "msgpack"
+    assert plain.get_received()[0]["args"][0]["encoding"] == "json"
+
+    for client in (binary, plain):
+        client.emit("join_resonance_cluster", {"cluster": "AETHOS", "user_id": 1})
+    aggregator.add("AETHOS", {"entropy": 0.2, "alignment": 0.8})
+    aggregator.flush()
+    fanout.drain()
+
+    def updates(client):
+        return [m["args"][0] for m in client.get_received() if m["name"] == "resonance_update"]
+
+    [frame] = updates(binary)
+    decoded = msgpack.unpackb(frame)
+    assert decoded["k"] == 1 and decoded["d"]["n"] == 1
+    assert updates(plain)[0]["count"] == 1
+
+    binary.emit("resync", {"cluster": "AETHOS"})
+    assert msgpack.unpackb(updates(binary)[0])["s"] == decoded["s"]
+
+
+def test_join_and_lagging_acks_force_keyframes():
+    protocol = BinaryProtocol()
+    for sid in ("a", "b"):
+        protocol.negotiate(sid, {"encoding": "msgpack"})
+    assert protocol.join("a", "AETHOS") == "AETHOS:bin"
+
+    def frame(n):
+        return msgpack.unpackb(protocol.encode_for_room("resonance_update", {"count": n}, "AETHOS"))
+
+    assert frame(1)["k"] == 1
+    protocol.ack("a", "resonance_update", "AETHOS", 1)
+    assert "k" not in frame(2)
+
+    # Un cliente nuevo no tiene el estado anterior: el siguiente frame va completo
+    protocol.join("b", "AETHOS")
+    assert frame(3)["k"] == 1
+    protocol.ack("a", "resonance_update", "AETHOS", 3)
+    protocol.ack("b", "resonance_update", "AETHOS", 3)
+    assert "k" not in frame(4)
+
+    # 'b' se queda en el 3: el delta contra el 5 ya no le sirve
+    protocol.ack("a", "resonance_update", "AETHOS", 4)
+    assert "k" not in frame(5)
+    assert frame(6)["k"] == 1
+
+    # Los acks de la cadena de otro worker no cuentan
+    assert protocol.ack("b", "resonance_update", "AETHOS", 1, origin="otro") is False
+    assert protocol._sessions["b"]["AETHOS/resonance_update"] == 3
+
+
+def test_idle_channels_are_evicted(monkeypatch):
+    protocol = BinaryProtocol()
+    protocol.encode_for_room("manifest_narration", {"status": "done"}, "user:1")
+    assert protocol.stats()["channels"] == 1
+
+    monkeypatch.setattr(encoding, "SOCKET_CHANNEL_IDLE_S", 0.01)
+    protocol._evicted_at -= 1
+    protocol._channels[("user:1", "manifest_narration")].used_at -= 1
+    protocol.encode_for_room("manifest_narration", {"status": "done"}, "user:2")
+    assert set(protocol._channels) == {("user:2", "manifest_narration")}
+    assert protocol.stats()["channels_evicted"] == 1
+
+
+def test_binary_rooms_of_other_workers_are_shared():
+    class _Shared:
+        def __init__(self):
+            self.announced = []
+
+        def refresh(self, local_rooms):
+            self.announced.append(sorted(local_rooms))
+            return {"REMOTO"}
+
+    shared = _Shared()
+    protocol = BinaryProtocol(shared)
+    protocol.negotiate("a", {"encoding": "msgpack"})
+    protocol.join("a", "LOCAL")
+    assert protocol.has_binary_clients("LOCAL")
+    assert protocol.has_binary_clients("REMOTO")
+    assert not protocol.has_binary_clients("VACIO")
+    assert shared.announced == [["LOCAL"]]
+
+    protocol.forget("a")
+    assert protocol.stats()["binary_rooms"] == 0
+
+
+def test_ack_ignores_malformed_seq(monkeypatch):
+    protocol = BinaryProtocol()
+    monkeypatch.setattr(events, "get_protocol", lambda: protocol)
+    monkeypatch.setattr(events, "get_fanout", lambda: FanoutQueue())
+    monkeypatch.setattr(events, "get_cluster_aggregator", lambda: ClusterAggregator(fanout=FanoutQueue()))
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="threading")
+    monkeypatch.setattr(FanoutQueue, "bind", lambda self, server: None)
+    monkeypatch.setattr(ClusterAggregator, "bind", lambda self, server: None)
+    events.register_socket_events(socketio)
+
+    client = socketio.test_client(app, auth={"encoding": "msgpack"})
+    client.get_received()
+    for data in ({"seq": "abc"}, {"seq": None}, {}, "7"):
+        client.emit("ack", data)
+    assert client.is_connected()
+    assert client.get_received() == []
+
+
+def test_resync_respects_the_negotiated_encoding(monkeypatch):
+    protocol = BinaryProtocol()
+    monkeypatch.setattr(events, "get_protocol", lambda: protocol)
+    monkeypatch.setattr(events, "get_fanout", lambda: FanoutQueue())
+    monkeypatch.setattr(events, "get_cluster_aggregator", lambda: ClusterAggregator(fanout=FanoutQueue()))
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="threading")
+    monkeypatch.setattr(FanoutQueue, "bind", lambda self, server: None)
+    monkeypatch.setattr(ClusterAggregator, "bind", lambda self, server: None)
+    events.register_socket_events(socketio)
+
+    binary = socketio.test_client(app, auth={"encoding": "msgpack"})
+    plain = socketio.test_client(app)
+    binary.get_received()
+    plain.get_received()
+
+    plain.emit("resync", {"cluster": "AETHOS"})
+    assert plain.get_received() == []                # sin cadena en este worker: nada que reenviar
+
+    payload = {"type": "manifestation_batch", "cluster": "AETHOS", "count": 2}
+    protocol.encode_for_room("resonance_update", payload, "AETHOS")
+    plain.emit("resync", {"cluster": "AETHOS"})
+    binary.emit("resync", {"cluster": "AETHOS"})
+    assert plain.get_received()[0]["args"][0] == payload
+    frame = msgpack.unpackb(binary.get_received()[0]["args"][0])
+    assert frame["k"] == 1 and frame["d"]["n"] == 2
@@ -0,0 +1,107 @@
+from flask import Flask
+from flask_socketio import SocketIO
+
+from sockets import events
+from sockets.cluster_aggregator import ClusterAggregator
+from sockets.encoding import BinaryProtocol
+from sockets.fanout import FanoutQueue
+
+
+class _RecordingSocketIO:
+    def __init__(self):
+        self.emitted = []
+        self.binary = []
+
+    def start_background_task(self, target):
+        return None
+
+    def emit(self, event, payload, to=None, namespace=None):
+        # Variante msgpack para '<room>:bin' (sockets.encoding) aparte
+        target = self.binary if isinstance(payload, bytes) else self.emitted
+        target.append((event, to, payload))
+
+
+def test_publish_is_deferred_to_the_drain_task(monkeypatch):
+    protocol = BinaryProtocol()
+    monkeypatch.setattr("sockets.fanout.get_protocol", lambda: protocol)
+    protocol.negotiate("sid-bin", {"encoding": "msgpack"})
+    protocol.join("sid-bin", "AETHOS")
+    fanout = FanoutQueue(maxsize=10)
+    server = _RecordingSocketIO()
+    fanout.bind(server)
+
+    fanout.publish("resonance_update", {"n": 1}, room="AETHOS")
+    assert server.emitted == []
+    assert fanout.drain() == 1
+    assert server.emitted == [("resonance_update", "AETHOS", {"n": 1})]
+    assert [(event, room) for event, room, _ in server.binary] == [("resonance_update", "AETHOS:bin")]
+
+
+def test_rooms_without_binary_clients_skip_the_binary_variant(monkeypatch):
+    protocol = BinaryProtocol()
+    monkeypatch.setattr("sockets.fanout.get_protocol", lambda: protocol)
+    fanout = FanoutQueue(maxsize=10)
+    server = _RecordingSocketIO()
+    fanout.bind(server)
+
+    fanout.publish("manifest_narration", {"n": 1}, room="user:7")
+    fanout.drain()
+    assert server.emitted == [("manifest_narration", "user:7", {"n": 1})]
+    assert server.binary == []
+    assert fanout.stats()["binary_skipped"] == 1
+    assert protocol.stats()["channels"] == 0
+
+
+def test_full_queue_drops_oldest():
+    fanout = FanoutQueue(maxsize=3)
+    fanout.bind(_RecordingSocketIO())
+    for n in range(5):
+        fanout.publish("resonance_update", {"n": n}, room="AETHOS")
+    assert fanout.stats()["dropped"] == 2
+    fanout.drain()
+    assert [payload["n"] for _, _, payload in fanout.socketio.emitted] == [2, 3, 4]
+
+
+def test_cluster_members_receive_manifestation_broadcast(monkeypatch):
+    fanout = FanoutQueue()
+    monkeypatch.setattr(events, "get_fanout", lambda: fanout)
+    monkeypatch.setattr(events, "publish", fanout.publish)
+    aggregator = ClusterAggregator(fanout=fanout)
+    monkeypatch.setattr(aggregator, "bind", lambda server: None)
+    monkeypatch.setattr(events, "get_cluster_aggregator", lambda: aggregator)
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="threading")
+    monkeypatch.setattr(fanout, "bind", lambda server: setattr(fanout, "socketio", server))
+    events.register_socket_events(socketio)
+
+    member = socketio.test_client(app)
+    outsider = socketio.test_client(app)
+    member.emit("join_resonance_cluster", {"cluster": "VÍNCULO", "user_id": 1})
+    outsider.emit("manifestation_event", {"cluster": "VÍNCULO", "manifestation": {"entropy": 0.3}})
+    aggregator.flush()
+    fanout.drain()
+
+    received = [m for m in member.get_received() if m["name"] == "resonance_update"]
+    assert len(received) == 1
+    assert received[0]["args"][0]["latest"] == [{"entropy": 0.3}]
+    assert not [m for m in outsider.get_received() if m["name"] == "resonance_update"]
+
+
+def test_manifestation_without_cluster_is_dropped(monkeypatch):
+    fanout = FanoutQueue()
+    aggregator = ClusterAggregator(fanout=fanout)
+    monkeypatch.setattr(aggregator, "bind", lambda server: None)
+    monkeypatch.setattr(events, "get_cluster_aggregator", lambda: aggregator)
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="threading")
+    monkeypatch.setattr(FanoutQueue, "bind", lambda self, server: None)
+    events.register_socket_events(socketio)
+
+    client = socketio.test_client(app)
+    for data in ({"manifestation": {"entropy": 0.3}}, {"cluster": None}, {"cluster": "  "}, {"cluster": 7}, "AETHOS"):
+        client.emit("manifestation_event", data)
+    assert client.is_connected()
+    assert aggregator.events_in == 0
+    assert aggregator.flush() == 0
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from flask import Flask
+
+from core.card_deck import get_card_deck
+from core.spreads import draw_batch, draw_spread, make_rng, parse_seed, simulate, spread_size
+from models import db, Card
+from routes.tarot import tarot_bp
+
+
+def test_batch_rows_are_distinct_and_reproducible():
+    indices, inverted = draw_batch(22, 5, 1000, make_rng(123))
+    assert indices.shape == inverted.shape == (1000, 5)
+    assert all(len(set(row)) == 5 for row in indices.tolist())
+    assert indices.min() >= 0 and indices.max() < 22
+
+    again, inverted_again = draw_batch(22, 5, 1000, make_rng(123))
+    assert np.array_equal(indices, again) and np.array_equal(inverted, inverted_again)
+    other, _ = draw_batch(22, 5, 1000, make_rng(124))
+    assert not np.array_equal(indices, other)
+
+
+def test_full_spread_is_a_permutation_and_single_matches_batch():
+    indices, _ = draw_batch(22, 22, 50, make_rng(9))
+    assert (np.sort(indices, axis=1) == np.arange(22)).all()
+
+    cards, inverted, seed = draw_spread(22, 'cross', seed=77)
+    batch_cards, batch_inverted = draw_batch(22, spread_size('cross', 22), 1, make_rng(77))
+    assert seed == 77
+    assert cards == batch_cards[0].tolist() and inverted == batch_inverted[0].tolist()
+    assert draw_spread(22, 'cross')[2] < 2 ** 53
+
+
+def test_simulation_is_uniform():
+    result = simulate(22, 'triple', 200000, seed=5, costs=np.arange(22), chunk=30000)
+    frequency = result['frequency']
+    assert frequency.shape == (3, 22) and frequency.sum() == 600000
+    assert np.allclose(frequency / 200000, 1 / 22, atol=0.004)
+    assert abs(result['inversion_rate'] - 0.5) < 0.005
+    assert abs(result['activation_cost']['mean'] - 3 * 10.5) < 0.2
+
+
+def test_parse_seed():
+    assert parse_seed(None) is None and parse_seed('42') == 42
+    for bad in (-1, 2 ** 64, True, 'abc'):
+        with pytest.raises(ValueError):
+            parse_seed(bad)
+
+
+@pytest.fixture()
+def client():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    app.register_blueprint(tarot_bp, url_prefix="/api")
+    with app.app_context():
+        db.create_all()
+        for i in range(1, 23):
+            db.session.add(Card(id=i, title=f"Arcano {i}", protocol="d", inverted_protocol="i"))
+        db.session.commit()
+    get_card_deck().invalidate()
+    yield app.test_client()
+
+
+def test_draw_with_seed_is_reproducible(client):
+    first = client.post('/api/draw', json={'mode': 'cross', 'seed': 2024}).get_json()
+    second = client.post('/api/draw', json={'mode': 'cross', 'seed': 2024}).get_json()
+    assert first['seed'] == 2024
+    assert first['cards'] == second['cards']
+
+    unseeded = client.post('/api/draw', json={'mode': 'cross'}).get_json()
+    replay = client.post('/api/draw', json={'mode': 'cross', 'seed': unseeded['seed']}).get_json()
+    assert replay['cards'] == unseeded['cards']
+
+    manual = client.post('/api/draw', json={'manual_cards': [3, 1], 'seed': 8}).get_json()
+    assert [c['id'] for c in manual['cards']] == [3, 1]
+    assert manual['cards'] == client.post('/api/draw', json={'manual_cards': [3, 1], 'seed': 8}).get_json()['cards']
+
+    assert client.post('/api/draw', json={'seed': 'x'}).status_code == 400
@@ -0,0 +1,69 @@
+import random
+import time
+
+import pytest
+from flask import Flask
+
+import instrumentation
+from instrumentation import LatencyHistogram, record_timing, server_timing_header, span
+
+
+@pytest.fixture
+def registry():
+    instrumentation.get_perf_registry().reset()
+    yield instrumentation.get_perf_registry()
+    instrumentation.get_perf_registry().reset()
+
+
+def make_app():
+    app = Flask(__name__)
+    instrumentation.init_tracing(app)
+
+    @app.route('/work/<int:n>')
+    def work(n):
+        with span('test.first'):
+            time.sleep(0.01)
+        with span('test.second'):
+            pass
+        record_timing('outbound', 'outbound.127.0.0.1:9', 0.002)
+        return {'n': n}
+
+    return app
+
+
+def test_histogram_percentiles_are_close_to_exact():
+    histogram = LatencyHistogram()
+    values = sorted(random.Random(7).expovariate(1 / 20) for _ in range(20000))
+    for value in values:
+        histogram.observe(value)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values))]
+        assert histogram.quantile(q) == pytest.approx(exact, rel=0.1)
+    assert histogram.summary()['count'] == 20000
+
+
+def test_server_timing_header_and_route_histogram(registry):
+    client = make_app().test_client()
+    for n in range(3):
+        response = client.get(f'/work/{n}')
+
+    header = response.headers['Server-Timing']
+    names = [part.split(';')[0] for part in header.split(', ')]
+    assert names == ['test.first', 'test.second', 'outbound.127.0.0.1_9', 'total']
+
+    snapshot = registry.snapshot()
+    assert snapshot['route']['GET /work/<int:n>']['count'] == 3
+    assert snapshot['stage']['test.first']['p50_ms'] >= 9
+    assert snapshot['outbound']['outbound.127.0.0.1:9']['count'] == 3
+
+
+def test_repeated_spans_are_summed_in_header():
+    assert server_timing_header([('db', 1.0), ('db', 2.5)], total_ms=5) == 'db;dur=3.50, total;dur=5.00'
+
+
+def test_disabled_tracing_is_a_noop(registry, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'TRACING_ENABLED', False)
+    assert span('a') is span('b')
+    response = make_app().test_client().get('/work/1')
+    assert 'Server-Timing' not in response.headers
+    assert registry.snapshot() == {}
@@ -0,0 +1,160 @@
+# api/sockets/cluster_aggregator.py
+"""Agregador de manifestaciones por clúster con emisión por ticks.
+
+En lugar de un resonance_update por manifestación (O(eventos × miembros)
+escrituras de socket), cada evento se pliega en un delta del clúster:
+conteo, medias de entropía/alineamiento y las últimas N manifestaciones.
+Cada CLUSTER_TICK_MS se emite como mucho un frame por room, y el impacto
+colectivo se calcula una vez por frame.
+
+Backpressure: si el frame anterior de un clúster sigue en la cola de fan-out
+local (sockets.fanout), el delta no se emite y sigue acumulando hasta el
+siguiente tick, así que nunca hay más de un frame pendiente por room en este
+proceso. Solo se ve esa cola: con message queue (Redis) un frame sale de ella
+en cuanto se publica, y los clientes lentos de otros workers o un Redis
+saturado no frenan la emisión; ahí el único límite es un frame por tick.
+"""
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+from sockets.fanout import get_fanout
+
+CLUSTER_TICK_MS = float(os.getenv('CLUSTER_TICK_MS', '250'))
+CLUSTER_LATEST_ITEMS = int(os.getenv('CLUSTER_LATEST_ITEMS', '5'))
+# Conteo por tick a partir del cual el factor de actividad satura
+CLUSTER_IMPACT_SATURATION = int(os.getenv('CLUSTER_IMPACT_SATURATION', '50'))
+
+
+class ClusterDelta:
+    """Acumulado de un clúster entre dos ticks"""
+
+    __slots__ = ('count', 'measured', 'entropy_sum', 'alignment_sum', 'latest')
+
+    def __init__(self, latest_items):
+        self.count = 0
+        self.measured = 0
+        self.entropy_sum = 0.0
+        self.alignment_sum = 0.0
+        self.latest = deque(maxlen=latest_items)
+
+    def add(self, manifestation):
+        self.count += 1
+        entropy = manifestation.get('entropy')
+        alignment = manifestation.get('alignment')
+        if entropy is not None and alignment is not None:
+            self.measured += 1
+            self.entropy_sum += float(entropy)
+            self.alignment_sum += float(alignment)
+        self.latest.appendleft(manifestation)
+
+    @property
+    def mean_entropy(self):
+        return self.entropy_sum / self.measured if self.measured else None
+
+    @property
+    def mean_alignment(self):
+        return self.alignment_sum / self.measured if self.measured else None
+
+
+def calculate_collective_impact(delta):
+    """Impacto colectivo del tick: coherencia media (alineamiento × orden) por actividad"""
+    if not delta.measured:
+        return 0.5
+    coherence = delta.mean_alignment * (1 - delta.mean_entropy)
+    activity = math.log1p(delta.count) / math.log1p(CLUSTER_IMPACT_SATURATION)
+    return round(max(0.0, min(1.0, coherence * min(1.0, activity))), 4)
+
+
+class ClusterAggregator:
+    def __init__(self, tick_ms=CLUSTER_TICK_MS, latest_items=CLUSTER_LATEST_ITEMS, fanout=None):
+        self.tick = tick_ms / 1000.0
+        self.latest_items = latest_items
+        self.fanout = fanout or get_fanout()
+        self._deltas = {}
+        self._lock = threading.Lock()
+        self._task = None
+        self.events_in = 0
+        self.frames_out = 0
+        self.deferred = 0
+
+    def add(self, cluster, manifestation):
+        """Pliega una manifestación en el delta del clúster (O(1), no emite)"""
+        with self._lock:
+            delta = self._deltas.get(cluster)
+            if delta is None:
+                delta = self._deltas[cluster] = ClusterDelta(self.latest_items)
+            delta.add(manifestation)
+            self.events_in += 1
+
+    def flush(self):
+        """Emite un frame por clúster con actividad; devuelve cuántos salieron"""
+        with self._lock:
+            ready = {}
+            for cluster, delta in self._deltas.items():
+                if self.fanout.is_pending(self._key(cluster)):
+                    self.deferred += 1
+                else:
+                    ready[cluster] = delta
+            for cluster in ready:
+                del self._deltas[cluster]
+
+        timestamp = datetime.now().isoformat()
+        for cluster, delta in ready.items():
+            self.fanout.publish('resonance_update', self.frame(cluster, delta, timestamp),
+                                room=cluster, key=self._key(cluster))
+        self.frames_out += len(ready)
+        return len(ready)
+
+    @staticmethod
+    def frame(cluster, delta, timestamp):
+        return {
+            'type': 'manifestation_batch',
+            'cluster': cluster,
+            'count': delta.count,
+            'mean_entropy': delta.mean_entropy,
+            'mean_alignment': delta.mean_alignment,
+            'latest': list(delta.latest),
+            'collective_impact': calculate_collective_impact(delta),
+            'timestamp': timestamp
+        }
+
+    @staticmethod
+    def _key(cluster):
+        return f"resonance_update:{cluster}"
+
+    def bind(self, socketio):
+        """Arranca el tick en una tarea de fondo del servidor Socket.IO (una vez)"""
+        with self._lock:
+            if self._task is None:
+                self._task = socketio.start_background_task(self._run, socketio)
+
+    def _run(self, socketio):
+        while True:
+            socketio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Cluster aggregator flush failed: {e}")
+
+    def stats(self):
+        return {
+            'events_in': self.events_in,
+            'frames_out': self.frames_out,
+            'deferred_ticks': self.deferred,
+            'buffered_clusters': len(self._deltas),
+            'tick_ms': self.tick * 1000
+        }
+
+
+_aggregator = None
+
+
+def get_cluster_aggregator():
+    """Agregador compartido del proceso"""
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = ClusterAggregator()
+    return _aggregator
@@ -0,0 +1,348 @@
+# api/sockets/encoding.py
+"""Protocolo binario opcional para los eventos de socket (msgpack + deltas).
+
+Se negocia en 'connect': un cliente que envía auth={'encoding': 'msgpack'}
+recibe todos los eventos como bytes msgpack en lugar de JSON. Para los
+broadcasts, esos clientes se unen a '<room>:bin' y la cola de fan-out emite
+una sola variante binaria por room además de la JSON habitual.
+
+Formato de frame binario:
+  {'s': seq, 'o': origen, 'd': {campos cambiados}, 'x': [campos eliminados]}
+  {'s': seq, 'o': origen, 'k': 1, 'd': {estado completo}}   (keyframe)
+
+- Claves cortas (KEY_MAP) y timestamps como enteros epoch-ms.
+- 'd' solo lleva lo que cambió respecto al frame anterior del mismo canal
+  (room + evento); el cliente lo aplica sobre su estado.
+- 'o' identifica al worker que emite: con varios workers (Redis) cada uno
+  mantiene su propia cadena de deltas, el cliente guarda estado por origen.
+- Si el cliente detecta un hueco en 's' emite 'resync' y recibe un keyframe
+  (un cliente JSON que lo pida recibe el último payload completo, si lo hay);
+  cada SOCKET_KEYFRAME_EVERY frames se emite un keyframe de todos modos.
+  'ack' informa del último seq aplicado. El delta solo es válido para quien
+  tiene el frame anterior: si el ack más bajo de los clientes binarios del
+  room (en este worker) va más de un frame por detrás, o alguien acaba de
+  unirse, el siguiente frame del canal es un keyframe. Un cliente muy
+  rezagado (SOCKET_ACK_LAG_RESYNC) recibe además un keyframe directo.
+
+La variante binaria solo se codifica y emite para rooms con clientes
+binarios: los de este worker y, con REDIS_URL, los que anuncian los demás
+workers en un sorted set (room -> expiración, renovado cada
+SOCKET_ROOM_REFRESH_S y podado al leer). Los canales sin frames durante
+SOCKET_CHANNEL_IDLE_S se descartan (rooms 'user:<id>' de sesiones que ya se
+fueron); si el room vuelve, la cadena empieza de nuevo con un keyframe.
+
+Los clientes que no negocian nada siguen recibiendo el JSON de siempre.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional: sin él no se ofrece el modo binario
+    msgpack = None
+
+try:
+    import redis
+except ImportError:  # Redis es opcional: solo se ven los clientes binarios del worker
+    redis = None
+
+BINARY_ENCODING = 'msgpack'
+BINARY_ROOM_SUFFIX = ':bin'
+SOCKET_KEYFRAME_EVERY = int(os.getenv('SOCKET_KEYFRAME_EVERY', '50'))
+# Frames de retraso en los acks a partir de los cuales se envía un keyframe directo
+SOCKET_ACK_LAG_RESYNC = int(os.getenv('SOCKET_ACK_LAG_RESYNC', '20'))
+SOCKET_CHANNEL_IDLE_S = float(os.getenv('SOCKET_CHANNEL_IDLE_S', '600'))
+SOCKET_ROOM_REFRESH_S = float(os.getenv('SOCKET_ROOM_REFRESH_S', '5'))
+SOCKET_BINARY_ROOMS_KEY = os.getenv('SOCKET_BINARY_ROOMS_KEY', 'aethos:socket:binary_rooms')
+REDIS_URL = os.getenv('REDIS_URL')
+
+KEY_MAP = {
+    'type': 't',
+    'cluster': 'c',
+    'count': 'n',
+    'mean_entropy': 'me',
+    'mean_alignment': 'ma',
+    'latest': 'l',
+    'collective_impact': 'ci',
+    'timestamp': 'ts',
+    'user_id': 'uid',
+    'manifest_id': 'mid',
+    'entropy': 'e',
+    'alignment': 'a',
+    'progress': 'p',
+    'keywords': 'kw',
+    'user_count': 'uc',
+    'resonance_level': 'rl',
+    'resonance_factor': 'rf',
+    'insight': 'in',
+    'based_on_manifestations': 'bm',
+    'status': 'st',
+    'system': 'sys',
+    'encoding': 'enc',
+    'manifestation': 'm'
+}
+TIMESTAMP_KEYS = frozenset({'timestamp', 'created_at', 'fetched_at'})
+
+
+def epoch_ms(value):
+    """ISO-8601 (o datetime) -> entero epoch-ms; cualquier otra cosa se deja igual"""
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, str):
+        try:
+            return int(datetime.fromisoformat(value).timestamp() * 1000)
+        except ValueError:
+            return value
+    return value
+
+
+def compact(value):
+    """Claves cortas y timestamps epoch-ms, recursivo sobre dicts y listas"""
+    if isinstance(value, dict):
+        return {
+            KEY_MAP.get(k, k): epoch_ms(v) if k in TIMESTAMP_KEYS else compact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [compact(v) for v in value]
+    return value
+
+
+class DeltaChannel:
+    """Cadena de deltas de un canal (room + evento) en este worker"""
+
+    __slots__ = ('seq', 'state', 'payload', 'used_at', 'needs_keyframe')
+
+    def __init__(self):
+        self.seq = 0
+        self.state = None
+        self.payload = None              # último payload completo (resync de clientes JSON)
+        self.used_at = time.monotonic()
+        self.needs_keyframe = False
+
+    def frame(self, payload, origin, keyframe=False):
+        state = compact(payload)
+        if not isinstance(state, dict):
+            state = {'v': state}
+        self.seq += 1
+        self.used_at = time.monotonic()
+        self.payload = payload
+        previous = self.state
+        self.state = state
+        if keyframe or self.needs_keyframe or previous is None or self.seq % SOCKET_KEYFRAME_EVERY == 1:
+            self.needs_keyframe = False
+            return {'s': self.seq, 'o': origin, 'k': 1, 'd': state}
+        frame = {'s': self.seq, 'o': origin, 'd': {k: v for k, v in state.items() if previous.get(k) != v}}
+        removed = [k for k in previous if k not in state]
+        if removed:
+            frame['x'] = removed
+        return frame
+
+    def keyframe(self, origin):
+        return {'s': self.seq, 'o': origin, 'k': 1, 'd': self.state or {}}
+
+
+class SharedBinaryRooms:
+    """Rooms con clientes binarios en algún worker: sorted set room -> expiración (epoch)"""
+
+    def __init__(self, url=None, key=SOCKET_BINARY_ROOMS_KEY, ttl=SOCKET_ROOM_REFRESH_S * 3, client=None):
+        self.client = client or redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.key = key
+        self.ttl = ttl
+
+    def refresh(self, local_rooms):
+        """Anuncia los rooms de este worker y devuelve los vigentes de todos"""
+        now = time.time()
+        pipe = self.client.pipeline()
+        if local_rooms:
+            # GT: no acorta la expiración que haya puesto otro worker
+            pipe.zadd(self.key, {room: now + self.ttl for room in local_rooms}, gt=True)
+        pipe.zremrangebyscore(self.key, '-inf', now)
+        pipe.zrange(self.key, 0, -1)
+        rooms = pipe.execute()[-1]
+        return {room.decode() if isinstance(room, bytes) else room for room in rooms}
+
+
+class BinaryProtocol:
+    def __init__(self, shared=None):
+        self.origin = uuid.uuid4().hex[:8]
+        self._sessions = {}      # sid -> {room/evento: último seq confirmado}
+        self._rooms = {}         # room -> sids binarios de este worker
+        self._channels = {}      # (room, evento) -> DeltaChannel
+        self._lock = threading.Lock()
+        self.shared = shared
+        self._shared_rooms = set()
+        self._shared_at = 0.0
+        self._evicted_at = time.monotonic()
+        self.evicted = 0
+
+    @staticmethod
+    def available():
+        return msgpack is not None
+
+    # ------------------------------------------------------------ negociación
+    def negotiate(self, sid, auth):
+        """Registra la preferencia del cliente; devuelve la codificación acordada"""
+        requested = (auth or {}).get('encoding') if isinstance(auth, dict) else None
+        if requested == BINARY_ENCODING and self.available():
+            with self._lock:
+                self._sessions[sid] = {}
+            return BINARY_ENCODING
+        return 'json'
+
+    def is_binary(self, sid):
+        return sid in self._sessions
+
+    def forget(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+            for room in [room for room, sids in self._rooms.items() if sid in sids]:
+                self._leave(sid, room)
+
+    def room_for(self, sid, room):
+        """Room real al que se une el cliente según su codificación"""
+        return f"{room}{BINARY_ROOM_SUFFIX}" if self.is_binary(sid) else room
+
+    def join(self, sid, room):
+        """Registra la membresía de un cliente binario; devuelve el room real para join_room"""
+        with self._lock:
+            if sid in self._sessions:
+                self._rooms.setdefault(room, set()).add(sid)
+                # El recién llegado no tiene estado: el próximo frame de cada canal va completo
+                for (channel_room, _), channel in self._channels.items():
+                    if channel_room == room:
+                        channel.needs_keyframe = True
+        return self.room_for(sid, room)
+
+    def leave(self, sid, room):
+        with self._lock:
+            self._leave(sid, room)
+        return self.room_for(sid, room)
+
+    def _leave(self, sid, room):
+        sids = self._rooms.get(room)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._rooms[room]
+        acks = self._sessions.get(sid)
+        if acks:
+            for key in [key for key in acks if key.startswith(f"{room}/")]:
+                del acks[key]
+
+    def has_binary_clients(self, room):
+        """True si algún cliente binario (aquí o, con Redis, en otro worker) está en el room"""
+        if room in self._rooms:
+            return True
+        if self.shared is None:
+            return False
+        now = time.monotonic()
+        if now - self._shared_at >= SOCKET_ROOM_REFRESH_S:
+            self._shared_at = now
+            try:
+                self._shared_rooms = self.shared.refresh(list(self._rooms))
+            except Exception as e:
+                print(f"Socket binary rooms refresh failed: {e}")
+        return room in self._shared_rooms
+
+    # ---------------------------------------------------------- codificación
+    def encode(self, frame):
+        return msgpack.packb(frame, use_bin_type=True)
+
+    def encode_direct(self, payload):
+        """Mensaje directo a un cliente (sin cadena de deltas)"""
+        return self.encode({'k': 1, 'o': self.origin, 'd': compact(payload)})
+
+    def encode_for_room(self, event, payload, room):
+        with self._lock:
+            self._evict_idle()
+            channel = self._channels.get((room, event))
+            if channel is None:
+                channel = self._channels[(room, event)] = DeltaChannel()
+            lowest = self._lowest_ack(room, event)
+            frame = channel.frame(payload, self.origin, keyframe=lowest is not None and channel.seq - lowest > 1)
+        return self.encode(frame)
+
+    def _lowest_ack(self, room, event):
+        """Seq más bajo confirmado por los clientes binarios del room que han hecho ack"""
+        key = f"{room}/{event}"
+        acked = [self._sessions[sid][key] for sid in self._rooms.get(room, ())
+                 if key in self._sessions.get(sid, {})]
+        return min(acked) if acked else None
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        if now - self._evicted_at < min(SOCKET_CHANNEL_IDLE_S, 60):
+            return
+        self._evicted_at = now
+        idle = [key for key, channel in self._channels.items() if now - channel.used_at > SOCKET_CHANNEL_IDLE_S]
+        for key in idle:
+            del self._channels[key]
+        self.evicted += len(idle)
+
+    def keyframe(self, event, room):
+        with self._lock:
+            channel = self._channels.get((room, event))
+            frame = channel.keyframe(self.origin) if channel else {'s': 0, 'o': self.origin, 'k': 1, 'd': {}}
+        return self.encode(frame)
+
+    def last_payload(self, event, room):
+        """Último payload JSON del canal (None si este worker no tiene cadena para él)"""
+        with self._lock:
+            channel = self._channels.get((room, event))
+            return channel.payload if channel else None
+
+    def ack(self, sid, event, room, seq, origin=None):
+        """Registra el último seq aplicado; True si el cliente va tan atrasado que necesita keyframe.
+
+        Los acks de cadenas de otros workers ('o' distinto) no cuentan aquí.
+        """
+        with self._lock:
+            acks = self._sessions.get(sid)
+            channel = self._channels.get((room, event))
+            if acks is None or channel is None or (origin is not None and origin != self.origin):
+                return False
+            acks[f"{room}/{event}"] = seq
+            return channel.seq - seq >= SOCKET_ACK_LAG_RESYNC
+
+    def stats(self):
+        return {
+            'binary_sessions': len(self._sessions),
+            'binary_rooms': len(self._rooms),
+            'channels': len(self._channels),
+            'channels_evicted': self.evicted,
+            'origin': self.origin,
+            'available': self.available()
+        }
+
+
+def _shared_rooms():
+    if not (REDIS_URL and redis is not None):
+        return None
+    try:
+        return SharedBinaryRooms(REDIS_URL)
+    except Exception as e:
+        print(f"Socket binary rooms: Redis no disponible ({e}), solo clientes de este worker")
+        return None
+
+
+_protocol = BinaryProtocol(_shared_rooms())
+
+
+def get_protocol():
+    """Protocolo compartido del proceso"""
+    return _protocol
+
+
+def emit_to_client(event, payload):
+    """emit() al cliente de la petición actual en su codificación negociada"""
+    from flask import request
+    from flask_socketio import emit
+
+    if _protocol.is_binary(request.sid):
+        emit(event, _protocol.encode_direct(payload))
+    else:
+        emit(event, payload)
@@ -1,13 +1,32 @@
-﻿def register_socket_events(socketio):
+﻿from datetime import datetime
+from flask import request
+from flask_socketio import emit, join_room, leave_room
+from sockets.fanout import get_fanout, publish
+from sockets.cluster_aggregator import get_cluster_aggregator
+from core.cluster_state import get_cluster_state
+from sockets.encoding import emit_to_client, get_protocol
+from auth import ENVIRONMENT, verify_user_token
+
+def register_socket_events(socketio):
+    # Los broadcasts a clústeres salen por la cola de fan-out (tarea de fondo del servidor)
+    get_fanout().bind(socketio)
+    # Las manifestaciones se pliegan por clúster y salen en un frame por tick
+    get_cluster_aggregator().bind(socketio)
     
     @socketio.on('connect')
-    def handle_connect():
-        request = get_flask_request()
-        print(f"Client connected: {request.sid}")
-        get_emit()()('connection_established', {
+    def handle_connect(auth=None):
+        # auth={'encoding': 'msgpack'} activa el protocolo binario (sockets.encoding)
+        encoding = get_protocol().negotiate(request.sid, auth)
+        print(f"Client connected: {request.sid} ({encoding})")
+        # Canal personal 'user:<id>' (narraciones async de POST /manifest)
+        user_id = authenticated_user_id(auth)
+        if user_id is not None:
+            join_room(get_protocol().join(request.sid, f"user:{user_id}"))
+        emit_to_client('connection_established', {
             'status': 'connected',
             'timestamp': datetime.now().isoformat(),
-            'system': 'AETHOS_ACTIVE'
+            'system': 'AETHOS_ACTIVE',
+            'encoding': encoding
         })
     
     @socketio.on('join_resonance_cluster')
@@ -15,8 +34,9 @@
         cluster = data.get('cluster', 'global')
         user_id = data.get('user_id')
         
-        get_join_room()()(cluster)
-        get_emit()()('cluster_joined', {
+        join_room(get_protocol().join(request.sid, cluster))
+        get_cluster_state().join(cluster, request.sid)
+        publish('cluster_joined', {
             'cluster': cluster,
             'user_count': get_cluster_user_count(cluster),
             'resonance_level': get_cluster_resonance(cluster)
@@ -24,18 +44,24 @@
         
         print(f"User {user_id} joined cluster {cluster}")
     
+    @socketio.on('leave_resonance_cluster')
+    def handle_leave_cluster(data):
+        cluster = data.get('cluster', 'global')
+        leave_room(get_protocol().leave(request.sid, cluster))
+        get_cluster_state().leave(cluster, request.sid)
+    
     @socketio.on('manifestation_event')
     def handle_manifestation(data):
-        cluster = data.get('cluster')
+        if not isinstance(data, dict):
+            return
+        # Sin clúster válido el frame saldría con room=None (a todos los clientes)
+        cluster = cluster_name(data.get('cluster'))
+        if cluster is None:
+            return
         manifestation_data = data.get('manifestation', {})
         
-        # Emitir a todos en el clÃºster
-        get_emit()()('resonance_update', {
-            'type': 'manifestation',
-            'data': manifestation_data,
-            'timestamp': datetime.now().isoformat(),
-            'collective_impact': calculate_collective_impact(cluster)
-        }, room=cluster)
+        # Emitir a todos en el clÃºster (agregado en el siguiente tick)
+        get_cluster_aggregator().add(cluster, manifestation_data)
     
     @socketio.on('request_collective_insight')
     def handle_collective_insight(data):
@@ -46,20 +72,102 @@
         # Generar insight colectivo basado en manifestaciones del clÃºster
         collective_insight = generate_collective_insight(cluster, intention)
         
-        get_emit()()('collective_insight', {
+        emit_to_client('collective_insight', {
             'insight': collective_insight,
             'based_on_manifestations': get_recent_cluster_manifestations(cluster, 5),
             'resonance_factor': calculate_resonance_factor(intention, cluster)
         })
     
+    @socketio.on('resync')
+    def handle_resync(data):
+        if not isinstance(data, dict):
+            return
+        event = data.get('event', 'resonance_update')
+        cluster = data.get('cluster', 'global')
+        if get_protocol().is_binary(request.sid):
+            # El cliente binario detectó un hueco de seq: keyframe directo
+            emit(event, get_protocol().keyframe(event, cluster))
+            return
+        # Los clientes JSON no tienen cadena de deltas: el último payload completo, si lo hay
+        payload = get_protocol().last_payload(event, cluster)
+        if payload is not None:
+            emit(event, payload)
+    
+    @socketio.on('ack')
+    def handle_ack(data):
+        if not isinstance(data, dict):
+            return
+        try:
+            seq = int(data.get('seq'))
+        except (TypeError, ValueError):
+            return
+        event = data.get('event', 'resonance_update')
+        cluster = data.get('cluster', 'global')
+        if get_protocol().ack(request.sid, event, cluster, seq, origin=data.get('origin')):
+            emit(event, get_protocol().keyframe(event, cluster))
+    
     @socketio.on('disconnect')
     def handle_disconnect():
-        request = get_flask_request()
+        get_cluster_state().disconnect(request.sid)
+        get_protocol().forget(request.sid)
         print(f"Client disconnected: {request.sid}")
+
+def cluster_name(value):
+    """Nombre de clúster no vacío o None"""
+    return value if isinstance(value, str) and value.strip() else None
+
+def authenticated_user_id(auth):
+    """Id del usuario de auth={'token': <JWT>}; en desarrollo vale auth={'user_id': ...}"""
+    if not isinstance(auth, dict):
+        return None
+    token = auth.get('token')
+    if token:
+        try:
+            payload = verify_user_token(token)
+        except Exception as e:
+            print(f"Socket auth rejected: {e}")
+            return None
+        user = payload.get('user', payload)
+        return user.get('id') if isinstance(user, dict) else None
+    if ENVIRONMENT == 'development':
+        return auth.get('user_id')
+    return None
+
 def emit_resonance_update(cluster, data):
-    """Función helper para emitir actualizaciones de resonancia"""
+    """Función helper para emitir actualizaciones de resonancia.
+
+    Pliega la manifestación en el agregador del clúster: no bloquea la
+    petición HTTP y sale en el siguiente tick por la cola de fan-out (con la
+    message queue de Redis llega a los miembros en todos los workers).
+    """
+    cluster = cluster_name(cluster)
+    if cluster is None:
+        return
     try:
-        # Esta es una implementación básica
-        print(f"[RESONANCE] Cluster: {cluster}, Data: {data}")
+        get_cluster_aggregator().add(cluster, data)
     except Exception as e:
         print(f"Error emitting resonance update: {e}")
+
+# ==================== ESTADO DE CLÚSTER ====================
+# Lecturas O(1) del servicio de estado (core.cluster_state), compartido entre
+# workers cuando hay Redis.
+
+def get_cluster_user_count(cluster):
+    return get_cluster_state().member_count(cluster)
+
+def get_cluster_resonance(cluster):
+    return get_cluster_state().resonance(cluster)
+
+def get_recent_cluster_manifestations(cluster, limit):
+    return get_cluster_state().recent(cluster, limit)
+
+def calculate_resonance_factor(intention, cluster):
+    """Resonancia del clúster ponderada por afinidad con sus manifestaciones recientes"""
+    state = get_cluster_state()
+    words = {w.strip('.,;:!?').lower() for w in (intention or '').split() if len(w) > 4}
+    recent_keywords = {k for item in state.recent(cluster, 5) for k in item.get('keywords', [])}
+    affinity = len(words & recent_keywords) / len(words) if words else 0.0
+    return round(min(1.0, state.resonance(cluster) * (1 + affinity) / 1.5 + 0.1 * affinity), 4)
+
+def generate_collective_insight(cluster, intention):
+    return f"El clúster {cluster} sostiene la intención: {intention}"
@@ -0,0 +1,140 @@
+# api/sockets/fanout.py
+"""Cola de salida acotada para los emits de Socket.IO.
+
+Los handlers HTTP y de sockets no emiten directamente: encolan (evento,
+payload, room) y una tarea de fondo del servidor Socket.IO los drena. Con
+REDIS_URL, SocketIO usa Redis como message queue, así que un emit a un
+clúster llega a los sockets de ese room en todos los workers.
+
+Si la cola se llena se descarta el evento más antiguo (las actualizaciones
+de resonancia más recientes sustituyen a las viejas) y se cuenta en 'dropped'.
+Los productores pueden etiquetar un emit con 'key' y consultar is_pending(key)
+para no encolar otro frame mientras el anterior siga sin salir.
+
+Cada emit a un room con clientes binarios sale también, codificado una sola
+vez en msgpack con deltas (sockets.encoding), hacia '<room>:bin'; si el
+room no tiene ninguno no se codifica ni se emite ('binary_skipped').
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from sockets.encoding import BINARY_ROOM_SUFFIX, get_protocol
+
+SOCKET_FANOUT_QUEUE_SIZE = int(os.getenv('SOCKET_FANOUT_QUEUE_SIZE', '10000'))
+SOCKET_FANOUT_BATCH = int(os.getenv('SOCKET_FANOUT_BATCH', '256'))
+SOCKET_FANOUT_IDLE_MS = float(os.getenv('SOCKET_FANOUT_IDLE_MS', '5'))
+SOCKET_BINARY_ENABLED = os.getenv('SOCKET_BINARY_ENABLED', 'true').lower() == 'true'
+
+
+class FanoutQueue:
+    """Desacopla los emits del hilo de la petición"""
+
+    def __init__(self, maxsize=SOCKET_FANOUT_QUEUE_SIZE, batch=SOCKET_FANOUT_BATCH, idle_ms=SOCKET_FANOUT_IDLE_MS):
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+        self.batch = batch
+        self.idle = idle_ms / 1000.0
+        self.socketio = None
+        self._task = None
+        self._pending_keys = {}
+        self.enqueued = 0
+        self.emitted = 0
+        self.binary_emitted = 0
+        self.binary_skipped = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_lag = 0.0
+
+    def bind(self, socketio):
+        """Asocia el servidor Socket.IO y arranca la tarea de drenado (una vez)"""
+        with self._lock:
+            self.socketio = socketio
+            if self._task is None:
+                self._task = socketio.start_background_task(self._drain_forever)
+
+    def publish(self, event, payload, room=None, namespace=None, key=None):
+        """Encola un emit; nunca bloquea al llamador"""
+        with self._lock:
+            if len(self._queue) >= self.maxsize:
+                self._forget(self._queue.popleft())
+                self.dropped += 1
+            entry = (event, payload, room, namespace, time.monotonic(), key)
+            self._queue.append(entry)
+            if key is not None:
+                self._pending_keys[key] = entry
+            self.enqueued += 1
+
+    def is_pending(self, key):
+        """True si hay un emit con esta clave que aún no ha salido"""
+        return key in self._pending_keys
+
+    def _forget(self, entry):
+        key = entry[5]
+        if key is not None and self._pending_keys.get(key) is entry:
+            del self._pending_keys[key]
+
+    def drain(self, limit=None):
+        """Emite hasta 'limit' eventos pendientes; devuelve cuántos salieron"""
+        socketio = self.socketio
+        protocol = get_protocol()
+        binary = SOCKET_BINARY_ENABLED and protocol.available()
+        sent = 0
+        limit = limit or self.batch
+        while sent < limit:
+            with self._lock:
+                if not self._queue:
+                    break
+                entry = self._queue.popleft()
+                self._forget(entry)
+            event, payload, room, namespace, queued_at, _ = entry
+            try:
+                socketio.emit(event, payload, to=room, namespace=namespace)
+                self.emitted += 1
+                if binary and room is not None:
+                    if protocol.has_binary_clients(room):
+                        socketio.emit(event, protocol.encode_for_room(event, payload, room),
+                                      to=f"{room}{BINARY_ROOM_SUFFIX}", namespace=namespace)
+                        self.binary_emitted += 1
+                    else:
+                        self.binary_skipped += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Socket fan-out emit failed ({event} -> {room}): {e}")
+            self.max_lag = max(self.max_lag, time.monotonic() - queued_at)
+            sent += 1
+        return sent
+
+    def _drain_forever(self):
+        while True:
+            if self.drain() == 0:
+                self.socketio.sleep(self.idle)
+            else:
+                # Cede el turno entre lotes para no acaparar el hub de eventlet
+                self.socketio.sleep(0)
+
+    def stats(self):
+        return {
+            'pending': len(self._queue),
+            'enqueued': self.enqueued,
+            'emitted': self.emitted,
+            'binary_emitted': self.binary_emitted,
+            'binary_skipped': self.binary_skipped,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'max_lag_ms': round(self.max_lag * 1000, 2)
+        }
+
+
+_fanout = FanoutQueue()
+
+
+def get_fanout():
+    """Cola compartida del proceso"""
+    return _fanout
+
+
+def publish(event, payload, room=None, namespace=None, key=None):
+    _fanout.publish(event, payload, room=room, namespace=namespace, key=key)
@@ -1,7 +1,12 @@
 # api/socket_events.py
 from flask_socketio import join_room, leave_room, emit
+from flask import request
+from sockets.fanout import get_fanout, publish
+from sockets.encoding import get_protocol
 import random
 def register_socket_events(socketio):
+    get_fanout().bind(socketio)
+
     @socketio.on("connect")
     def _():
         print("socket connected")
@@ -9,19 +14,18 @@ def register_socket_events(socketio):
     @socketio.on("join_cluster")
     def _join(data):
         cluster = data.get("cluster","Aethos")
-        join_room(cluster)
+        join_room(get_protocol().room_for(request.sid, cluster))
         emit("joined_cluster", {"cluster":cluster})
 
     @socketio.on("sync_manifest")
     def _sync(data):
         cluster = data.get("cluster","Aethos")
         payload = {"entropy": random.random(), "alignment": random.random()}
-        emit("cluster_update", payload, room=cluster)
+        publish("cluster_update", payload, room=cluster)
 
 def send_cluster_update(cluster, payload):
-    # import socketio server instance lazily to avoid cycles
+    # queued on the fan-out queue: never emits from the request thread
     try:
-        from app import socketio
-        socketio.emit("cluster_update", payload, room=cluster)
+        publish("cluster_update", payload, room=cluster)
     except Exception as e:
         print("socket emit failed:", e)
@@ -1,3 +1,6 @@
+-- Esquema inicial (legado). La API lo reconcilia con los modelos al arrancar
+-- mediante api/migrations (o a mano: python scripts/migrate.py upgrade).
+
 CREATE TABLE users (
   id SERIAL PRIMARY KEY,
   username TEXT UNIQUE NOT NULL,
@@ -0,0 +1,121 @@
+# scripts/bench_admin_auth.py
+"""Micro-benchmark: coste por petición de la autorización admin.
+
+"anterior" reproduce el patrón previo de app.py: import dentro del handler,
+función anidada decorada en cada petición y require_admin_permission
+apilado sobre require_admin_jwt (el token se verifica dos veces).
+"require_admin" es el decorador precalculado (una verificación por
+petición); "require_admin + cache" además reutiliza la verificación del
+mismo token entre peticiones. Se mide la vista dentro de un request
+context, sin el coste del servidor WSGI. Uso:
+    python scripts/bench_admin_auth.py --iterations 3000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from functools import wraps
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import auth
+
+PERMISSION = 'system:monitor'
+
+
+def legacy_require_admin_jwt(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        admin = auth.get_admin_auth()
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return jsonify({"error": "Authorization required"}), 401
+        payload, error = admin.verify_admin_token(auth_header[7:])
+        if error:
+            return jsonify({"error": "Invalid administrative token", "detail": error}), 401
+        request.admin_payload = payload
+        request.admin_context = admin.get_admin_context(payload)
+        return f(*args, **kwargs)
+    return decorated
+
+
+def legacy_require_admin_permission(permission):
+    def decorator(f):
+        @wraps(f)
+        @legacy_require_admin_jwt
+        def decorated(*args, **kwargs):
+            if not auth.get_admin_auth().has_permission(request.admin_payload, permission):
+                return jsonify({"error": "Insufficient permissions"}), 403
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def legacy_view():
+    from auth import get_admin_auth  # noqa: F401  (el import por petición del handler anterior)
+
+    @legacy_require_admin_jwt
+    @legacy_require_admin_permission(PERMISSION)
+    def protected():
+        return {"status": "ok"}
+
+    return protected()
+
+
+@auth.require_admin(PERMISSION)
+def precomputed_view():
+    return {"status": "ok"}
+
+
+def measure(app, view, token, iterations):
+    headers = {'Authorization': f'Bearer {token}'}
+    samples = []
+    for _ in range(iterations):
+        with app.test_request_context('/api/admin/system/status', headers=headers):
+            start = time.perf_counter()
+            result = view()
+            samples.append((time.perf_counter() - start) * 1e6)
+    assert result == {"status": "ok"}, result
+    samples.sort()
+    return statistics.fmean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=3000)
+    args = parser.parse_args()
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    os.environ['JWT_PUBLIC_KEY'] = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    token = jwt.encode({
+        'username': 'bench', 'role': 'SystemAdministrator',
+        'permissions': ['system:admin', 'users:read:all', PERMISSION],
+        'aud': 'HellTheater.API.Admin', 'iss': 'HellTheater.Auth.System',
+        'exp': int(time.time()) + 3600
+    }, private_key, algorithm='RS256')
+
+    app = Flask(__name__)
+    admin = auth.get_admin_auth()
+    cache = admin.token_cache
+
+    print(f"{'modo':>24} {'media µs':>10} {'p50 µs':>9} {'p99 µs':>9}")
+    rows = [
+        ('anterior', legacy_view, auth.VerifiedTokenCache(maxsize=0)),
+        ('require_admin', precomputed_view, auth.VerifiedTokenCache(maxsize=0)),
+        ('require_admin + cache', precomputed_view, cache),
+    ]
+    for label, view, token_cache in rows:
+        admin.token_cache = token_cache
+        mean, p50, p99 = measure(app, view, token, args.iterations)
+        print(f"{label:>24} {mean:>10.1f} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
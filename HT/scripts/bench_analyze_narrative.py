@@ -0,0 +1,71 @@
+# scripts/bench_analyze_narrative.py
+"""Benchmark: analyze_narrative (por item) vs analyze_narratives (lote).
+
+Uso:
+    python scripts/bench_analyze_narrative.py --n 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from core.cluster_lexicon import get_matcher
+from integrations.huggingface import analyze_narrative, analyze_narratives
+
+FILLER = [
+    "quiero", "hoy", "intención", "proyecto", "energía", "camino", "proceso",
+    "claridad", "propósito", "ritmo", "semana", "equipo", "espacio", "visión",
+    "transición", "narrativa", "frecuencia", "símbolo", "ciclo", "umbral"
+]
+
+
+def synthetic_intentions(n, seed=7):
+    rng = random.Random(seed)
+    lexicon = list(get_matcher().term_clusters)
+    texts = []
+    for _ in range(n):
+        words = [rng.choice(lexicon if rng.random() < 0.2 else FILLER) for _ in range(rng.randint(8, 60))]
+        sentences = [" ".join(words[i:i + 9]) for i in range(0, len(words), 9)]
+        texts.append(". ".join(sentences) + rng.choice([".", "?", "!"]))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = synthetic_intentions(args.n)
+
+    def per_item():
+        return [analyze_narrative(t) for t in texts]
+
+    def batched():
+        return analyze_narratives(texts)
+
+    timings = {}
+    for name, fn in (("per_item", per_item), ("batch", batched)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = (best, result)
+
+    single = timings["per_item"][1]
+    batch = timings["batch"][1]
+    agree = sum(s["cluster"] == c for s, c in zip(single, batch["cluster"])) / len(texts)
+
+    print(f"Textos: {len(texts)}  |  embeddings lote: {batch['embeddings'].shape} {batch['embeddings'].dtype}")
+    for name, (elapsed, _) in timings.items():
+        print(f"  {name:<9} {elapsed * 1000:9.1f} ms  {len(texts) / elapsed:10.0f} textos/s")
+    print(f"  speedup   {timings['per_item'][0] / timings['batch'][0]:9.2f}x")
+    print(f"  coincidencia de clúster: {agree:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# scripts/bench_auth.py
+"""Micro-benchmark: coste por petición de require_jwt (HS256 y RS256).
+
+Compara la verificación anterior (os.getenv + parseo del PEM + jwt.decode
+en cada petición) con el key ring precargado y el cache de tokens
+verificados. "frío" usa un token distinto en cada petición (siempre
+verifica firma), "caliente" repite el mismo token (hit del cache). Uso:
+    python scripts/bench_auth.py --iterations 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import auth
+
+
+def legacy_verify(token):
+    """Camino de require_jwt antes del key ring (llaves leídas por petición)"""
+    secret = os.getenv('JWT_SECRET')
+    public_key_pem = os.getenv('JWT_PUBLIC_KEY')
+    if secret:
+        return jwt.decode(token, secret, algorithms=['HS256'], options={"verify_exp": True})
+    if '\\n' in public_key_pem:
+        public_key_pem = public_key_pem.replace('\\n', '\n')
+    public_key = serialization.load_pem_public_key(public_key_pem.encode('utf-8'), backend=default_backend())
+    return jwt.decode(token, public_key, algorithms=['RS256'], options={"verify_exp": True})
+
+
+def verify_uncached(token):
+    """Key ring precargado sin el cache de tokens"""
+    key, algorithm = auth.get_key_ring().resolve(token)
+    return jwt.decode(token, key, algorithms=[algorithm], options={"verify_exp": True})
+
+
+def measure(verify, tokens, iterations):
+    samples = []
+    for i in range(iterations):
+        token = tokens[i % len(tokens)]
+        start = time.perf_counter()
+        verify(token)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.fmean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99) - 1]
+
+
+def configure(algorithm):
+    """Entorno + tokens firmados para el algoritmo; devuelve la llave de firma"""
+    os.environ.pop('JWT_SECRET', None)
+    os.environ.pop('JWT_PUBLIC_KEY', None)
+    if algorithm == 'HS256':
+        os.environ['JWT_SECRET'] = 'bench-secret-' + 'x' * 32
+        signing_key = os.environ['JWT_SECRET']
+    else:
+        signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pem = signing_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        os.environ['JWT_PUBLIC_KEY'] = pem
+    auth.reload_key_ring()
+    return signing_key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--algorithms', default='HS256,RS256')
+    args = parser.parse_args()
+
+    print(f"{'alg':>6} {'modo':>22} {'media µs':>10} {'p50 µs':>9} {'p99 µs':>9}")
+    for algorithm in args.algorithms.split(','):
+        signing_key = configure(algorithm)
+        exp = int(time.time()) + 3600
+        cold = [jwt.encode({'id': i, 'exp': exp}, signing_key, algorithm=algorithm)
+                for i in range(args.iterations)]
+        warm = cold[:1]
+
+        rows = [
+            ('anterior', legacy_verify, cold),
+            ('key ring, frío', verify_uncached, cold),
+            ('key ring + cache', auth.verify_user_token, warm),
+        ]
+        for label, verify, tokens in rows:
+            auth._token_cache.clear()
+            mean, p50, p99 = measure(verify, tokens, args.iterations)
+            print(f"{algorithm:>6} {label:>22} {mean:>10.1f} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
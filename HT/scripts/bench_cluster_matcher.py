@@ -0,0 +1,85 @@
+# scripts/bench_cluster_matcher.py
+"""Benchmark: str.count por patrón vs autómata Aho–Corasick del léxico.
+
+Escala el tamaño del léxico (términos por clúster) contra la longitud del
+texto. Uso:
+    python scripts/bench_cluster_matcher.py --sizes 5,50,200,500 --lengths 200,2000,20000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from core.cluster_lexicon import ClusterMatcher, load_lexicon
+
+
+def legacy_counts(text, clusters):
+    """Camino anterior: un text.count() por patrón y clúster"""
+    text_lower = text.lower()
+    return [sum(text_lower.count(p) for p in patterns) for patterns in clusters.values()]
+
+
+def grow_lexicon(base, per_cluster, rng):
+    clusters = {}
+    for name, terms in base.items():
+        terms = list(terms)
+        while len(terms) < per_cluster:
+            terms.append("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 11))))
+        clusters[name] = terms[:max(per_cluster, 1)]
+    return clusters
+
+
+def synthetic_text(length, clusters, rng):
+    terms = [t for ts in clusters.values() for t in ts]
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(terms) if rng.random() < 0.15 else "".join(
+            rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="5,50,200,500")
+    parser.add_argument("--lengths", default="200,2000,20000")
+    parser.add_argument("--texts", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    base = load_lexicon()['clusters']
+    sizes = [int(s) for s in args.sizes.split(",")]
+    lengths = [int(n) for n in args.lengths.split(",")]
+
+    print(f"{'términos/clúster':>16} {'chars':>7} {'str.count µs':>13} {'autómata µs':>12} {'speedup':>8}")
+    for size in sizes:
+        clusters = grow_lexicon(base, size, rng)
+        matcher = ClusterMatcher(clusters)
+        for length in lengths:
+            texts = [synthetic_text(length, clusters, rng) for _ in range(args.texts)]
+            for text in texts[:3]:
+                assert legacy_counts(text, clusters) == matcher.count(text.lower())
+            legacy = timeit(lambda: [legacy_counts(t, clusters) for t in texts], args.repeat)
+            automaton = timeit(lambda: [matcher.count(t.lower()) for t in texts], args.repeat)
+            print(f"{size:>16} {length:>7} {legacy / len(texts) * 1e6:>13.1f} "
+                  f"{automaton / len(texts) * 1e6:>12.1f} {legacy / automaton:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
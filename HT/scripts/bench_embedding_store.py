@@ -0,0 +1,83 @@
+# scripts/bench_embedding_store.py
+"""Benchmark del almacén de embeddings + índice IVF.
+
+Genera N vectores sintéticos agrupados, los añade al almacén en un
+directorio temporal, entrena el índice y mide latencia (p50/p99) y
+recall@k frente a búsqueda exacta. Uso:
+    python scripts/bench_embedding_store.py --n 1000000 --queries 1000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+# El índice se entrena explícitamente tras la carga, no durante los appends
+os.environ.setdefault("EMBEDDING_IVF_MIN_TRAIN", str(2 ** 62))
+
+from core.embedding_store import EMBEDDING_DIM, EmbeddingStore, _normalize
+
+
+def synthetic_vectors(n, topics, rng, chunk=100000):
+    centers = rng.normal(0, 1, (topics, EMBEDDING_DIM)).astype(np.float32)
+    for start in range(0, n, chunk):
+        size = min(chunk, n - start)
+        labels = rng.integers(0, topics, size)
+        yield start, centers[labels] + rng.normal(0, 0.6, (size, EMBEDDING_DIM)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--topics", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    path = tempfile.mkdtemp(prefix="aethos-embeddings-")
+    try:
+        store = EmbeddingStore(path)
+
+        start = time.perf_counter()
+        for offset, vectors in synthetic_vectors(args.n, args.topics, rng):
+            store.append(np.arange(offset + 1, offset + len(vectors) + 1), vectors)
+        print(f"append   {args.n} vectores en {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        store.rebuild_index()
+        print(f"índice   {len(store._index.centroids)} listas en {time.perf_counter() - start:.1f}s")
+
+        query_ids = rng.integers(1, args.n + 1, args.queries)
+        latencies = []
+        results = []
+        for manifest_id in query_ids:
+            t0 = time.perf_counter()
+            vector = store.vector_of(int(manifest_id))
+            results.append(store.search(vector, k=args.k, nprobe=args.nprobe, exclude_id=int(manifest_id)))
+            latencies.append(time.perf_counter() - t0)
+        latencies = np.array(latencies) * 1000
+        print(f"búsqueda p50={np.percentile(latencies, 50):.2f}ms  p99={np.percentile(latencies, 99):.2f}ms  "
+              f"(nprobe={args.nprobe}, k={args.k})")
+
+        # Recall frente a búsqueda exacta sobre una muestra de consultas
+        vectors = np.asarray(store._vectors)
+        hits = 0
+        sample = min(100, args.queries)
+        for manifest_id, found in zip(query_ids[:sample], results[:sample]):
+            query = _normalize(vectors[manifest_id - 1])
+            exact = np.argsort(-(vectors @ query))[:args.k + 1] + 1
+            exact = [i for i in exact if i != manifest_id][:args.k]
+            hits += len(set(exact) & {mid for mid, _ in found})
+        print(f"recall@{args.k} = {hits / (sample * args.k):.3f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
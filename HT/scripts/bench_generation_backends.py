@@ -0,0 +1,107 @@
+# scripts/bench_generation_backends.py
+"""Benchmark: generación remota (HF Inference API) vs local con batching dinámico.
+
+Lanza --requests prompts distintos con N hilos concurrentes y reporta
+throughput y latencias p50/p95 por backend. El cache de generación se
+omite (cada prompt es único). Uso:
+    python scripts/bench_generation_backends.py --backends simulated,local,remote --concurrency 1,4,16
+
+"simulated" no necesita torch: sustituye el forward pass por un coste
+fijo + coste por item (--forward-ms / --item-ms) para aislar el efecto del
+batching. "remote" requiere HUGGINGFACE_TOKEN y "local" torch/transformers.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from integrations import huggingface
+from integrations.local_generation import DynamicBatcher, generate_local, local_generation_available
+
+
+def run(call, prompts, concurrency):
+    latencies = []
+    lock = threading.Lock()
+    pending = iter(prompts)
+
+    def worker():
+        while True:
+            with lock:
+                prompt = next(pending, None)
+            if prompt is None:
+                return
+            start = time.perf_counter()
+            call(prompt)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    lat = np.array(latencies) * 1000
+    return len(prompts) / wall, np.percentile(lat, 50), np.percentile(lat, 95)
+
+
+def simulated_backend(max_batch, max_wait_ms, forward_ms, item_ms):
+    def forward(items):
+        time.sleep((forward_ms + item_ms * len(items)) / 1000)
+        return [prompt for prompt, _ in items]
+
+    batcher = DynamicBatcher(forward, max_batch_size=max_batch, max_wait_ms=max_wait_ms)
+    return lambda prompt: batcher((prompt, {})), batcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="simulated")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--max-tokens", type=int, default=48)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=25)
+    parser.add_argument("--forward-ms", type=float, default=120)
+    parser.add_argument("--item-ms", type=float, default=15)
+    args = parser.parse_args()
+
+    params = {**huggingface.GENERATION_PARAMS, "max_new_tokens": args.max_tokens}
+    concurrency = [int(c) for c in args.concurrency.split(",")]
+
+    print(f"{'backend':>22} {'hilos':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'lote medio':>11}")
+    for backend in args.backends.split(","):
+        for threads in concurrency:
+            prompts = [f"INTENCIÓN {backend}-{threads}-{i}: sostener la coherencia del taller" for i in range(args.requests)]
+            batcher = None
+            if backend == "simulated":
+                call, batcher = simulated_backend(args.max_batch, args.max_wait_ms, args.forward_ms, args.item_ms)
+            elif backend == "simulated-unbatched":
+                call, batcher = simulated_backend(1, 0, args.forward_ms, args.item_ms)
+            elif backend == "local":
+                if not local_generation_available():
+                    print(f"{backend:>22} omitido: torch/transformers no instalados")
+                    break
+                call = lambda prompt: generate_local(prompt, params)
+            elif backend == "remote":
+                if not huggingface.HF_TOKEN:
+                    print(f"{backend:>22} omitido: HUGGINGFACE_TOKEN no configurado")
+                    break
+                call = lambda prompt: huggingface._generate_remote(prompt, "microsoft/DialoGPT-large", params)
+            else:
+                raise SystemExit(f"backend desconocido: {backend}")
+
+            throughput, p50, p95 = run(call, prompts, threads)
+            avg_batch = batcher.stats()["avg_batch_size"] if batcher else float("nan")
+            print(f"{backend:>22} {threads:>6} {throughput:>8.2f} {p50:>9.1f} {p95:>9.1f} {avg_batch:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# scripts/bench_socket_encoding.py
+"""Benchmark: frames JSON actuales vs protocolo binario (msgpack + deltas).
+
+Genera frames realistas de resonance_update (agregador por ticks) y
+cluster_joined y compara bytes por frame y CPU de codificación. El ancho de
+banda se extrapola a --subscribers clientes con --ticks frames/s por room
+(la codificación de un broadcast se hace una vez por room; los bytes se
+escriben una vez por suscriptor). Uso:
+    python scripts/bench_socket_encoding.py --subscribers 10000 --frames 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+import msgpack
+
+from sockets.cluster_aggregator import ClusterAggregator, ClusterDelta
+from sockets.encoding import BinaryProtocol, compact
+
+# Cabecera de un paquete Socket.IO binario ('451-["evento",{"_placeholder":true,"num":0}]')
+BINARY_HEADER = len('451-["resonance_update",{"_placeholder":true,"num":0}]')
+WORDS = ["coherencia", "umbral", "transformación", "vínculo", "sombra", "proyecto", "equipo", "lanzamiento"]
+
+
+def synthetic_frames(count, rng):
+    frames = []
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    manifest_id = 1000
+    for i in range(count):
+        delta = ClusterDelta(5)
+        for _ in range(rng.randint(1, 12)):
+            manifest_id += 1
+            delta.add({
+                'user_id': rng.randint(1, 50000),
+                'manifest_id': manifest_id,
+                'cluster': 'TRANSFORMACIÓN',
+                'entropy': round(rng.random(), 4),
+                'alignment': round(rng.random(), 4),
+                'progress': round(rng.random(), 4),
+                'keywords': rng.sample(WORDS, 3),
+                'timestamp': (now + timedelta(milliseconds=250 * i)).isoformat()
+            })
+        if i % 10 == 0:
+            # Tick tranquilo: un solo evento repetido (muchos campos iguales al frame anterior)
+            delta = ClusterDelta(5)
+            delta.add({'entropy': 0.5, 'alignment': 0.5})
+        frames.append(ClusterAggregator.frame('TRANSFORMACIÓN', delta, (now + timedelta(milliseconds=250 * i)).isoformat()))
+    return frames
+
+
+def joined_frames(count, rng):
+    return [{'cluster': 'TRANSFORMACIÓN', 'user_count': 9000 + rng.randint(0, 3), 'resonance_level': 0.6123}
+            for _ in range(count)]
+
+
+def measure(name, event, frames, encode, subscribers, ticks):
+    started = time.perf_counter()
+    sizes = [len(encode(event, frame)) for frame in frames]
+    elapsed = time.perf_counter() - started
+    avg = sum(sizes) / len(sizes)
+    mbps = avg * subscribers * ticks * 8 / 1e6
+    print(f"{name:>26} {avg:>10.1f} {elapsed / len(frames) * 1e6:>10.1f} {mbps:>12.1f}")
+    return avg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--ticks', type=float, default=4.0, help='frames/s por room (CLUSTER_TICK_MS=250)')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    streams = {
+        'resonance_update': synthetic_frames(args.frames, rng),
+        'cluster_joined': joined_frames(args.frames, rng)
+    }
+
+    def json_packet(event, payload):
+        return ('42' + json.dumps([event, payload], separators=(',', ':'), ensure_ascii=False)).encode('utf-8')
+
+    def json_default(event, payload):
+        # json.dumps por defecto (así serializa Flask-SocketIO)
+        return ('42' + json.dumps([event, payload])).encode('utf-8')
+
+    def msgpack_full(event, payload):
+        return BINARY_HEADER * b'x' + msgpack.packb(compact(payload), use_bin_type=True)
+
+    print(f"suscriptores={args.subscribers} frames/s por room={args.ticks}")
+    for event, frames in streams.items():
+        protocol = BinaryProtocol()
+
+        def msgpack_delta(event, payload):
+            return BINARY_HEADER * b'x' + protocol.encode_for_room(event, payload, 'TRANSFORMACIÓN')
+
+        print(f"\n{event}")
+        print(f"{'formato':>26} {'bytes/frame':>10} {'µs/frame':>10} {'Mbit/s total':>12}")
+        base = measure('json (actual)', event, frames, json_default, args.subscribers, args.ticks)
+        measure('json compacto', event, frames, json_packet, args.subscribers, args.ticks)
+        full = measure('msgpack + claves cortas', event, frames, msgpack_full, args.subscribers, args.ticks)
+        delta = measure('msgpack + deltas', event, frames, msgpack_delta, args.subscribers, args.ticks)
+        print(f"{'reducción vs json':>26} {1 - full / base:>9.0%} (completo) {1 - delta / base:>6.0%} (deltas)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# scripts/bench_spreads.py
+"""Benchmark / Monte Carlo de tiradas: tiradas por segundo y balance del mazo.
+
+Compara el camino anterior de draw_cards (random.shuffle del mazo + un
+random.choice por carta para la inversión) con core.spreads (una tirada con
+semilla y lotes vectorizados (N, k)), y corre la simulación por bloques con
+costes de activación sintéticos (o los de --costs). Uso:
+    python scripts/bench_spreads.py --mode cross --n 1000000
+    python scripts/bench_spreads.py --mode full --n 1000000 --seed 42 --costs 1,1,2,3,...
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from core.spreads import draw_batch, draw_spread, make_rng, simulate, spread_size
+
+
+def legacy_spread(deck, k):
+    """draw_cards antes del motor de tiradas"""
+    cards = list(deck)
+    random.shuffle(cards)
+    return [(card, random.choice([True, False])) for card in cards[:k]]
+
+
+def rate(count, seconds):
+    return f"{count / seconds:>12,.0f} tiradas/s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", default="cross", choices=["single", "triple", "cross", "full"])
+    parser.add_argument("--n", type=int, default=1000000, help="tiradas de la simulación")
+    parser.add_argument("--deck", type=int, default=22, help="cartas del mazo")
+    parser.add_argument("--single", type=int, default=20000, help="tiradas individuales a medir")
+    parser.add_argument("--batch", type=int, default=65536, help="tamaño de bloque vectorizado")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--costs", default=None, help="activation_cost por carta, separados por comas")
+    args = parser.parse_args()
+
+    k = spread_size(args.mode, args.deck)
+    if args.costs:
+        costs = [float(c) for c in args.costs.split(",")]
+        if len(costs) != args.deck:
+            parser.error(f"--costs necesita {args.deck} valores")
+    else:
+        costs = np.random.default_rng(7).uniform(0.5, 3.0, args.deck)
+    print(f"modo={args.mode} k={k} mazo={args.deck}")
+
+    deck = list(range(args.deck))
+    start = time.perf_counter()
+    for _ in range(args.single):
+        legacy_spread(deck, k)
+    print(f"legado (shuffle + choice)   {rate(args.single, time.perf_counter() - start)}")
+
+    start = time.perf_counter()
+    for i in range(args.single):
+        draw_spread(args.deck, args.mode, seed=i)
+    print(f"draw_spread (PCG64, semilla) {rate(args.single, time.perf_counter() - start)}")
+
+    rng = make_rng(args.seed or 0)
+    rounds = max(1, min(args.n, 1000000) // args.batch)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        draw_batch(args.deck, k, args.batch, rng)
+    print(f"draw_batch (N={args.batch})      {rate(rounds * args.batch, time.perf_counter() - start)}")
+
+    start = time.perf_counter()
+    result = simulate(args.deck, args.mode, args.n, seed=args.seed, costs=costs, chunk=args.batch)
+    elapsed = time.perf_counter() - start
+    frequency = result['frequency'].sum(0) / (args.n * k)
+    expected = 1 / args.deck
+    print(f"simulate {args.n} tiradas       {rate(args.n, elapsed)}  (seed={result['seed']})")
+    print(f"  inversión={result['inversion_rate']:.4f}  "
+          f"frecuencia por carta: min={frequency.min():.5f} max={frequency.max():.5f} (esperada {expected:.5f})")
+    cost = result['activation_cost']
+    print(f"  coste de activación por tirada: media={cost['mean']:.3f} std={cost['std']:.3f} "
+          f"p50={cost['p50']:.3f} p95={cost['p95']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# scripts/load_test_fanout.py
+"""Load test del fan-out de clústeres: N workers Socket.IO, M suscriptores.
+
+Arranca N procesos de la API (socketio.run) en puertos consecutivos,
+conecta M clientes repartidos entre workers y clústeres
+(join_resonance_cluster) y un publicador por clúster que envía
+manifestation_event. Reporta, por clúster, eventos entregados/s, la
+fracción entregada sobre lo esperado (eventos × suscriptores) y los frames
+recibidos (el agregador agrupa varias manifestaciones por tick).
+
+Con más de un worker hace falta --redis-url (message queue compartida);
+sin ella cada worker solo entrega a sus propios sockets. Conviene tener
+websocket-client instalado: con long-polling el cliente agrupa más de 16
+paquetes por POST a tasas altas y engine.io los rechaza. Uso:
+    python scripts/load_test_fanout.py --workers 2 --subscribers 40 --clusters 4 --events 200 --redis-url redis://localhost:6379
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import socketio
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+WORKER_BOOT = (
+    "import sys; sys.path.insert(0, {api!r});"
+    "from app import app, socketio;"
+    "socketio.run(app, host='127.0.0.1', port={port}, log_output=False)"
+)
+
+
+def start_workers(count, base_port, redis_url):
+    env = dict(os.environ, DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite://'))
+    if redis_url:
+        env['REDIS_URL'] = redis_url
+    else:
+        env.pop('REDIS_URL', None)
+    procs = []
+    for i in range(count):
+        code = WORKER_BOOT.format(api=API_DIR, port=base_port + i)
+        procs.append(subprocess.Popen([sys.executable, '-c', code], env=env, cwd=API_DIR,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    for i in range(count):
+        wait_for_port(base_port + i)
+    return procs
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise SystemExit(f"worker en puerto {port} no arrancó")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--subscribers', type=int, default=20)
+    parser.add_argument('--clusters', type=int, default=2)
+    parser.add_argument('--events', type=int, default=100, help='eventos publicados por clúster')
+    parser.add_argument('--rate', type=float, default=200, help='eventos/s por publicador')
+    parser.add_argument('--base-port', type=int, default=5600)
+    parser.add_argument('--redis-url', default=os.environ.get('REDIS_URL'))
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    if args.workers > 1 and not args.redis_url:
+        print("AVISO: varios workers sin --redis-url: solo se entregan eventos dentro de cada worker")
+
+    procs = start_workers(args.workers, args.base_port, args.redis_url)
+    clusters = [f"CLUSTER_{i}" for i in range(args.clusters)]
+    received = defaultdict(int)
+    frames = defaultdict(int)
+    lock = threading.Lock()
+    last_delivery = [0.0]
+    clients = []
+
+    try:
+        members = defaultdict(int)
+        for i in range(args.subscribers):
+            cluster = clusters[i % len(clusters)]
+            client = socketio.Client(reconnection=False)
+
+            def on_update(payload, cluster=cluster):
+                with lock:
+                    # Un frame puede agrupar varias manifestaciones
+                    received[cluster] += payload.get('count', 1) if isinstance(payload, dict) else 1
+                    frames[cluster] += 1
+                    last_delivery[0] = time.perf_counter()
+
+            client.on('resonance_update', on_update)
+            client.connect(f"http://127.0.0.1:{args.base_port + i % args.workers}", wait_timeout=10)
+            client.emit('join_resonance_cluster', {'cluster': cluster, 'user_id': i})
+            clients.append(client)
+            members[cluster] += 1
+        time.sleep(1.0)  # que todos los joins se procesen
+
+        publishers = []
+        for i, cluster in enumerate(clusters):
+            client = socketio.Client(reconnection=False)
+            client.connect(f"http://127.0.0.1:{args.base_port + i % args.workers}", wait_timeout=10)
+            publishers.append((cluster, client))
+            clients.append(client)
+
+        started = time.perf_counter()
+
+        def publish(cluster, client):
+            interval = 1.0 / args.rate
+            next_at = time.perf_counter()
+            for n in range(args.events):
+                next_at += interval
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                client.emit('manifestation_event', {
+                    'cluster': cluster,
+                    'manifestation': {'entropy': 0.4, 'alignment': 0.6, 'seq': n}
+                })
+
+        threads = [threading.Thread(target=publish, args=pc) for pc in publishers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        expected = {c: args.events * members[c] for c in clusters}
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            with lock:
+                if all(received[c] >= expected[c] for c in clusters):
+                    break
+            time.sleep(0.05)
+        elapsed = max(last_delivery[0] - started, 1e-9)
+
+        print(f"workers={args.workers} subscribers={args.subscribers} redis={'sí' if args.redis_url else 'no'}")
+        print(f"{'clúster':>12} {'miembros':>9} {'entregados':>11} {'esperados':>10} {'ratio':>7} {'eventos/s':>10} {'frames':>7}")
+        for cluster in clusters:
+            ratio = received[cluster] / expected[cluster] if expected[cluster] else 0.0
+            print(f"{cluster:>12} {members[cluster]:>9} {received[cluster]:>11} {expected[cluster]:>10} "
+                  f"{ratio:>7.2f} {received[cluster] / elapsed:>10.0f} {frames[cluster]:>7}")
+    finally:
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# scripts/migrate.py
+"""Aplica o lista las migraciones de esquema de la API (api/migrations).
+
+Usa DATABASE_URL (por defecto la base de docker-compose). Uso:
+    python scripts/migrate.py status
+    python scripts/migrate.py upgrade [--target 0002]
+"""
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from migrations.runner import run_migrations, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["status", "upgrade"])
+    parser.add_argument("--target", default=None, help="última versión a aplicar")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/crowia"))
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if args.command == "upgrade":
+        applied = run_migrations(engine, target=args.target)
+        print(f"{len(applied)} migraciones aplicadas" if applied else "Esquema al día")
+    else:
+        for version, name, description, applied in status(engine):
+            print(f"{'[x]' if applied else '[ ]'} {version} {name}: {description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,10 @@ export default function LegionBoard(){
   const [messages,setMessages]=useState([]);
   const [text,setText]=useState("");
   const [manifests,setManifests]=useState([]);
-  useEffect(()=>{ socket = io(process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000"); socket.on("broadcast_message", m=> setMessages(prev=>[...prev,m])); socket.on("new_manifest", m=> setManifests(prev=>[m,...prev])); fetch((process.env.NEXT_PUBLIC_API_URL||"http://localhost:5000") + "/api/manifests").then(r=>r.json()).then(d=>setManifests(d)); return ()=> socket.disconnect(); },[]);
+  const [cursor,setCursor]=useState(null);
+  // Feed paginado por cursor: next_cursor es null en la última página
+  const loadManifests = (after)=> fetch((process.env.NEXT_PUBLIC_API_URL||"http://localhost:5000") + "/api/manifests" + (after ? "?cursor="+encodeURIComponent(after) : ""),{headers:{"Authorization":"Bearer "+localStorage.getItem("token")}}).then(r=>r.json()).then(d=>{ setManifests(prev=> after ? [...prev,...d.items] : d.items); setCursor(d.next_cursor); });
+  useEffect(()=>{ socket = io(process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000"); socket.on("broadcast_message", m=> setMessages(prev=>[...prev,m])); socket.on("new_manifest", m=> setManifests(prev=>[m,...prev])); loadManifests(null); return ()=> socket.disconnect(); },[]);
   const send = ()=>{ if(!text) return; socket.emit("send_message",{user:localStorage.getItem("user")||"Anónimo", text}); setText(""); }
   const publish = async ()=>{ const title = prompt("Título"); const content = prompt("Contenido"); if(!title||!content) return; await fetch((process.env.NEXT_PUBLIC_API_URL||"http://localhost:5000")+"/api/manifest",{method:"POST",headers:{"Content-Type":"application/json","Authorization":"Bearer "+localStorage.getItem("token")}, body: JSON.stringify({intention:content,mask:"Narrador"})}); }
   return (
@@ -21,7 +24,7 @@ export default function LegionBoard(){
         </div>
         <div style={{width:360}}>
           <h4>Tablón</h4>
-          <div style={{maxHeight:300,overflow:"auto",background:"#111",padding:8}}>{manifests.map((m,i)=>(<div key={i} style={{borderBottom:"1px solid #222",padding:8}}><b>{m.title}</b><p>{m.content}</p><small>{m.author} • {m.timestamp}</small></div>))}</div>
+          <div style={{maxHeight:300,overflow:"auto",background:"#111",padding:8}}>{manifests.map((m,i)=>(<div key={m.id||i} style={{borderBottom:"1px solid #222",padding:8}}><b>{m.mask} · {m.cluster}</b><p>{m.intention}</p><small>{m.author} • {m.created_at}</small></div>))}{cursor && <button onClick={()=>loadManifests(cursor)}>Cargar más</button>}</div>
         </div>
       </div>
     </div>